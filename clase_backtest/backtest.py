@@ -14,7 +14,9 @@ Parametros
 
 """
 
-import pandas as pd
+import numpy as np
+
+import dataset
 import e02_indicadores as ind
 import e03_signals as sig
 import e04_trades as trades
@@ -36,12 +38,9 @@ def run(**kwargs):
     fee = kwargs['fee']
     excel = kwargs.get('excel', False)
 
-    df_week = df_week.copy()
-    df = df.copy()
-
     """ AGREGO INDICADORES """
 
-    df = ind.adx_strategy(df_week=df_week, df_hour=df)  # Agrego el ADX a la data horaria
+    df = ind.adx_strategy(df_week=df_week, df_hour=df)  # Agrego el ADX a la data horaria (devuelve una copia)
     df['cruce'] = ind.cruce_ema(df, ema_slow, ema_fast)  # Agrego el cruce de EMA
     # (notar la diferencia que aca entrego una columna y en el anterior un df entero)
     df['rsi'] = ind.get_rsi(df)  # Agrego el RSI
@@ -52,15 +51,15 @@ def run(**kwargs):
     """ AGREGO SEÑALES """
     df = sig.add_signals(df, adx_level, rsi_level_long, rsi_level_short, distance_ma)
     if excel:
-        df.to_excel('df_signals.xlsx')
+        df.assign(signal=sig.signal_labels(df['signal'])).to_excel('df_signals.xlsx')
     # df.to_feather('df_signals.feather')
     # print(df)
 
 
-    # cantidad de señales LONG y SHORT
-    k_signals = df['signal'].value_counts()
-    k_long = k_signals.get('LONG', 0)
-    k_short = k_signals.get('SHORT', 0)
+    # cantidad de señales LONG y SHORT (la señal es int8: 1 LONG, -1 SHORT, 0 nada)
+    signal = df['signal'].to_numpy()
+    k_long = np.count_nonzero(signal == sig.SIGNAL_LONG)
+    k_short = np.count_nonzero(signal == sig.SIGNAL_SHORT)
     k_signals_total = k_long + k_short
     if k_signals_total == 0:
         # print si el signal si es LONG o SHORT
@@ -72,7 +71,7 @@ def run(**kwargs):
 
 
     """ TRADES """
-    df_trades = trades.simulate_trades(df, stop_loss, take_profit, fee)
+    df_trades = trades.simulate_trades_fast(df, stop_loss, take_profit, fee)
     if excel:
         df_trades.to_excel('df_trades.xlsx')
         df_trades.to_feather('df_trades.feather')
@@ -89,8 +88,8 @@ def run(**kwargs):
 
 if __name__ == '__main__':
     parametros = {
-        'data_week': pd.read_feather('data/BTCUSDT_1w.feather'),
-        'data': pd.read_feather('data/BTCUSDT_1h.feather'),
+        'data_week': dataset.load_frame('BTCUSDT', '1w'),
+        'data': dataset.load_frame('BTCUSDT', '1h'),
         'adx_level': 20,
         'rsi_level_long': 30,
         'rsi_level_short': 70,
@@ -0,0 +1,240 @@
+"""
+Cache de indicadores
+
+La clave es (huella del dataset, indicador, version del codigo, parametros). La huella es un hash del index y
+de las columnas que usa el indicador, asi dos DataFrames con la misma data comparten resultados aunque sean
+copias distintas. La version es un hash del archivo donde esta el indicador: si se cambia el codigo
+(o el de otro indicador del mismo archivo que use) no se sirven resultados viejos.
+
+- En memoria: LRU acotado por bytes
+- En disco (opcional): cada resultado se guarda como .npy (y el nombre de la serie en un .txt al lado)
+  y se busca ahi antes de recalcular, asi una corrida nueva del optimizador no vuelve a calcular los indicadores.
+  La carpeta se acota a max_disk_bytes borrando los archivos usados hace mas tiempo
+- Hit o miss, se devuelve una serie nueva (escribible) con el nombre que devolvio el indicador
+
+Uso:
+    import cache
+    cache.configure(max_bytes=512 * 1024 ** 2, cache_dir='cache', max_disk_bytes=2 * 1024 ** 3)
+"""
+
+import functools
+import hashlib
+import inspect
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class IndicatorCache:
+    def __init__(self, max_bytes=256 * 1024 ** 2, cache_dir=None, max_disk_bytes=1024 ** 3):
+        """
+        :param max_bytes: memoria maxima de los arrays guardados
+        :param cache_dir: carpeta para guardar los resultados en disco (None = solo memoria)
+        :param max_disk_bytes: tamaño maximo de cache_dir
+        """
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_bytes = 0
+        self.enabled = True
+        self.data = OrderedDict()  # key -> (array de solo lectura, nombre de la serie)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.disk_bytes = sum(size for _, size, _ in self._disk_files())
+
+    def _path(self, key, ext='npy'):
+        name = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, f'{name}.{ext}')
+
+    def get(self, key):
+        """
+        :return: (array de solo lectura, nombre de la serie) o None si no esta
+        """
+        if key in self.data:
+            self.data.move_to_end(key)  # el ultimo es el usado mas recientemente
+            self.hits += 1
+            return self.data[key]
+
+        if self.cache_dir:
+            path = self._path(key)
+            if os.path.exists(path):
+                try:
+                    values = np.load(path)
+                    os.utime(path)  # para prune_disk es un uso reciente
+                except OSError:  # lo borro otro proceso
+                    self.misses += 1
+                    return None
+                name_path = self._path(key, 'txt')
+                name = None
+                if os.path.exists(name_path):
+                    with open(name_path, 'r', encoding='utf-8') as f:
+                        name = f.read()
+                self._store(key, values, name)
+                self.hits += 1
+                return self.data[key]
+
+        self.misses += 1
+        return None
+
+    def put(self, key, values, name=None):
+        """
+        Guarda una copia de values: el que llama puede seguir modificando su array
+        """
+        values = np.array(values, dtype=np.float64, copy=True)
+        if self.cache_dir:
+            path = self._path(key)
+            np.save(path, values)
+            self.disk_bytes += os.path.getsize(path)
+            if name is not None:
+                with open(self._path(key, 'txt'), 'w', encoding='utf-8') as f:
+                    f.write(str(name))
+            if self.disk_bytes > self.max_disk_bytes:
+                self.prune_disk()
+        self._store(key, values, name)
+
+    def _disk_files(self):
+        """
+        (ruta, bytes, ultimo uso) de cada .npy de cache_dir
+        """
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.npy'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+    def prune_disk(self):
+        """
+        Borra de cache_dir los resultados usados hace mas tiempo hasta quedar en el 90% de max_disk_bytes
+        """
+        files = sorted(self._disk_files(), key=lambda f: f[2])
+        self.disk_bytes = sum(size for _, size, _ in files)
+        target = self.max_disk_bytes * 0.9
+        for path, size, _ in files:
+            if self.disk_bytes <= target:
+                break
+            for file in (path, path[:-len('.npy')] + '.txt'):
+                try:
+                    os.remove(file)
+                except OSError:
+                    pass
+            self.disk_bytes -= size
+
+    def _store(self, key, values, name=None):
+        values.setflags(write=False)
+        if key in self.data:
+            self.nbytes -= self.data.pop(key)[0].nbytes
+        self.data[key] = (values, name)
+        self.nbytes += values.nbytes
+
+        # Desalojo los menos usados hasta entrar en el limite
+        while self.nbytes > self.max_bytes and len(self.data) > 1:
+            _, (old, _) = self.data.popitem(last=False)
+            self.nbytes -= old.nbytes
+
+    def clear(self):
+        self.data.clear()
+        self.nbytes = 0
+        self.hits = self.misses = 0
+
+
+CACHE = IndicatorCache()
+
+
+def configure(max_bytes=None, cache_dir=None, enabled=True, max_disk_bytes=None):
+    """
+    Reconfigura el cache global (descarta lo que tenia en memoria)
+    """
+    global CACHE
+    CACHE = IndicatorCache(max_bytes=max_bytes or CACHE.max_bytes, cache_dir=cache_dir,
+                           max_disk_bytes=max_disk_bytes or CACHE.max_disk_bytes)
+    CACHE.enabled = enabled
+    return CACHE
+
+
+def fingerprint(df, columns):
+    """
+    Hash del index y de las columnas indicadas del df
+    :param df:
+    :param columns: columnas que usa el indicador
+    :return: str
+    """
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(df.index, pd.DatetimeIndex):
+        h.update(np.ascontiguousarray(df.index.as_unit('ns').asi8).tobytes())
+    else:  # RangeIndex, enteros, etc.
+        h.update(type(df.index).__name__.encode())
+        h.update(np.ascontiguousarray(pd.util.hash_pandas_object(df.index, index=False).to_numpy()).tobytes())
+    for col in columns:
+        h.update(col.encode())
+        h.update(np.ascontiguousarray(df[col].to_numpy(dtype=np.float64)).tobytes())
+    return h.hexdigest()
+
+
+def code_version(func):
+    """
+    Hash del archivo donde esta definida la funcion (o de su bytecode si no hay archivo)
+    """
+    try:
+        with open(inspect.getsourcefile(func), 'rb') as f:
+            source = f.read()
+    except (OSError, TypeError):
+        source = func.__code__.co_code
+    return hashlib.blake2b(source, digest_size=8).hexdigest()
+
+
+def _normalize(value):
+    # np.int64(10) y 10 tienen que dar la misma clave
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def cached(name, columns=('close',)):
+    """
+    Decorador para funciones indicador(df, *params) -> pd.Series con el mismo index que el df.
+    Si hay mas de un DataFrame entre los argumentos se usa la huella de todos y se devuelve
+    una serie con el index del ultimo.
+    :param name: nombre del indicador para la clave
+    :param columns: columnas del df que usa el indicador
+    """
+    def decorator(func):
+        version = code_version(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not CACHE.enabled:
+                return func(*args, **kwargs)
+
+            frames = [a for a in args if isinstance(a, pd.DataFrame)]
+            frames += [v for v in kwargs.values() if isinstance(v, pd.DataFrame)]
+            params = tuple(_normalize(a) for a in args if not isinstance(a, pd.DataFrame))
+            params += tuple(sorted((k, _normalize(v)) for k, v in kwargs.items() if not isinstance(v, pd.DataFrame)))
+
+            key = (tuple(fingerprint(f, columns) for f in frames), name, version, params)
+            index = frames[-1].index
+
+            cached_value = CACHE.get(key)
+            if cached_value is None:
+                result = func(*args, **kwargs)
+                values, series_name = result.to_numpy(dtype=np.float64, copy=True), result.name
+                CACHE.put(key, values, series_name)  # guarda su propia copia
+            else:
+                values, series_name = cached_value
+                values = values.copy()
+
+            # hit y miss devuelven lo mismo: una serie float64 escribible con el nombre que devolvio el indicador
+            return pd.Series(values, index=index, name=series_name if series_name is not None else name)
+
+        return wrapper
+
+    return decorator
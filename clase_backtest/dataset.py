@@ -0,0 +1,122 @@
+"""
+Dataset columnar con memory-map
+
+Cada feather de data/ se convierte (una vez) en una carpeta con un .npy por columna:
+    data/mmap/ETHUSDT_1h/time.npy   (int64, nanosegundos)
+    data/mmap/ETHUSDT_1h/close.npy  (float64)
+    ...
+
+Los .npy se abren con np.load(mmap_mode='r'): no se lee nada hasta que se usa, no se copia
+y todos los procesos que abren el mismo archivo comparten las mismas paginas de memoria.
+
+Uso:
+    ds = dataset.load('ETHUSDT', '1h')
+    df = ds.slice('2021-01-01', '2022-01-01').to_frame()  # solo ese rango, sin copiar
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class Dataset:
+    def __init__(self, folder, start=0, stop=None):
+        """
+        :param folder: carpeta con los .npy
+        :param start: posicion inicial (para las vistas de slice)
+        :param stop: posicion final (exclusive)
+        """
+        self.folder = folder
+        with open(os.path.join(folder, '_columns.json'), 'r') as f:
+            self.columns = json.load(f)
+
+        self.time = np.load(os.path.join(folder, 'time.npy'), mmap_mode='r')[start:stop]
+        self.data = {col: np.load(os.path.join(folder, f'{col}.npy'), mmap_mode='r')[start:stop]
+                     for col in self.columns}
+        self._start = start
+        self._stop = stop
+
+    def __len__(self):
+        return len(self.time)
+
+    def __getitem__(self, col):
+        return self.data[col]
+
+    def __reduce__(self):
+        # Al mandarlo a otro proceso viaja solo la ruta, el worker vuelve a abrir el memory-map
+        return Dataset, (self.folder, self._start, self._stop)
+
+    @property
+    def index(self):
+        return pd.DatetimeIndex(self.time.view('datetime64[ns]'), name='time')
+
+    def slice(self, start=None, end=None):
+        """
+        Vista por rango de fechas (ambos extremos incluidos, como df.loc[start:end]). No lee ni copia data.
+        """
+        # slice_indexer respeta los strings parciales igual que .loc ('2021-01' = todo enero)
+        i0, i1, _ = self.index.slice_indexer(start, end).indices(len(self.time))
+
+        base = self._start
+        return Dataset(self.folder, base + i0, base + i1)
+
+    def to_frame(self, columns=None):
+        """
+        DataFrame sobre los arrays del memory-map (solo lectura, sin copia)
+        """
+        columns = columns or self.columns
+        return pd.DataFrame({col: self.data[col] for col in columns}, index=self.index, copy=False)
+
+
+def _save(path, values):
+    """
+    np.save atomico: se escribe un .tmp y se reemplaza. Los procesos que tienen abierto el archivo
+    viejo con memory-map siguen leyendo el inodo viejo (truncarlo en el lugar les da SIGBUS)
+    """
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, values)
+    os.replace(tmp, path)
+
+
+def build(feather_file, folder):
+    """
+    Convierte un feather (index datetime) en la carpeta de columnas .npy
+    """
+    df = pd.read_feather(feather_file).sort_index()
+    os.makedirs(folder, exist_ok=True)
+
+    _save(os.path.join(folder, 'time.npy'), df.index.as_unit('ns').asi8)
+    for col in df.columns:
+        _save(os.path.join(folder, f'{col}.npy'), df[col].to_numpy(dtype=np.float64))
+
+    # _columns.json va ultimo: load() lo usa para saber si la carpeta esta al dia
+    tmp = os.path.join(folder, '_columns.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(list(df.columns), f)
+    os.replace(tmp, os.path.join(folder, '_columns.json'))
+
+
+def load(symbol, interval, directory='data'):
+    """
+    Abre el dataset de {directory}/{symbol}_{interval}.feather, generando (o regenerando si el feather
+    es mas nuevo) la carpeta de columnas.
+    :return: Dataset
+    """
+    feather_file = os.path.join(directory, f'{symbol}_{interval}.feather')
+    folder = os.path.join(directory, 'mmap', f'{symbol}_{interval}')
+    marker = os.path.join(folder, '_columns.json')
+
+    if not os.path.exists(marker) or os.path.getmtime(marker) < os.path.getmtime(feather_file):
+        build(feather_file, folder)
+
+    return Dataset(folder)
+
+
+def load_frame(symbol, interval, directory='data'):
+    """
+    Atajo para los scripts: DataFrame de solo lectura sobre el memory-map
+    """
+    return load(symbol, interval, directory).to_frame()
@@ -1,3 +1,7 @@
+import glob
+import json
+import os
+
 import pandas as pd
 import requests
 import time
@@ -8,9 +12,41 @@ import numpy as np
 
 from config import URL_PERP, URL_SPOT, PATH_PERP, PATH_SPOT, TIMEFRAME
 from typing import List, Tuple
+
+# pip install orjson (opcional, si no esta se usa el json de la libreria estandar)
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
 # Increase the number of columns displayed in pandas
 pd.options.display.max_columns = 20
 
+# Time multipliers (milliseconds) for the different frequencies
+FREQUENCY_MS = {
+    '1s': 1000,
+    '1m': 60000,
+    '5m': 300000,
+    '15m': 900000,
+    '1h': 3600000,
+    '4h': 14400000,
+    '8h': 28800000,
+    '1d': 86400000,
+    '1w': 604800000,
+}
+
+# Campos de cada kline que se guardan: (posicion en la respuesta de Binance, columna, dtype)
+KLINE_COLUMNS = [
+    (1, 'open', np.float64),
+    (2, 'high', np.float64),
+    (3, 'low', np.float64),
+    (4, 'close', np.float64),
+    (5, 'volume', np.float64),
+    (7, 'v_q', np.float64),
+    (8, 'n', np.int32),
+]
+
 
 def get_data_binance(symbol, interval, api='PERPETUOS', start_time=None, end_time=None, limit=1000):
     """
@@ -80,7 +116,14 @@ def get_data_binance(symbol, interval, api='PERPETUOS', start_time=None, end_tim
             params['endTime'] = end_time
 
     response = requests.get(url, params=params)
-    return response.json()
+    return json_loads(response.content)
+
+
+def date_to_timestamp(date: str) -> int:
+    """
+    Convert a 'YYYY-MM-DD' date (local time) to a timestamp in milliseconds.
+    """
+    return int(time.mktime(dt.datetime.strptime(date, "%Y-%m-%d").timetuple()) * 1000)
 
 
 def chunk_dates(timestamp_init, timestamp_fin, frequency, workers=20, limit=999):
@@ -97,18 +140,7 @@ def chunk_dates(timestamp_init, timestamp_fin, frequency, workers=20, limit=999)
     Returns:
         list: List of date chunks for each worker
     """
-    # Define time multipliers for different frequencies
-    frequency_multipliers = {
-        '1s': 1000,
-        '1m': 60000,
-        '1h': 3600000,
-        '4h': 14400000,
-        '8h': 28800000,
-        '1d': 86400000,
-        '1w': 604800000,
-    }
-
-    multiplier = frequency_multipliers.get(frequency, 1)  # Default to 1 if frequency is not found
+    multiplier = FREQUENCY_MS.get(frequency, 1)  # Default to 1 if frequency is not found
 
     k_requests = ceil(((timestamp_fin - timestamp_init) / multiplier) / limit)  # Number of requests needed
     step = multiplier * limit  # Step size for each request
@@ -125,23 +157,74 @@ def chunk_dates(timestamp_init, timestamp_fin, frequency, workers=20, limit=999)
     return np.array_split(dates_init, workers)
 
 
-def work_list_binance(list_data):
+class KlineBuffer:
     """
-    Process the raw data from Binance API into a pandas DataFrame.
-
-    Args:
-        list_data (list): Raw data from Binance API
-
-    Returns:
-        pd.DataFrame: Processed DataFrame
+    Columnas tipadas preasignadas donde se escriben las klines a medida que llegan:
+    time int64 (ms), precios y volumenes float64, n int32. No se arma ningun DataFrame intermedio.
     """
-    df = pd.DataFrame(list_data)
-    df.drop([6, 9, 10, 11], axis=1, inplace=True)
-    df.columns = ['time', 'open', 'high', 'low', 'close', 'volume', 'v_q', 'n']
-    return df
-
 
-def work_download(ticker, list_periods, api, frequency, bad_request, df, limit):
+    def __init__(self, capacity):
+        """
+        :param capacity: cantidad de velas esperada (si llegan mas, crece)
+        """
+        self.time = np.empty(capacity, dtype=np.int64)
+        self.columns = {name: np.empty(capacity, dtype=dtype) for _, name, dtype in KLINE_COLUMNS}
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, size):
+        capacity = max(size, 2 * len(self.time))
+        self.time = self._resize(self.time, capacity)
+        self.columns = {name: self._resize(values, capacity) for name, values in self.columns.items()}
+
+    def _resize(self, values, capacity):
+        new = np.empty(capacity, dtype=values.dtype)
+        new[:self.size] = values[:self.size]
+        return new
+
+    def add(self, klines):
+        """
+        Escribe una respuesta de Binance (lista de klines) en las columnas
+        :return: cantidad de velas agregadas
+        """
+        if not klines:
+            return 0
+
+        fields = list(zip(*klines))  # una tupla por campo; numpy convierte los strings al asignar
+
+        with self.lock:
+            i0 = self.size
+            i1 = i0 + len(klines)
+            if i1 > len(self.time):
+                self._grow(i1)
+
+            self.time[i0:i1] = fields[0]
+            for pos, name, _ in KLINE_COLUMNS:
+                self.columns[name][i0:i1] = fields[pos]
+            self.size = i1
+
+        return len(klines)
+
+    def to_frame(self):
+        """
+        DataFrame con index datetime ordenado y sin duplicados (queda la primera vela recibida, como download_data)
+        """
+        times = self.time[:self.size]
+        columns = {name: values[:self.size] for name, values in self.columns.items()}
+
+        if self.size and not np.all(np.diff(times) > 0):
+            _, first = np.unique(times, return_index=True)
+            times = times[first]
+            columns = {name: values[first] for name, values in columns.items()}
+
+        index = pd.DatetimeIndex((times * 10 ** 6).view('datetime64[ns]'), name='time')
+        return pd.DataFrame(columns, index=index, copy=False)
+
+
+def work_download(ticker, list_periods, api, frequency, bad_request, buffer, limit):
     """
     Download data for a specific ticker and time periods.
 
@@ -151,24 +234,21 @@ def work_download(ticker, list_periods, api, frequency, bad_request, df, limit):
         api (str): API type ('SPOT' or 'PERPETUOS')
         frequency (str): Time frequency
         bad_request (list): List to store failed requests
-        df (list): List to store successful DataFrame chunks
+        buffer (KlineBuffer): Columnas donde se escriben las velas
         limit (int): API request limit
     """
-    df_provisory = []
     bad_request_provisorio = []
 
     for period in list_periods:
         time.sleep(0.5)
-        result = get_data_binance(symbol=ticker, interval=frequency, api=api, start_time=period)
+        result = get_data_binance(symbol=ticker, interval=frequency, api=api, start_time=period, limit=limit)
 
         if not result:
             bad_request_provisorio.append(period)
         else:
-            result = work_list_binance(result)
-            df_provisory.append(result)
+            buffer.add(result)
 
     bad_request.extend(bad_request_provisorio)
-    df.extend(df_provisory)
 
 
 def download_data(ticker, frequency, date_init: str, date_fin: str, api='SPOT', workers=20, limit=1000):
@@ -187,55 +267,66 @@ def download_data(ticker, frequency, date_init: str, date_fin: str, api='SPOT',
     Returns:
         tuple: (pd.DataFrame, list) Processed DataFrame and list of bad requests
     """
-    timestamp_init = int(time.mktime(dt.datetime.strptime(date_init, "%Y-%m-%d").timetuple()) * 1000)
-    timestamp_fin = int(time.mktime(dt.datetime.strptime(date_fin, "%Y-%m-%d").timetuple()) * 1000)
+    timestamp_init = date_to_timestamp(date_init)
+    timestamp_fin = date_to_timestamp(date_fin)
 
     list_for_workers = chunk_dates(timestamp_init, timestamp_fin, frequency, workers, limit)
 
-    df = []
+    # Cada request trae como mucho limit velas
+    buffer = KlineBuffer(sum(len(chunk) for chunk in list_for_workers) * limit)
     bad_requests = []
 
     threads = []
     for chunk in list_for_workers:
-        t = threading.Thread(target=work_download, args=(ticker, chunk, api, frequency, bad_requests, df, limit))
+        t = threading.Thread(target=work_download, args=(ticker, chunk, api, frequency, bad_requests, buffer, limit))
         threads.append(t)
         t.start()
 
     for t in threads:
         t.join()
 
-    df = pd.concat(df, axis=0)
-    df.drop_duplicates(subset='time', keep='first', inplace=True)
-    df.set_index('time', inplace=True)
-    df.sort_index(inplace=True)
+    return buffer.to_frame(), bad_requests
 
-    # index to datetime
-    df.index = pd.to_datetime(df.index, unit='ms')
 
-    df = df.astype(float)
+def find_gaps(index: pd.DatetimeIndex, tf: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Huecos del index con diferencias en int64 (sin armar el rango completo de fechas).
 
-    return df, bad_requests
+    Args:
+        index (pd.DatetimeIndex): index de la data
+        tf (str): intervalo de las velas ('1m', '1h', '1d', '1w', ...)
 
+    Returns:
+        tuple: (inicios, fines) del primer y ultimo timestamp faltante de cada hueco, int64 en nanosegundos
+    """
+    step = pd.Timedelta(tf).value
+    times = np.unique(index.as_unit('ns').asi8)  # ordenado y sin duplicados
+
+    hueco = np.flatnonzero(np.diff(times) > step)  # posicion de la vela anterior a cada hueco
+
+    return times[hueco] + step, times[hueco + 1] - step
 
-def test_data(df, tf: str) -> List[List[str]]:
-    frecuencias = {
-        '1m': '1min',
-        '5m': '5min',
-        '15m': '15min',
-        '45m': '45min',
-        '1h': 'h',
-        '1d': 'd',
-        '1w': 'W'
-    }
 
-    start_date = df.index.min()
+def _gaps_to_ranges(inicios, fines, tf: str, tz=None) -> List[List[str]]:
+    # Los huecos de una sola vela no se informan (igual que find_missing_date_ranges)
+    step = pd.Timedelta(tf).value
+    largos = fines - inicios >= step
 
-    rango_completo = pd.date_range(start=start_date, end=df.index.max(), freq=frecuencias[tf])  # Create a complete date range
-    fechas_faltantes = rango_completo.difference(df.index)
+    # los int64 son UTC, vuelvo a la zona horaria del index
+    inicios = pd.DatetimeIndex(inicios[largos].view('datetime64[ns]'), tz='UTC').tz_convert(tz)
+    fines = pd.DatetimeIndex(fines[largos].view('datetime64[ns]'), tz='UTC').tz_convert(tz)
 
-    if not fechas_faltantes.empty:
-        print(f"Faltan {len(fechas_faltantes)} intervalos de {tf} en el índice.")
-        return find_missing_date_ranges(fechas_faltantes, tf)
+    print(f"Se encontraron {len(inicios)} rangos de fechas faltantes:")
+    return format_date_ranges(list(zip(inicios, fines)), tf)
+
+
+def test_data(df, tf: str) -> List[List[str]]:
+    inicios, fines = find_gaps(df.index, tf)
+    faltantes = int(((fines - inicios) // pd.Timedelta(tf).value + 1).sum())
+
+    if faltantes:
+        print(f"Faltan {faltantes} intervalos de {tf} en el índice.")
+        return _gaps_to_ranges(inicios, fines, tf, df.index.tz)
     else:
         print("El índice está completo. No faltan intervalos.")
         return []
@@ -259,34 +350,87 @@ def check_weekly_data(df: pd.DataFrame) -> List[List[str]]:
 
 
 def check_other_timeframes(df: pd.DataFrame, tf: str, freq: str) -> List[List[str]]:
-    rango_completo = pd.date_range(start=df.index.min(), end=df.index.max(), freq=freq)
-    fechas_faltantes = rango_completo.difference(df.index)
+    step = pd.Timedelta(pd.tseries.frequencies.to_offset(freq))
+    inicios, fines = find_gaps(df.index, step)
+    faltantes = int(((fines - inicios) // step.value + 1).sum())
 
-    if fechas_faltantes.empty:
+    if not faltantes:
         print("El índice está completo. No faltan intervalos.")
         return []
     else:
-        print(f"Faltan {len(fechas_faltantes)} intervalos de {tf} en el índice.")
-        return find_missing_date_ranges(fechas_faltantes, tf)
+        print(f"Faltan {faltantes} intervalos de {tf} en el índice.")
+        return _gaps_to_ranges(inicios, fines, tf, df.index.tz)
 
 
 def find_missing_date_ranges(fechas_faltantes: pd.DatetimeIndex, tf: str) -> List[List[str]]:
-    rangos_faltantes = []
-    inicio_rango = None
+    step = pd.Timedelta(tf).value
+    times = fechas_faltantes.as_unit('ns').asi8
+
+    # cada rango termina donde la siguiente fecha faltante esta a mas de un intervalo
+    cortes = np.flatnonzero(np.diff(times) > step)
+    inicios = times[np.r_[0, cortes + 1]] if len(times) else times
+    fines = times[np.r_[cortes, len(times) - 1]] if len(times) else times
 
-    for i, fecha in enumerate(fechas_faltantes):
-        if inicio_rango is None:
-            inicio_rango = fecha
+    return _gaps_to_ranges(inicios, fines, tf, fechas_faltantes.tz)
 
-        if i == len(fechas_faltantes) - 1 or fechas_faltantes[i + 1] - fecha > pd.Timedelta(tf):
-            fin_rango = fecha
-            if fin_rango - inicio_rango >= pd.Timedelta(tf):
-                rangos_faltantes.append((inicio_rango, fin_rango))
-            inicio_rango = None
 
-    print(f"Se encontraron {len(rangos_faltantes)} rangos de fechas faltantes:")
+def repair_gaps(file: str, ticker: str, frequency: str, api='SPOT', limit=1000) -> List[List[str]]:
+    """
+    Vuelve a bajar solo los huecos del archivo y los agrega.
+
+    Args:
+        file (str): feather con la data (index datetime)
+        ticker (str): Trading pair symbol
+        frequency (str): Time frequency
+        api (str): API type ('SPOT' or 'PERPETUOS')
+        limit (int): API request limit
+
+    Returns:
+        list: huecos que siguen sin data despues de la descarga (Binance no los tiene)
+    """
+    df = pd.read_feather(file).sort_index()
+    inicios, fines = find_gaps(df.index, frequency)
+
+    buffer = KlineBuffer(int(((fines - inicios) // pd.Timedelta(frequency).value + 1).sum()))
+    for inicio, fin in zip((inicios // 10 ** 6).tolist(), (fines // 10 ** 6).tolist()):  # a milisegundos
+        for period in chunk_dates(inicio, fin, frequency, workers=1, limit=limit)[0]:
+            time.sleep(0.5)
+            result = get_data_binance(symbol=ticker, interval=frequency, api=api, start_time=int(period),
+                                      end_time=fin, limit=limit)
+            buffer.add(result)
 
-    return format_date_ranges(rangos_faltantes, tf)
+    if len(buffer):
+        new = buffer.to_frame()
+        if df.index.tz is not None:
+            new.index = new.index.tz_localize('UTC').tz_convert(df.index.tz)
+        new.index.name = df.index.name
+
+        df = pd.concat([df, new[df.columns]], axis=0)
+        df = df[~df.index.duplicated(keep='first')].sort_index()
+        df.to_feather(file)
+
+    return test_data(df, frequency)
+
+
+def check_directory(directory='data') -> dict:
+    """
+    Chequeo de integridad de todos los feather {symbol}_{interval}.feather de la carpeta.
+    Solo se lee el index de cada archivo.
+
+    Returns:
+        dict: {archivo: lista de huecos}
+    """
+    resultado = {}
+    for file in sorted(glob.glob(os.path.join(directory, '*_*.feather'))):
+        interval = os.path.basename(file)[:-len('.feather')].rsplit('_', 1)[1]
+        if interval not in FREQUENCY_MS:
+            continue
+
+        index = pd.read_feather(file, columns=[]).index
+        print(file)
+        resultado[file] = test_data(pd.DataFrame(index=index), interval)
+
+    return resultado
 
 
 def format_date_ranges(rangos_faltantes: List[Tuple[pd.Timestamp, pd.Timestamp]], tf: str) -> List[List[str]]:
@@ -309,6 +453,9 @@ if __name__ == '__main__':
     # print(data)
 
     """ DATA HISTORICA """
+    # Para no bajar toda la historia cada vez, usar el store incremental de e01_data_store:
+    # KlineStore().update(symbol, interval, api='SPOT') y KlineStore().export(symbol, interval)
+    # Para descargas largas (1m, 1s) que se puedan cortar y reanudar: e01_data_jobs.download_data_resumable
     # start_time = time.time()
     # data = download_data(symbol, interval, date_init='2017-01-01', date_fin='2024-10-20', api='SPOT')
     # df = data[0]
@@ -333,3 +480,9 @@ if __name__ == '__main__':
 
     # check_weekly_data(df)
     check_other_timeframes(df, '1h', '1h')
+
+    # Vuelve a bajar solo los huecos y los agrega al archivo
+    # repair_gaps(file, symbol, interval, api='SPOT')
+
+    # Todos los archivos de la carpeta
+    # check_directory(directory)
@@ -0,0 +1,262 @@
+"""
+Descarga asincronica de klines de Binance
+
+A diferencia de e01_data.download_data (threads + requests.get + sleep fijo):
+- Una sola aiohttp.ClientSession con pool de conexiones keep-alive
+- Limitador de peso (token bucket) que se corrige con el header X-MBX-USED-WEIGHT-1M de Binance
+- Reintentos con backoff exponencial + jitter ante errores de red, 5xx, 429 y 418 (respeta Retry-After).
+  El resto de los 4xx (simbolo o intervalo invalido, etc.) no se reintentan
+- Los resultados se devuelven en el mismo orden que los periodos pedidos
+
+La url base se puede cambiar (base_url) para probar contra un servidor local.
+"""
+
+# pip install aiohttp
+
+import asyncio
+import random
+import time
+
+import aiohttp
+
+from config import URL_PERP, URL_SPOT, PATH_PERP, PATH_SPOT
+from e01_data import KlineBuffer, chunk_dates, date_to_timestamp, json_loads
+
+# Peso maximo por minuto de cada api (REQUEST_WEIGHT en /exchangeInfo)
+MAX_WEIGHT = {
+    'SPOT': 6000,
+    'PERPETUOS': 2400,
+}
+
+RATE_LIMIT_STATUS = {418, 429}
+
+
+def is_retryable(status):
+    """
+    429 / 418 (limite de peso o ban temporal) y 5xx se reintentan; otro 4xx no se arregla reintentando
+    """
+    return status in RATE_LIMIT_STATUS or status >= 500
+
+
+def klines_weight(api, limit):
+    """
+    Peso de un request de klines segun el limit
+    https://binance-docs.github.io/apidocs/futures/en/#kline-candlestick-data
+    """
+    if api == 'SPOT':
+        return 2
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+class WeightLimiter:
+    """
+    Token bucket de peso por minuto. Se rellena de forma continua y se sincroniza con
+    el peso usado que informa Binance en cada respuesta.
+    """
+
+    def __init__(self, max_weight, safety=0.9):
+        """
+        :param max_weight: peso maximo por minuto
+        :param safety: fraccion del maximo que nos permitimos usar
+        """
+        self.capacity = max_weight * safety
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60  # tokens por segundo
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, weight):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+
+                self._refill()
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                await asyncio.sleep((weight - self.tokens) / self.rate)
+
+    def update(self, used_weight):
+        """
+        Ajusta los tokens con el peso usado que informa el servidor (si informa mas de lo que estimamos)
+        """
+        if used_weight is None:
+            return
+        self._refill()
+        self.tokens = min(self.tokens, self.capacity - float(used_weight))
+
+    def block(self, seconds):
+        """
+        Frena todos los requests (429 / 418 con Retry-After)
+        """
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+async def fetch_klines(session, url, params, limiter, weight, retries=5, backoff=0.5):
+    """
+    Un request de klines con reintentos.
+
+    Returns:
+        list: Candlestick data ([] si el periodo no tiene data)
+
+    Raises:
+        aiohttp.ClientError: si se agotan los reintentos
+        aiohttp.ClientResponseError: sin reintentos ante un 4xx que no es 429 / 418
+    """
+    for attempt in range(retries + 1):
+        await limiter.acquire(weight)
+        try:
+            async with session.get(url, params=params) as response:
+                limiter.update(response.headers.get('X-MBX-USED-WEIGHT-1M'))
+
+                if response.status in RATE_LIMIT_STATUS:
+                    retry_after = response.headers.get('Retry-After')
+                    if retry_after is not None:
+                        limiter.block(float(retry_after))
+
+                response.raise_for_status()
+                return json_loads(await response.read())
+
+        except aiohttp.ClientResponseError as e:
+            if not is_retryable(e.status) or attempt == retries:
+                raise
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt == retries:
+                raise
+
+        # backoff exponencial con jitter completo
+        await asyncio.sleep(random.uniform(0, backoff * 2 ** attempt))
+
+
+async def download_klines(symbol, interval, periods, api='SPOT', limit=1000, max_concurrency=10, base_url=None,
+                          retries=5, session=None):
+    """
+    Descarga todos los periodos en paralelo.
+
+    Args:
+        symbol (str): Trading pair symbol
+        interval (str): Time interval
+        periods (list): Timestamps (ms) de inicio de cada request
+        api (str): API type ('SPOT' or 'PERPETUOS')
+        limit (int): Velas por request
+        max_concurrency (int): Requests en vuelo a la vez
+        base_url (str): Reemplaza la url de Binance (para tests)
+        retries (int): Reintentos por request
+        session (aiohttp.ClientSession): Sesion a reutilizar (opcional)
+
+    Returns:
+        tuple: (list, list) Resultados en el orden de periods (None si fallo el request, [] si Binance no
+               tiene data) y periodos sin data (fallidos o vacios)
+    """
+    if api == 'PERPETUOS':
+        url = (base_url or URL_PERP) + PATH_PERP
+    else:
+        url = (base_url or URL_SPOT) + PATH_SPOT
+
+    limiter = WeightLimiter(MAX_WEIGHT.get(api, 1200))
+    weight = klines_weight(api, limit)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    own_session = session is None
+    if own_session:
+        connector = aiohttp.TCPConnector(limit=max_concurrency, keepalive_timeout=60)
+        session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30))
+
+    async def work(period):
+        params = {'symbol': symbol, 'interval': interval, 'limit': limit, 'startTime': int(period)}
+        async with semaphore:
+            return await fetch_klines(session, url, params, limiter, weight, retries=retries)
+
+    try:
+        results = await asyncio.gather(*(work(p) for p in periods), return_exceptions=True)
+    finally:
+        if own_session:
+            await session.close()
+
+    bad_requests = []
+    ordered = []
+    for period, result in zip(periods, results):
+        if isinstance(result, BaseException):
+            bad_requests.append(int(period))
+            ordered.append(None)
+        else:
+            if not result:
+                bad_requests.append(int(period))
+            ordered.append(result)
+
+    return ordered, bad_requests
+
+
+def download_data_async(ticker, frequency, date_init: str, date_fin: str, api='SPOT', limit=1000, max_concurrency=10,
+                        base_url=None):
+    """
+    Mismo resultado que e01_data.download_data pero con el motor asincronico.
+
+    Args:
+        ticker (str): Trading pair symbol
+        frequency (str): Time frequency
+        date_init (str): Start date in 'YYYY-MM-DD' format
+        date_fin (str): End date in 'YYYY-MM-DD' format
+        api (str): API type ('SPOT' or 'PERPETUOS')
+        limit (int): API request limit
+        max_concurrency (int): Requests en vuelo a la vez
+        base_url (str): Reemplaza la url de Binance (para tests)
+
+    Returns:
+        tuple: (pd.DataFrame, list) Processed DataFrame and list of bad requests
+    """
+    timestamp_init = date_to_timestamp(date_init)
+    timestamp_fin = date_to_timestamp(date_fin)
+
+    periods = chunk_dates(timestamp_init, timestamp_fin, frequency, workers=1, limit=limit)[0].tolist()
+
+    results, bad_requests = asyncio.run(download_klines(ticker, frequency, periods, api=api, limit=limit,
+                                                        max_concurrency=max_concurrency, base_url=base_url))
+
+    return klines_to_df(results), bad_requests
+
+
+def klines_to_df(results):
+    """
+    Junta las respuestas de download_klines en un DataFrame (index datetime, valores float)
+
+    Args:
+        results (list): Respuestas en orden (None o [] se ignoran)
+
+    Returns:
+        pd.DataFrame: Processed DataFrame (vacio si no hay data). Precios float64 y n int32
+    """
+    results = [r for r in results if r]
+
+    buffer = KlineBuffer(sum(len(r) for r in results))
+    for result in results:
+        buffer.add(result)
+
+    return buffer.to_frame()
+
+
+if __name__ == '__main__':
+    symbol = 'ETHUSDT'
+    interval = '1m'
+
+    start_time = time.time()
+    df, bad_requests = download_data_async(symbol, interval, date_init='2023-01-01', date_fin='2024-10-20', api='SPOT')
+    print(df)
+    print(f'Periodos fallidos: {bad_requests}')
+    print(f"--- {time.time() - start_time:.2f} seconds ---")
@@ -0,0 +1,221 @@
+"""
+Descargas reanudables
+
+download_data guarda todo en memoria hasta el final: si se corta (error, Ctrl-C) se pierde todo, y los
+periodos que vuelven vacios quedan en bad_requests y nadie los vuelve a pedir.
+
+Un DownloadJob trabaja sobre una carpeta:
+- manifest.json: parametros del job y todos los periodos de chunk_dates (se escribe una vez)
+- journal.jsonl: una linea por periodo terminado con su estado (done, empty o error). Es append-only,
+  asi cada periodo cuesta una linea y no reescribir el manifest entero
+- {periodo}.feather: las velas de cada periodo, escritas apenas llegan
+
+Al volver a correr el mismo job se saltean los periodos done. Los empty y error se vuelven a pedir.
+
+Estructura:
+    data/jobs/SPOT_ETHUSDT_1m_2023-01-01_2024-10-20/manifest.json
+    data/jobs/SPOT_ETHUSDT_1m_2023-01-01_2024-10-20/journal.jsonl
+    data/jobs/SPOT_ETHUSDT_1m_2023-01-01_2024-10-20/1672542000000.feather
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from e01_data import KlineBuffer, chunk_dates, date_to_timestamp, get_data_binance
+
+DONE = 'done'
+EMPTY = 'empty'
+ERROR = 'error'
+PENDING = 'pending'
+
+
+class DownloadJob:
+    def __init__(self, ticker, frequency, date_init: str, date_fin: str, api='SPOT', limit=1000, folder=None):
+        """
+        :param ticker: Trading pair symbol
+        :param frequency: Time frequency
+        :param date_init: Start date in 'YYYY-MM-DD' format
+        :param date_fin: End date in 'YYYY-MM-DD' format
+        :param api: API type ('SPOT' or 'PERPETUOS')
+        :param limit: API request limit
+        :param folder: carpeta del job (default data/jobs/{api}_{ticker}_{frequency}_{date_init}_{date_fin})
+        """
+        self.params = {'ticker': ticker, 'frequency': frequency, 'date_init': date_init, 'date_fin': date_fin,
+                       'api': api, 'limit': limit}
+        self.folder = folder or os.path.join('data', 'jobs', f'{api}_{ticker}_{frequency}_{date_init}_{date_fin}')
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+
+        os.makedirs(self.folder, exist_ok=True)
+        self.periods = self._load_manifest()
+        self.status = self._load_journal()
+
+    # MANIFEST Y JOURNAL
+    def _load_manifest(self):
+        file = os.path.join(self.folder, 'manifest.json')
+
+        if os.path.exists(file):
+            with open(file, 'r') as f:
+                manifest = json.load(f)
+            if manifest['params'] != self.params:
+                raise ValueError(f'El job de {self.folder} es de otros parametros: {manifest["params"]}')
+            return manifest['periods']
+
+        timestamp_init = date_to_timestamp(self.params['date_init'])
+        timestamp_fin = date_to_timestamp(self.params['date_fin'])
+        periods = chunk_dates(timestamp_init, timestamp_fin, self.params['frequency'], workers=1,
+                              limit=self.params['limit'])[0]
+        periods = [int(p) for p in periods]
+
+        tmp = file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'params': self.params, 'periods': periods}, f, indent=4)
+        os.replace(tmp, file)  # escritura atomica
+
+        return periods
+
+    def _load_journal(self):
+        status = {p: {'status': PENDING} for p in self.periods}
+
+        file = os.path.join(self.folder, 'journal.jsonl')
+        if os.path.exists(file):
+            with open(file, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # ultima linea a medio escribir por un corte
+                    status[entry['period']] = entry
+
+        # un done sin su archivo (se borro a mano) se vuelve a bajar
+        for period, entry in status.items():
+            if entry['status'] == DONE and not os.path.exists(self._chunk_file(period)):
+                status[period] = {'status': PENDING}
+
+        return status
+
+    def _log(self, entry):
+        with self.lock:
+            self.status[entry['period']] = entry
+            with open(os.path.join(self.folder, 'journal.jsonl'), 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _chunk_file(self, period):
+        return os.path.join(self.folder, f'{period}.feather')
+
+    # DESCARGA
+    def pending(self):
+        """
+        Periodos que faltan (todo lo que no esta done)
+        """
+        return [p for p in self.periods if self.status[p]['status'] != DONE]
+
+    def _work(self, periods):
+        p = self.params
+        for period in periods:
+            if self.stop.is_set():
+                return
+
+            time.sleep(0.5)
+            try:
+                result = get_data_binance(symbol=p['ticker'], interval=p['frequency'], api=p['api'],
+                                          start_time=period, limit=p['limit'])
+            except Exception as e:
+                self._log({'period': period, 'status': ERROR, 'error': repr(e)})
+                continue
+
+            if isinstance(result, dict):  # Binance devuelve {'code': ..., 'msg': ...} cuando hay un error
+                self._log({'period': period, 'status': ERROR, 'error': result.get('msg')})
+                continue
+            if not result:
+                self._log({'period': period, 'status': EMPTY})
+                continue
+
+            buffer = KlineBuffer(len(result))
+            buffer.add(result)
+
+            file = self._chunk_file(period)
+            tmp = file + '.tmp'
+            buffer.to_frame().to_feather(tmp)
+            os.replace(tmp, file)
+
+            self._log({'period': period, 'status': DONE, 'rows': len(buffer)})
+
+    def run(self, workers=20):
+        """
+        Baja los periodos que faltan con threads. Con Ctrl-C se terminan los requests en curso,
+        lo bajado queda guardado y la proxima corrida sigue desde ahi.
+        :return: cantidad de periodos que siguen faltando
+        """
+        pending = self.pending()
+        if not pending:
+            return 0
+
+        self.stop.clear()
+        threads = []
+        for chunk in np.array_split(pending, min(workers, len(pending))):
+            t = threading.Thread(target=self._work, args=(chunk.tolist(),))
+            threads.append(t)
+            t.start()
+
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stop.set()
+            for t in threads:
+                t.join()
+            raise
+
+        return len(self.pending())
+
+    def bad_requests(self):
+        """
+        Periodos que terminaron vacios o con error
+        """
+        return [p for p in self.periods if self.status[p]['status'] in (EMPTY, ERROR)]
+
+    def to_frame(self):
+        """
+        Junta los periodos bajados. Mismo formato que download_data (ordenado, sin duplicados)
+        """
+        frames = [pd.read_feather(self._chunk_file(p)) for p in self.periods if self.status[p]['status'] == DONE]
+        if not frames:
+            return KlineBuffer(0).to_frame()
+
+        df = pd.concat(frames, axis=0)
+        df = df[~df.index.duplicated(keep='first')].sort_index()
+        return df
+
+
+def download_data_resumable(ticker, frequency, date_init: str, date_fin: str, api='SPOT', workers=20, limit=1000,
+                            folder=None):
+    """
+    Como e01_data.download_data, pero si se corta se puede volver a llamar con los mismos
+    parametros y sigue donde quedo.
+
+    Returns:
+        tuple: (pd.DataFrame, list) Processed DataFrame and list of bad requests
+    """
+    job = DownloadJob(ticker, frequency, date_init, date_fin, api=api, limit=limit, folder=folder)
+    job.run(workers=workers)
+    return job.to_frame(), job.bad_requests()
+
+
+if __name__ == '__main__':
+    symbol = 'ETHUSDT'
+    interval = '1m'
+
+    start_time = time.time()
+    df, bad_requests = download_data_resumable(symbol, interval, date_init='2023-01-01', date_fin='2024-10-20')
+    print(df)
+    print(f'Periodos fallidos: {bad_requests}')
+    print(f"--- {time.time() - start_time:.2f} seconds ---")
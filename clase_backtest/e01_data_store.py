@@ -0,0 +1,210 @@
+"""
+Store local de klines, incremental y particionado por mes
+
+En vez de bajar toda la historia desde 2017 y reescribir data/{symbol}_{interval}.feather cada vez:
+- Cada (api, symbol, interval) es una carpeta con un archivo feather (Arrow IPC) por mes: 2024-10.feather
+- _meta.json guarda el ultimo timestamp guardado y los huecos que Binance no tiene (para no volver a pedirlos)
+- update() baja solo la cola que falta (desde la ultima vela, que puede haber quedado abierta) y los huecos
+  que detecta test_data, y escribe solo los meses que cambiaron
+
+Estructura:
+    data/store/SPOT/ETHUSDT_1h/2024-09.feather
+    data/store/SPOT/ETHUSDT_1h/2024-10.feather
+    data/store/SPOT/ETHUSDT_1h/_meta.json
+"""
+
+import asyncio
+import glob
+import json
+import os
+import time
+
+import pandas as pd
+
+from e01_data import FREQUENCY_MS, chunk_dates, date_to_timestamp, test_data
+from e01_data_async import download_klines, klines_to_df
+
+# Intervalos que se pueden chequear con test_data (la semana de Binance arranca el lunes, ver check_weekly_data)
+GAP_INTERVALS = ['1m', '5m', '15m', '1h', '1d']
+
+
+class KlineStore:
+    def __init__(self, root='data/store', base_url=None):
+        """
+        :param root: carpeta raiz del store
+        :param base_url: reemplaza la url de Binance (para tests)
+        """
+        self.root = root
+        self.base_url = base_url
+
+    def path(self, symbol, interval, api='SPOT'):
+        return os.path.join(self.root, api, f'{symbol}_{interval}')
+
+    # META
+    def read_meta(self, symbol, interval, api='SPOT'):
+        file = os.path.join(self.path(symbol, interval, api), '_meta.json')
+        if not os.path.exists(file):
+            return {'last_timestamp': None, 'known_gaps': []}
+        with open(file, 'r') as f:
+            return json.load(f)
+
+    def write_meta(self, symbol, interval, api, meta):
+        file = os.path.join(self.path(symbol, interval, api), '_meta.json')
+        tmp = file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(meta, f, indent=4)
+        os.replace(tmp, file)  # escritura atomica
+
+    def last_timestamp(self, symbol, interval, api='SPOT'):
+        """
+        Ultimo timestamp guardado en milisegundos (None si no hay data)
+        """
+        return self.read_meta(symbol, interval, api)['last_timestamp']
+
+    # LECTURA / ESCRITURA
+    def read(self, symbol, interval, api='SPOT', start=None, end=None):
+        """
+        Lee la data del store. Con start / end solo abre los meses necesarios.
+        :param start: fecha inicial (str o Timestamp), opcional
+        :param end: fecha final (str o Timestamp), opcional
+        :return: pd.DataFrame con index datetime
+        """
+        files = sorted(glob.glob(os.path.join(self.path(symbol, interval, api), '*.feather')))
+
+        if start is not None:
+            files = [f for f in files if os.path.basename(f)[:7] >= pd.Timestamp(start).strftime('%Y-%m')]
+        if end is not None:
+            files = [f for f in files if os.path.basename(f)[:7] <= pd.Timestamp(end).strftime('%Y-%m')]
+
+        if not files:
+            return klines_to_df([])
+
+        df = pd.concat([pd.read_feather(f) for f in files], axis=0)
+        return df.loc[start:end]
+
+    def write(self, symbol, interval, api, df):
+        """
+        Agrega velas al store. Solo se reescriben los meses que tienen velas nuevas;
+        si una vela ya estaba se queda la nueva (la ultima vela puede haber estado abierta).
+        :param df: pd.DataFrame con index datetime (como download_data)
+        :return: cantidad de velas nuevas
+        """
+        if df.empty:
+            return 0
+
+        folder = self.path(symbol, interval, api)
+        os.makedirs(folder, exist_ok=True)
+
+        nuevas = 0
+        for month, chunk in df.groupby(df.index.strftime('%Y-%m')):
+            file = os.path.join(folder, f'{month}.feather')
+            if os.path.exists(file):
+                old = pd.read_feather(file)
+                nuevas += len(chunk.index.difference(old.index))
+                chunk = pd.concat([old, chunk], axis=0)
+                chunk = chunk[~chunk.index.duplicated(keep='last')].sort_index()
+            else:
+                nuevas += len(chunk)
+
+            tmp = file + '.tmp'
+            chunk.to_feather(tmp)
+            os.replace(tmp, file)
+
+        meta = self.read_meta(symbol, interval, api)
+        last = int(df.index.max().value // 10 ** 6)
+        meta['last_timestamp'] = max(meta['last_timestamp'] or 0, last)
+        self.write_meta(symbol, interval, api, meta)
+
+        return nuevas
+
+    # DESCARGA
+    def _download(self, symbol, interval, api, ranges, limit):
+        """
+        Baja los rangos [(inicio_ms, fin_ms), ...] con el downloader asincronico
+        :return: (df, periodos sin data, periodos cuyo request fallo)
+        """
+        periods = []
+        for start, end in ranges:
+            periods.extend(chunk_dates(start, end, interval, workers=1, limit=limit)[0].tolist())
+
+        if not periods:
+            return klines_to_df([]), [], []
+
+        results, bad_requests = asyncio.run(download_klines(symbol, interval, periods, api=api, limit=limit,
+                                                            base_url=self.base_url))
+        failed = [int(p) for p, r in zip(periods, results) if r is None]
+        return klines_to_df(results), bad_requests, failed
+
+    def find_gaps(self, symbol, interval, api='SPOT'):
+        """
+        Huecos de la data guardada que no estan marcados como conocidos
+        :return: lista de (inicio_ms, fin_ms)
+        """
+        if interval not in GAP_INTERVALS:
+            return []
+
+        df = self.read(symbol, interval, api)
+        if df.empty:
+            return []
+
+        known = {tuple(g) for g in self.read_meta(symbol, interval, api)['known_gaps']}
+        gaps = []
+        for start, end in test_data(df, interval):
+            gap = (int(pd.Timestamp(start).value // 10 ** 6), int(pd.Timestamp(end).value // 10 ** 6))
+            if gap not in known:
+                gaps.append(gap)
+        return gaps
+
+    def update(self, symbol, interval, api='SPOT', date_init='2017-01-01', repair_gaps=True, limit=1000):
+        """
+        Trae lo que falta: la cola desde la ultima vela guardada hasta ahora y (opcional) los huecos.
+        La primera vez baja desde date_init.
+        :return: cantidad de velas nuevas
+        """
+        now = int(time.time() * 1000)
+        last = self.last_timestamp(symbol, interval, api)
+        start = last if last is not None else date_to_timestamp(date_init)
+
+        ranges = [(start, now)]
+        gaps = self.find_gaps(symbol, interval, api) if (repair_gaps and last is not None) else []
+        ranges += gaps
+
+        df, bad_requests, failed = self._download(symbol, interval, api, ranges, limit)
+        nuevas = self.write(symbol, interval, api, df)
+
+        # Los huecos que siguen sin data son de Binance, los marco para no volver a pedirlos.
+        # Si algun request del hueco fallo (red, timeout, reintentos agotados) no se sabe: se vuelve a pedir
+        if gaps:
+            span = limit * FREQUENCY_MS[interval]  # milisegundos que cubre un request
+            meta = self.read_meta(symbol, interval, api)
+            for gap in gaps:
+                if any(p < gap[1] and p + span > gap[0] for p in failed):
+                    continue
+                gap_start = pd.Timestamp(gap[0], unit='ms')
+                gap_end = pd.Timestamp(gap[1], unit='ms') - pd.Timedelta(milliseconds=FREQUENCY_MS[interval])
+                if df.loc[gap_start:gap_end].empty:
+                    meta['known_gaps'].append(list(gap))
+            self.write_meta(symbol, interval, api, meta)
+
+        print(f'{symbol} {interval}: {nuevas} velas nuevas, {len(bad_requests)} requests sin data '
+              f'({len(failed)} fallidos)')
+        return nuevas
+
+    def export(self, symbol, interval, api='SPOT', file=None):
+        """
+        Escribe el archivo plano que usan los backtests (data/{symbol}_{interval}.feather)
+        """
+        file = file or f'data/{symbol}_{interval}.feather'
+        self.read(symbol, interval, api).to_feather(file)
+        return file
+
+
+if __name__ == '__main__':
+    store = KlineStore()
+
+    for symbol in ['BTCUSDT', 'ETHUSDT']:
+        for interval in ['1h', '1w']:
+            start_time = time.time()
+            store.update(symbol, interval, api='SPOT')
+            store.export(symbol, interval, api='SPOT')
+            print(f"--- {time.time() - start_time:.2f} seconds ---")
@@ -2,7 +2,10 @@ import pandas as pd
 import ta.trend
 import ta.momentum
 
+from cache import cached
 
+
+@cached('ADX', columns=('high', 'low', 'close'))
 def get_adx(df):
     data = df.copy()  # hacemos una copia para no modificar el original y evitar warnings
 
@@ -19,11 +22,12 @@ def get_adx(df):
     return data['ADX']
 
 
-def get_rsi(df):
+@cached('RSI')
+def get_rsi(df, window=14):
     data = df.copy()
 
     # Initialize the RSI indicator
-    rsi_indicator = ta.momentum.RSIIndicator(close=data['close'], window=14, fillna=False)
+    rsi_indicator = ta.momentum.RSIIndicator(close=data['close'], window=window, fillna=False)
 
     # Calculate the RSI
     data['RSI'] = rsi_indicator.rsi()
@@ -31,6 +35,18 @@ def get_rsi(df):
     return data['RSI']
 
 
+@cached('EMA')
+def get_ema(df, window):
+    """
+    Media exponencial del close
+    :param df:
+    :param window:
+    :return:
+    """
+    return ta.trend.EMAIndicator(close=df['close'], window=window, fillna=False).ema_indicator().rename('EMA')
+
+
+@cached('cruce')
 def cruce_ema(df, slow, fast):
     """
     Cruce de medias exponenciales
@@ -41,8 +57,8 @@ def cruce_ema(df, slow, fast):
     """
     data = df.copy()
 
-    data['ema_fast'] = ta.trend.EMAIndicator(close=data['close'], window=fast, fillna=False).ema_indicator()
-    data['ema_slow'] = ta.trend.EMAIndicator(close=data['close'], window=slow, fillna=False).ema_indicator()
+    data['ema_fast'] = get_ema(data, fast)
+    data['ema_slow'] = get_ema(data, slow)
 
     data['cruce'] = data['ema_fast'] / data['ema_slow'] - 1
 
@@ -87,13 +103,25 @@ def adx_strategy(df_week, df_hour):
     """
 
     df_hour = df_hour.copy()
-    df_week = df_week.copy()
+    df_hour['ADX'] = get_adx_hourly(df_week, df_hour)
 
+    return df_hour
+
+
+@cached('ADX_hourly', columns=('high', 'low', 'close'))
+def get_adx_hourly(df_week, df_hour):
+    """
+    ADX semanal llevado a la data horaria (es la columna que agrega adx_strategy)
+    :param df_week:
+    :param df_hour:
+    :return:
+    """
+    df_week = df_week.copy()
     df_week['ADX'] = get_adx(df_week)  # Add the ADX to the weekly data
 
-    df_hour = add_adx_to_data(df_week, df_hour)  # Add the ADX to the hourly data
+    df_hour = add_adx_to_data(df_week, pd.DataFrame(index=df_hour.index))  # Add the ADX to the hourly data
 
-    return df_hour
+    return df_hour['ADX']
 
 
 if __name__ == '__main__':
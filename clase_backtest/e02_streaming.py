@@ -0,0 +1,391 @@
+"""
+Indicadores en streaming (online)
+
+Las funciones de e02_indicadores calculan sobre todo el DataFrame. Para correr la estrategia en vivo
+no queremos recalcular toda la historia con cada vela nueva, entonces cada indicador es una clase
+con estado que se actualiza en O(1) por vela:
+
+- EMA: misma recursion que pandas ewm(span, adjust=False) que usa ta
+- RSI: Wilder, como ta.momentum.RSIIndicator (dos ewm con alpha = 1 / window)
+- ADX: replica ta.trend.ADXIndicator paso a paso (incluidos los ceros del comienzo)
+- WeeklyToHourly: el ffill del ADX semanal a la data horaria de add_adx_to_data
+
+Los valores coinciden exactamente con la version batch (ver check_batch). Se siembran con from_history() y
+despues se llama update() con cada vela cerrada.
+
+ADX semanal en StreamingStrategy: en batch (get_adx_hourly) cada hora de una semana toma el ADX de esa
+misma semana calculado con su vela final, que en vivo todavia no se conoce. En vivo cada hora usa peek()
+con la semana en formacion (maximo, minimo y ultimo close de las horas de la semana hasta esa hora):
+coincide con batch en la ultima hora de cada semana y en las semanas cerradas. Las horas anteriores
+difieren porque batch mira el cierre de la semana.
+"""
+
+import copy
+import math
+
+import numpy as np
+import pandas as pd
+
+from e03_signals import SIGNAL_LONG, SIGNAL_SHORT, SIGNAL_NONE
+
+NAN = float('nan')
+
+
+class _EWM:
+    """
+    Recursion de pandas ewm(adjust=False).mean() con min_periods
+    """
+    __slots__ = ('alpha', 'min_periods', 'weighted', 'nobs')
+
+    def __init__(self, com, min_periods):
+        self.alpha = 1. / (1. + com)
+        self.min_periods = min_periods
+        self.weighted = NAN
+        self.nobs = 0
+
+    def update(self, cur):
+        is_observation = cur == cur
+        self.nobs += is_observation
+
+        if self.weighted == self.weighted:
+            if is_observation and self.weighted != cur:
+                old_wt = 1. - self.alpha
+                self.weighted = (old_wt * self.weighted + self.alpha * cur) / (old_wt + self.alpha)
+        elif is_observation:
+            self.weighted = cur
+
+        return self.weighted if self.nobs >= self.min_periods else NAN
+
+
+class StreamingEMA:
+    __slots__ = ('window', '_ewm', 'value')
+
+    def __init__(self, window):
+        self.window = window
+        self._ewm = _EWM(com=(window - 1) / 2, min_periods=window)
+        self.value = NAN
+
+    def update(self, close):
+        self.value = self._ewm.update(close)
+        return self.value
+
+    @classmethod
+    def from_history(cls, close, window):
+        ind = cls(window)
+        for c in np.asarray(close, dtype=np.float64).tolist():
+            ind.update(c)
+        return ind
+
+
+class StreamingRSI:
+    __slots__ = ('window', '_up', '_down', '_prev', 'value')
+
+    def __init__(self, window=14):
+        self.window = window
+        alpha = 1 / window
+        com = (1 - alpha) / alpha  # pandas pasa el alpha a center of mass
+        self._up = _EWM(com=com, min_periods=window)
+        self._down = _EWM(com=com, min_periods=window)
+        self._prev = NAN
+        self.value = NAN
+
+    def update(self, close):
+        diff = close - self._prev
+        up = diff if diff > 0 else 0.0
+        down = -diff if diff < 0 else -0.0
+        self._prev = close
+
+        emaup = self._up.update(up)
+        emadn = self._down.update(down)
+
+        if emadn == 0:
+            self.value = 100.0
+        else:
+            self.value = 100 - (100 / (1 + emaup / emadn)) if emadn == emadn else NAN
+        return self.value
+
+    @classmethod
+    def from_history(cls, close, window=14):
+        ind = cls(window)
+        for c in np.asarray(close, dtype=np.float64).tolist():
+            ind.update(c)
+        return ind
+
+
+class StreamingADX:
+    """
+    Replica ta.trend.ADXIndicator(...).adx():
+    - Las primeras 2 * window - 1 velas dan 0 (no NaN)
+    - Las sumas iniciales de TR, +DM y -DM son de las velas 1..window
+    - Desde ahi cada vela actualiza el suavizado de Wilder y el ADX
+    """
+    __slots__ = ('window', 'n', 'prev_high', 'prev_low', 'prev_close',
+                 'trs', 'dip', 'din', '_tr_buf', '_pos_buf', '_neg_buf', '_di_buf', 'adx', 'value')
+
+    def __init__(self, window=14):
+        self.window = window
+        self.n = 0  # velas procesadas
+        self.prev_high = self.prev_low = self.prev_close = NAN
+        self.trs = self.dip = self.din = 0.0
+        self._tr_buf, self._pos_buf, self._neg_buf, self._di_buf = [], [], [], []
+        self.adx = 0.0
+        self.value = 0.0
+
+    def update(self, high, low, close):
+        w = self.window
+        b = self.n  # posicion de esta vela
+
+        tr = max(high, self.prev_close) - min(low, self.prev_close) if b > 0 else NAN
+        diff_up = high - self.prev_high
+        diff_down = self.prev_low - low
+        pos = abs(diff_up) if (diff_up > diff_down and diff_up > 0) else 0.0
+        neg = abs(diff_down) if (diff_down > diff_up and diff_down > 0) else 0.0
+
+        self.prev_high, self.prev_low, self.prev_close = high, low, close
+        self.n += 1
+
+        if b == 0:
+            self.value = 0.0
+            return self.value
+
+        if b <= w:
+            # sumas iniciales (velas 1..window)
+            self._tr_buf.append(tr)
+            self._pos_buf.append(pos)
+            self._neg_buf.append(neg)
+            if b < w:
+                self.value = 0.0
+                return self.value
+            self.trs = pd.Series(self._tr_buf).sum()
+            self.dip = pd.Series(self._pos_buf).sum()
+            self.din = pd.Series(self._neg_buf).sum()
+            self._tr_buf = self._pos_buf = self._neg_buf = None
+        else:
+            self.trs = self.trs - (self.trs / float(w)) + tr
+            self.dip = self.dip - (self.dip / float(w)) + pos
+            self.din = self.din - (self.din / float(w)) + neg
+
+        # directional index de esta vela (indice b - window en ta)
+        di_pos = 100 * (self.dip / self.trs) if self.trs != 0 else 0
+        di_neg = 100 * (self.din / self.trs) if self.trs != 0 else 0
+        if di_pos + di_neg != 0:
+            di = 100 * abs((di_pos - di_neg) / (di_pos + di_neg))
+        else:
+            di = 0.0
+
+        k = b - w + 1  # indice del adx que se muestra en esta vela
+        if k < w:
+            self._di_buf.append(di)
+            self.value = 0.0
+        elif k == w:
+            self._di_buf.append(di)
+            self.adx = np.array(self._di_buf).mean()
+            self._di_buf = None
+            self.value = self.adx
+        else:
+            self.adx = ((self.adx * (w - 1)) + di) / float(w)
+            self.value = self.adx
+
+        return self.value
+
+    def peek(self, high, low, close):
+        """
+        Valor que tendria el ADX si la vela cerrara con estos precios, sin modificar el estado
+        (sirve para la vela semanal en formacion)
+        """
+        return copy.deepcopy(self).update(high, low, close)
+
+    @classmethod
+    def from_history(cls, df, window=14):
+        ind = cls(window)
+        for h, l, c in zip(df['high'].tolist(), df['low'].tolist(), df['close'].tolist()):
+            ind.update(h, l, c)
+        return ind
+
+
+class WeeklyToHourly:
+    """
+    ffill del ADX semanal a velas horarias, igual que add_adx_to_data:
+    cada hora toma el valor de la ultima semana cuyo inicio es <= a la hora.
+    """
+    __slots__ = ('week_time', 'week_value', 'prev_time', 'prev_value')
+
+    def __init__(self):
+        self.week_time = self.prev_time = None
+        self.week_value = self.prev_value = NAN
+
+    def update_week(self, week_time, value):
+        """
+        Informa el valor de una semana (si es la misma semana se pisa, para la vela en formacion)
+        """
+        week_time = pd.Timestamp(week_time)
+        if self.week_time is not None and week_time != self.week_time:
+            self.prev_time, self.prev_value = self.week_time, self.week_value
+        self.week_time, self.week_value = week_time, value
+
+    def value(self, hour_time):
+        hour_time = pd.Timestamp(hour_time)
+        if self.week_time is not None and hour_time >= self.week_time:
+            return self.week_value
+        if self.prev_time is not None and hour_time >= self.prev_time:
+            return self.prev_value
+        return NAN
+
+
+def _signal(adx, cruce, rsi, adx_level, rsi_level_long, rsi_level_short, distance_ma):
+    """
+    Misma logica que e03_signals.add_signals para una sola vela
+    """
+    if adx > adx_level:
+        if cruce > distance_ma:
+            return SIGNAL_LONG
+        if cruce < -distance_ma:
+            return SIGNAL_SHORT
+    elif adx <= adx_level:
+        if rsi < rsi_level_long:
+            return SIGNAL_LONG
+        if rsi > rsi_level_short:
+            return SIGNAL_SHORT
+    return SIGNAL_NONE
+
+
+class StreamingStrategy:
+    """
+    Estrategia de backtest.run en vivo: ADX semanal + cruce de EMAs + RSI horario
+    """
+
+    def __init__(self, ema_slow, ema_fast, adx_level, rsi_level_long, rsi_level_short, distance_ma,
+                 forming_week=True):
+        """
+        :param forming_week: True = el ADX de cada hora es el de la semana en formacion (peek), como en batch.
+                             False = solo semanas cerradas (una semana de atraso respecto de batch)
+        """
+        self.ema_slow = StreamingEMA(ema_slow)
+        self.ema_fast = StreamingEMA(ema_fast)
+        self.rsi = StreamingRSI()
+        self.adx = StreamingADX()
+        self.adx_hourly = WeeklyToHourly()
+        self.params = (adx_level, rsi_level_long, rsi_level_short, distance_ma)
+        self.forming_week = forming_week
+        self.last_week = None  # inicio de la ultima semana cerrada
+        self.week = None  # [inicio, high, low, close] de la semana en formacion
+
+    def seed(self, df_week, df_hour):
+        """
+        Siembra los indicadores con la historia (una sola pasada)
+        """
+        for t, h, l, c in zip(df_week.index, df_week['high'].tolist(), df_week['low'].tolist(),
+                              df_week['close'].tolist()):
+            self.on_week(t, h, l, c)
+        for c in df_hour['close'].tolist():
+            self.ema_slow.update(c)
+            self.ema_fast.update(c)
+            self.rsi.update(c)
+        return self
+
+    def on_week(self, week_time, high, low, close):
+        """
+        Vela semanal cerrada
+        """
+        self.last_week = pd.Timestamp(week_time)
+        self.adx_hourly.update_week(self.last_week, self.adx.update(high, low, close))
+
+    def _forming_week_adx(self, hour_time, high, low, close):
+        """
+        Agrega la hora a la semana en formacion y actualiza su ADX con peek()
+        """
+        week_time = week_start(hour_time)
+        if self.last_week is not None and week_time <= self.last_week:
+            return  # la semana ya cerro
+
+        if self.week is None or self.week[0] != week_time:
+            self.week = [week_time, high, low, close]
+        else:
+            self.week[1] = max(self.week[1], high)
+            self.week[2] = min(self.week[2], low)
+            self.week[3] = close
+        self.adx_hourly.update_week(week_time, self.adx.peek(*self.week[1:]))
+
+    def on_hour(self, hour_time, close, high=None, low=None):
+        """
+        Vela horaria cerrada. Devuelve la señal como en add_signals: 1 LONG, -1 SHORT, 0 nada
+        :param high: maximo de la hora para la semana en formacion (default: close)
+        :param low: minimo de la hora para la semana en formacion (default: close)
+        """
+        if self.forming_week:
+            self._forming_week_adx(hour_time, close if high is None else high, close if low is None else low, close)
+
+        fast = self.ema_fast.update(close)
+        slow = self.ema_slow.update(close)
+        rsi = self.rsi.update(close)
+        cruce = fast / slow - 1 if not (math.isnan(fast) or math.isnan(slow)) else NAN
+        adx = self.adx_hourly.value(hour_time)
+        return _signal(adx, cruce, rsi, *self.params)
+
+
+def week_start(time):
+    """
+    Inicio de la semana de Binance (lunes 00:00) que contiene a time
+    """
+    time = pd.Timestamp(time)
+    return time.normalize() - pd.Timedelta(days=time.weekday())
+
+
+def check_batch(df_week, df_hour, ema_window=20, rsi_window=14):
+    """
+    Compara los indicadores en streaming con los de e02_indicadores sobre la misma data.
+    Levanta AssertionError si algun valor no coincide exactamente.
+    :return: dict indicador -> cantidad de valores comparados
+    """
+    from e02_indicadores import get_adx, get_adx_hourly, get_ema, get_rsi
+
+    def check(nombre, batch, streaming):
+        batch = np.asarray(batch, dtype=np.float64)
+        streaming = np.asarray(streaming, dtype=np.float64)
+        iguales = (batch == streaming) | (np.isnan(batch) & np.isnan(streaming))
+        assert iguales.all(), f'{nombre}: {(~iguales).sum()} valores distintos, el primero en {np.argmin(iguales)}'
+        return len(batch)
+
+    close = df_hour['close'].tolist()
+    ema, rsi = StreamingEMA(ema_window), StreamingRSI(rsi_window)
+    adx = StreamingADX()
+
+    result = {
+        'EMA': check('EMA', get_ema(df_hour, ema_window), [ema.update(c) for c in close]),
+        'RSI': check('RSI', get_rsi(df_hour, rsi_window), [rsi.update(c) for c in close]),
+        'ADX': check('ADX', get_adx(df_week), [adx.update(h, l, c) for h, l, c in
+                                              zip(df_week['high'].tolist(), df_week['low'].tolist(),
+                                                  df_week['close'].tolist())]),
+    }
+
+    # ADX semanal en la data horaria: con la semana en formacion coincide en la ultima hora de cada semana
+    strategy = StreamingStrategy(ema_window, ema_window, 0, 0, 100, 0)
+    pending = iter(df_week[['high', 'low', 'close']].itertuples())
+    next_week = next(pending, None)
+    streaming = np.full(len(df_hour), NAN)
+    for i, (t, h, l, c) in enumerate(zip(df_hour.index, df_hour['high'].tolist(), df_hour['low'].tolist(), close)):
+        # la vela semanal cierra antes de la primera hora de la semana siguiente
+        while next_week is not None and week_start(t) > next_week.Index:
+            strategy.on_week(next_week.Index, next_week.high, next_week.low, next_week.close)
+            next_week = next(pending, None)
+        strategy.on_hour(t, c, high=h, low=l)
+        streaming[i] = strategy.adx_hourly.value(t)
+
+    ultima_hora = pd.Series(df_hour.index.map(week_start), index=df_hour.index)
+    ultima_hora = (ultima_hora != ultima_hora.shift(-1)).to_numpy()
+    ultima_hora[-1] = False  # la ultima semana puede no estar completa
+    batch = get_adx_hourly(df_week, df_hour).to_numpy()
+    result['ADX_hourly'] = check('ADX_hourly', batch[ultima_hora], streaming[ultima_hora])
+
+    return result
+
+
+if __name__ == '__main__':
+    import dataset
+
+    symbol = 'ETHUSDT'
+    df_week = dataset.load_frame(symbol, '1w')
+    df_hour = dataset.load_frame(symbol, '1h')
+
+    for nombre, n in check_batch(df_week, df_hour).items():
+        print(f'{nombre}: {n} valores iguales a batch')
@@ -1,6 +1,68 @@
 import numpy as np
 import pandas as pd
 
+# pip install numba (opcional, si no esta se usa la version con numpy)
+try:
+    from numba import njit
+    NUMBA = True
+except ImportError:
+    NUMBA = False
+
+# La señal se guarda como int8: 1 LONG, -1 SHORT, 0 sin señal
+SIGNAL_LONG = 1
+SIGNAL_SHORT = -1
+SIGNAL_NONE = 0
+SIGNAL_LABELS = {SIGNAL_SHORT: 'SHORT', SIGNAL_NONE: '', SIGNAL_LONG: 'LONG'}
+
+
+def signal_array(adx, cruce, rsi, adx_level, rsi_level_long, rsi_level_short, distance_ma):
+    """
+    Condiciones de add_signals con numpy. Funciona con arrays 1-D o con broadcasting 2-D (barras x parametros).
+    LONG tiene prioridad sobre SHORT igual que en los np.where anidados originales.
+    :return: np.ndarray int8
+    """
+    trend = adx > adx_level
+    lateral = adx <= adx_level
+
+    long_ = (trend & (cruce > distance_ma)) | (lateral & (rsi < rsi_level_long))
+    short_ = ((trend & (cruce < -distance_ma)) | (lateral & (rsi > rsi_level_short))) & ~long_
+
+    return long_.astype(np.int8) - short_.astype(np.int8)
+
+
+def _signal_kernel(adx, cruce, rsi, adx_level, rsi_level_long, rsi_level_short, distance_ma, out):
+    # Una sola pasada, sin arrays intermedios (las comparaciones con NaN dan False igual que en numpy)
+    for i in range(len(adx)):
+        a = adx[i]
+        s = 0
+        if a > adx_level:
+            if cruce[i] > distance_ma:
+                s = 1
+            elif cruce[i] < -distance_ma:
+                s = -1
+        elif a <= adx_level:
+            if rsi[i] < rsi_level_long:
+                s = 1
+            elif rsi[i] > rsi_level_short:
+                s = -1
+        out[i] = s
+    return out
+
+
+if NUMBA:
+    _signal_kernel = njit(cache=True, nogil=True)(_signal_kernel)
+
+
+def signal_labels(signal):
+    """
+    Vista para mostrar / exportar: Categorical con 'LONG', 'SHORT' y ''
+    :param signal: pd.Series int8
+    :return: pd.Series categorica
+    """
+    labels = pd.Categorical.from_codes(np.asarray(signal, dtype=np.int8) + 1, categories=['SHORT', '', 'LONG'])
+    return pd.Series(labels, index=getattr(signal, 'index', None), name='signal')
+
+
 def add_signals(df, adx_level, rsi_level_long, rsi_level_short, distance_ma):
     """
     Si el ADX esta por encima del adx_level, estamos en tendencia. Usamos distance_ma.
@@ -11,6 +73,8 @@ def add_signals(df, adx_level, rsi_level_long, rsi_level_short, distance_ma):
         Si el RSI es mayor a rsi_level_long == LONG
         Si el RSI es menor a rsi_level_short == SHORT
 
+    La columna signal es int8 (1 LONG, -1 SHORT, 0 sin señal). Para verla como texto usar signal_labels.
+
     :param df:
     :param adx_level: int
     :param rsi_level_long: float
@@ -19,18 +83,16 @@ def add_signals(df, adx_level, rsi_level_long, rsi_level_short, distance_ma):
     :return: df con las señales de LONG y SHORT
     """
 
-    # Create conditions for trend signals
-    trend_long_condition = (df['ADX'] > adx_level) & (df['cruce'] > distance_ma)
-    trend_short_condition = (df['ADX'] > adx_level) & (df['cruce'] < -distance_ma)
+    adx = df['ADX'].to_numpy(dtype=np.float64)
+    cruce = df['cruce'].to_numpy(dtype=np.float64)
+    rsi = df['rsi'].to_numpy(dtype=np.float64)
 
-    # Create conditions for lateral trend signals
-    lateral_long_condition = (df['ADX'] <= adx_level) & (df['rsi'] < rsi_level_long)
-    lateral_short_condition = (df['ADX'] <= adx_level) & (df['rsi'] > rsi_level_short)
+    if NUMBA:
+        signal = _signal_kernel(adx, cruce, rsi, float(adx_level), float(rsi_level_long), float(rsi_level_short),
+                                float(distance_ma), np.empty(len(adx), dtype=np.int8))
+    else:
+        signal = signal_array(adx, cruce, rsi, adx_level, rsi_level_long, rsi_level_short, distance_ma)
 
-    # Combine all conditions using numpy.where()
-    df['signal'] = np.where(trend_long_condition, 'LONG',
-                            np.where(trend_short_condition, 'SHORT',
-                                     np.where(lateral_long_condition, 'LONG',
-                                              np.where(lateral_short_condition, 'SHORT', ''))))
+    df['signal'] = signal
 
     return df
@@ -26,14 +26,34 @@ Si tiene posicion, verifica cierre por:
 
 """
 
+import numpy as np
 import pandas as pd
 
-def simulate_trades(df, sl, tp, fee):
+from e03_signals import SIGNAL_LONG as SIDE_LONG, SIGNAL_SHORT as SIDE_SHORT, SIGNAL_LABELS
+
+# pip install numba (opcional, si no esta se usa el loop en python puro sobre arrays tipados)
+try:
+    from numba import njit
+    NUMBA = True
+except ImportError:
+    NUMBA = False
+
+# Codigos numericos del motivo de cierre
+MOTIVO_TP = 0
+MOTIVO_SL = 1
+MOTIVO_SIGNAL = 2
+MOTIVOS = np.array(['TP', 'SL', 'signal'], dtype=object)
+
+
+def simulate_trades(df, sl, tp, fee, fee_close=None, funding_rates=None):
     """
     Simulate trades
     :param df:
     :param sl:
     :param tp:
+    :param fee: fee de apertura (ver add_pnl)
+    :param fee_close: fee de cierre (ver add_pnl), por defecto igual a fee
+    :param funding_rates: serie de funding de perpetuos (ver add_pnl)
     :return:
     """
 
@@ -48,6 +68,7 @@ def simulate_trades(df, sl, tp, fee):
     """
 
     df_index = df.reset_index()  # Reseteamos el index para poder acceder a la fecha
+    df_index['signal'] = encode_signals(df_index['signal'])  # señal como int8: 1 LONG, -1 SHORT, 0 nada
     data = df_index.to_numpy()  # Convertimos el df a un array de numpy
     columns = df_index.columns.tolist()  # Guardamos los nombres de las columnas
     column_indices = {col: columns.index(col) for col in columns}
@@ -73,14 +94,14 @@ def simulate_trades(df, sl, tp, fee):
 
         # ABRIR POSICION
         if not pos_open:
-            if signal in ['LONG', 'SHORT']:
+            if signal in [SIDE_LONG, SIDE_SHORT]:
                 pos_open = True
                 side = signal
-                tp_price = close * (1 + tp) if signal == 'LONG' else close * (1 - tp)
-                sl_price = close * (1 - sl) if signal == 'LONG' else close * (1 + sl)
+                tp_price = close * (1 + tp) if signal == SIDE_LONG else close * (1 - tp)
+                sl_price = close * (1 - sl) if signal == SIDE_LONG else close * (1 + sl)
                 position = {
                     'time_open': time,
-                    'side': side,
+                    'side': SIGNAL_LABELS[side],
                     'price_open': close,
                     'tp': tp_price,
                     'sl': sl_price,
@@ -92,12 +113,12 @@ def simulate_trades(df, sl, tp, fee):
             motivo = ''
 
             # VERIFICO TAKE PROFIT
-            if (side == 'LONG' and close >= tp_price) or (side == 'SHORT' and close <= tp_price):
+            if (side == SIDE_LONG and close >= tp_price) or (side == SIDE_SHORT and close <= tp_price):
                 close_position = True
                 motivo = 'TP'
 
             # VERIFICO STOP LOSS
-            if (side == 'LONG' and close <= sl_price) or (side == 'SHORT' and close >= sl_price):
+            if (side == SIDE_LONG and close <= sl_price) or (side == SIDE_SHORT and close >= sl_price):
                 close_position = True
                 motivo = 'SL'
 
@@ -115,7 +136,7 @@ def simulate_trades(df, sl, tp, fee):
 
                 trades.append(position)
                 pos_open = False
-                last_side_used = position['side']
+                last_side_used = side
                 position = {}
 
     trades = pd.DataFrame(trades)
@@ -123,23 +144,234 @@ def simulate_trades(df, sl, tp, fee):
     # duracion en horas
     trades['duracion'] = (trades['time_close'] - trades['time_open']).dt.total_seconds() / 3600
 
+    # pnl y pnl neto para todos los trades juntos (sin apply fila por fila)
+    return add_pnl(trades, fee, fee_close=fee_close, funding_rates=funding_rates)
+
+
+def _fee_array(fee, trades):
+    """
+    Fee por trade: escalar, array (uno por trade) o dict por motivo de cierre, ej. {'TP': maker, 'SL': taker}
+    """
+    if isinstance(fee, dict):
+        return trades['motivo'].map(fee).to_numpy(dtype=np.float64)
+    return np.broadcast_to(np.asarray(fee, dtype=np.float64), (len(trades),))
+
+
+def funding_between(trades, funding_rates):
+    """
+    Suma de las tasas de funding cobradas mientras cada trade estuvo abierto
+    (tasas con fecha en (time_open, time_close]).
+    :param funding_rates: pd.Series de tasas con index datetime (ej. cada 8 horas en perpetuos)
+    :return: np.ndarray con el funding acumulado de cada trade
+    """
+    funding_rates = funding_rates.sort_index()
+    cum = np.concatenate([[0.0], np.cumsum(funding_rates.to_numpy(dtype=np.float64))])
+    times = funding_rates.index.as_unit('ns').asi8
+
+    i_open = np.searchsorted(times, pd.DatetimeIndex(trades['time_open']).as_unit('ns').asi8, side='right')
+    i_close = np.searchsorted(times, pd.DatetimeIndex(trades['time_close']).as_unit('ns').asi8, side='right')
+    return cum[i_close] - cum[i_open]
+
+
+def add_pnl(trades, fee, fee_close=None, funding_rates=None):
+    """
+    Agrega pnl y pnl_neto (en %) al ledger de trades con operaciones vectorizadas.
+
+    - LONG:  pnl_neto = precio cierre * (1 - fee cierre) / (precio apertura * (1 + fee apertura)) - 1
+    - SHORT: pnl_neto = 1 - precio cierre * (1 + fee cierre) / (precio apertura * (1 - fee apertura))
+    - Funding: con tasa positiva el LONG paga y el SHORT cobra
+
+    :param trades: df con side, price_open, price_close, motivo, time_open, time_close
+    :param fee: fee de apertura. Escalar, array por trade o dict por motivo
+    :param fee_close: fee de cierre, igual formato. Por defecto igual a fee
+    :param funding_rates: pd.Series de tasas de funding con index datetime (opcional)
+    :return: trades con las columnas pnl y pnl_neto
+    """
+    is_long = (trades['side'] == 'LONG').to_numpy()
+    price_open = trades['price_open'].to_numpy(dtype=np.float64)
+    price_close = trades['price_close'].to_numpy(dtype=np.float64)
+
+    fee_open = _fee_array(fee, trades)
+    fee_close = fee_open if fee_close is None else _fee_array(fee_close, trades)
+
     # pnl, si es long, el pnl es precio cierre / precio apertura - 1, si es short, es al reves
-    # la fx lambda recibe una fila y devuelve el pnl
-    # axis=1 para que recorra por filas
-    trades['pnl'] = trades.apply(lambda x: x['price_close'] / x['price_open'] - 1 if x['side'] == 'LONG' else 1 - x['price_close'] / x['price_open'], axis=1)
-    trades['pnl'] = trades['pnl'] * 100
+    trades['pnl'] = np.where(is_long, price_close / price_open - 1, 1 - price_close / price_open) * 100
+
+    pnl_neto = np.where(is_long,
+                        price_close * (1 - fee_close) / (price_open * (1 + fee_open)) - 1,
+                        1 - price_close * (1 + fee_close) / (price_open * (1 - fee_open)))
 
-    # # pnl neto
-    trades['pnl_neto'] = trades.apply(
-        lambda x:(x['price_close'] * (1 - fee) / (x['price_open'] * (1 + fee)) - 1) if x['side'] == 'LONG'
-        else (1 - x['price_close'] * (1 + fee) / (x['price_open'] * (1 - fee))), axis=1)
-    trades['pnl_neto'] = trades['pnl_neto'] * 100
+    if funding_rates is not None and len(trades):
+        funding = funding_between(trades, funding_rates)
+        pnl_neto = pnl_neto - np.where(is_long, funding, -funding)
+
+    trades['pnl_neto'] = pnl_neto * 100
 
     return trades
 
 
 
 
+def encode_signals(signal):
+    """
+    Convierte la columna signal a int8: LONG = 1, SHORT = -1, sin señal = 0.
+    Si ya viene numerica la devuelve como int8 sin tocar los valores.
+    :param signal: pd.Series o array con las señales
+    :return: np.ndarray int8
+    """
+    values = np.asarray(signal)
+    if values.dtype.kind in 'iub':
+        return values.astype(np.int8, copy=False)
+    if values.dtype.kind == 'f':
+        return np.nan_to_num(values).astype(np.int8)
+
+    encoded = np.zeros(len(values), dtype=np.int8)
+    encoded[values == 'LONG'] = SIDE_LONG
+    encoded[values == 'SHORT'] = SIDE_SHORT
+    return encoded
+
+
+def _simulate_kernel(signal, close, sl, tp):
+    """
+    Misma logica que el loop de simulate_trades pero sobre arrays tipados (int8 y float64).
+    Devuelve los indices de apertura y cierre, el side y el motivo de cada trade.
+    """
+    n = len(signal)
+    open_idx = np.empty(n, dtype=np.int64)
+    close_idx = np.empty(n, dtype=np.int64)
+    sides = np.empty(n, dtype=np.int8)
+    motivos = np.empty(n, dtype=np.int8)
+    k = 0
+
+    last_side_used = 0
+    side = 0
+    i_open = 0
+    tp_price = 0.0
+    sl_price = 0.0
+
+    for i in range(n):
+        s = signal[i]
+        c = close[i]
+
+        # Verifico si no estoy abriendo una posicion para el mismo lado a la previamente cerrada
+        if last_side_used != 0:
+            if s != last_side_used:
+                last_side_used = 0
+            else:
+                continue
+
+        # ABRIR POSICION
+        if side == 0:
+            if s != 0:
+                side = s
+                i_open = i
+                if s == 1:
+                    tp_price = c * (1 + tp)
+                    sl_price = c * (1 - sl)
+                else:
+                    tp_price = c * (1 - tp)
+                    sl_price = c * (1 + sl)
+
+        # CERRAR POSICION (el orden de los chequeos respeta la prioridad signal > SL > TP)
+        else:
+            motivo = -1
+            if (side == 1 and c >= tp_price) or (side == -1 and c <= tp_price):
+                motivo = 0
+            if (side == 1 and c <= sl_price) or (side == -1 and c >= sl_price):
+                motivo = 1
+            if s != side:
+                motivo = 2
+
+            if motivo >= 0:
+                open_idx[k] = i_open
+                close_idx[k] = i
+                sides[k] = side
+                motivos[k] = motivo
+                k += 1
+                last_side_used = side
+                side = 0
+
+    return open_idx[:k], close_idx[:k], sides[:k], motivos[:k]
+
+
+if NUMBA:
+    _simulate_kernel_jit = njit(cache=True, nogil=True)(_simulate_kernel)
+else:
+    _simulate_kernel_jit = None
+
+
+def run_kernel(signal, close, sl, tp, use_numba=True):
+    """
+    Corre el kernel de simulacion. Con numba compila el loop, sin numba itera sobre listas de python
+    (mucho mas rapido que iterar un array de tipo object con lookups por nombre de columna).
+    :param signal: np.ndarray int8
+    :param close: np.ndarray float64
+    :return: open_idx, close_idx, sides, motivos
+    """
+    signal = np.ascontiguousarray(signal, dtype=np.int8)
+    close = np.ascontiguousarray(close, dtype=np.float64)
+
+    if use_numba and NUMBA:
+        return _simulate_kernel_jit(signal, close, float(sl), float(tp))
+
+    open_idx, close_idx, sides, motivos = _simulate_kernel(signal.tolist(), close.tolist(), sl, tp)
+    return open_idx, close_idx, sides, motivos
+
+
+def build_trades(index, close, open_idx, close_idx, sides, motivos, sl, tp, fee, fee_close=None, funding_rates=None):
+    """
+    Arma el DataFrame de trades (mismas columnas que simulate_trades) a partir de la salida del kernel.
+    :param index: DatetimeIndex del df de señales
+    :param close: np.ndarray float64 con los precios de cierre
+    :return: pd.DataFrame
+    """
+    is_long = sides == SIDE_LONG
+    price_open = close[open_idx]
+    price_close = close[close_idx]
+
+    times = np.asarray(index.as_unit('ns').asi8)
+    time_open = index[open_idx]
+    time_close = index[close_idx]
+
+    trades = pd.DataFrame({
+        'time_open': time_open,
+        'side': np.where(is_long, 'LONG', 'SHORT').astype(object),
+        'price_open': price_open,
+        'tp': np.where(is_long, price_open * (1 + tp), price_open * (1 - tp)),
+        'sl': np.where(is_long, price_open * (1 - sl), price_open * (1 + sl)),
+        'time_close': time_close,
+        'price_close': price_close,
+        'motivo': MOTIVOS[motivos],
+    })
+
+    # duracion en horas, con el tiempo en int64 nanosegundos
+    trades['duracion'] = (times[close_idx] - times[open_idx]) / 3.6e12
+
+    return add_pnl(trades, fee, fee_close=fee_close, funding_rates=funding_rates)
+
+
+def simulate_trades_fast(df, sl, tp, fee, use_numba=True, fee_close=None, funding_rates=None):
+    """
+    Version rapida de simulate_trades. Trabaja con la señal codificada en int8, el close en float64
+    y el tiempo en int64 (nanosegundos). Devuelve el mismo DataFrame de trades.
+    :param df: df con las columnas 'close' y 'signal' e index de fechas
+    :param sl:
+    :param tp:
+    :param fee:
+    :param use_numba: si es False fuerza el loop en python puro
+    :param fee_close: fee de cierre (ver add_pnl)
+    :param funding_rates: serie de funding de perpetuos (ver add_pnl)
+    :return: pd.DataFrame con los trades
+    """
+    signal = encode_signals(df['signal'])
+    close = df['close'].to_numpy(dtype=np.float64)
+
+    open_idx, close_idx, sides, motivos = run_kernel(signal, close, sl, tp, use_numba=use_numba)
+
+    return build_trades(df.index, close, open_idx, close_idx, sides, motivos, sl, tp, fee,
+                        fee_close=fee_close, funding_rates=funding_rates)
+
+
 if __name__ == '__main__':
     df_signals = pd.read_feather('df_signals.feather')
     trades = simulate_trades(df_signals, sl=0.01, tp=0.02, fee=0.05/100)
@@ -1,77 +1,162 @@
+import math
+
 import pandas as pd
 import numpy as np
 import pprint
 
-def stats(trades):
+
+class StatsAccumulator:
+    """
+    Calcula las metricas de stats en una sola pasada, trade por trade.
+    Sirve para un DataFrame entero (stats) o para ir agregando trades a medida que se cierran.
     """
 
-    :param trades:
-    :return:
+    def __init__(self):
+        self.n = 0
+        self.wins = 0
+        self.total_profit = 0.0  # suma de pnl_neto de los ganadores
+        self.total_loss = 0.0  # suma de pnl_neto de los perdedores (negativa)
+
+        # drawdown
+        self.cumulative = 0.0
+        self.running_max = -math.inf
+        self.peak_time = None
+        self.max_drawdown = -math.inf
+        self.max_dd_start = self.max_dd_end = None
+
+        # rachas
+        self.streak = 0
+        self.last_profit = None
+        self.max_win_streak = self.max_lose_streak = 0
+
+        # tiempos
+        self.first_open = None
+        self.last_close = None
+
+        # volatilidad de los retornos por hora (Welford)
+        self.hr_n = 0
+        self.hr_mean = 0.0
+        self.hr_m2 = 0.0
+
+    def update(self, pnl_neto, time_open, time_close, duracion):
+        """
+        Agrega un trade
+        :param pnl_neto: pnl neto en %
+        :param time_open: fecha de apertura (Timestamp o int64 en ns)
+        :param time_close: fecha de cierre (Timestamp o int64 en ns)
+        :param duracion: horas
+        """
+        self.n += 1
+        is_profit = pnl_neto > 0
+
+        if is_profit:
+            self.wins += 1
+            self.total_profit += pnl_neto
+        else:
+            self.total_loss += pnl_neto
+
+        # drawdown: el pico es el primer trade donde se alcanzo el maximo del pnl acumulado
+        self.cumulative += pnl_neto
+        if self.cumulative > self.running_max:
+            self.running_max = self.cumulative
+            self.peak_time = time_close
+        drawdown = self.running_max - self.cumulative
+        if drawdown > self.max_drawdown:
+            self.max_drawdown = drawdown
+            self.max_dd_end = time_close
+            self.max_dd_start = self.peak_time
+
+        # rachas de ganadores y perdedores
+        self.streak = self.streak + 1 if is_profit == self.last_profit else 1
+        self.last_profit = is_profit
+        if is_profit:
+            self.max_win_streak = max(self.max_win_streak, self.streak)
+        else:
+            self.max_lose_streak = max(self.max_lose_streak, self.streak)
+
+        # el periodo va de la primera apertura al ultimo cierre (en un portfolio los trades se solapan y
+        # el primero que cierra no es necesariamente el primero que abrio)
+        if self.first_open is None or time_open < self.first_open:
+            self.first_open = time_open
+        if self.last_close is None or time_close > self.last_close:
+            self.last_close = time_close
+
+        # retorno por hora
+        hourly_return = pnl_neto / duracion
+        self.hr_n += 1
+        delta = hourly_return - self.hr_mean
+        self.hr_mean += delta / self.hr_n
+        self.hr_m2 += delta * (hourly_return - self.hr_mean)
+
+    def update_many(self, pnl_neto, time_open, time_close, duracion):
+        """
+        Agrega muchos trades (arrays del mismo largo)
+        """
+        for trade in zip(np.asarray(pnl_neto, dtype=np.float64).tolist(), np.asarray(time_open).tolist(),
+                         np.asarray(time_close).tolist(), np.asarray(duracion, dtype=np.float64).tolist()):
+            self.update(*trade)
+        return self
+
+    def result(self):
+        """
+        :return: dict con las mismas metricas que stats
+        """
+        n = self.n
+        total_loss = abs(self.total_loss)
+        profit_loss_ratio = self.total_profit / total_loss if total_loss != 0 else np.inf
+
+        win_rate = self.wins / n * 100 if n else np.nan
+        avg_win = self.total_profit / self.wins if self.wins else np.nan
+        avg_loss = self.total_loss / (n - self.wins) if n - self.wins else np.nan
+        expectancy = avg_win * win_rate + avg_loss * (100 - win_rate)
+
+        total_return = self.total_profit + self.total_loss
+        if n:
+            total_hours = _hours(self.last_close) - _hours(self.first_open)
+            annualized_return = (total_return / total_hours) * 24 * 365
+        else:
+            annualized_return = np.nan
+
+        volatility = math.sqrt(self.hr_m2 / (self.hr_n - 1)) * np.sqrt(24 * 365) if self.hr_n > 1 else np.nan
+        sharpe = annualized_return / volatility if volatility != 0 else np.inf
+
+        return {
+            'profit_loss_ratio': profit_loss_ratio,
+            'win_rate': win_rate,
+            'esperanza_matematica': expectancy,
+            'max_drawdown': self.max_drawdown if n else np.nan,
+            'max_dd_start': _timestamp(self.max_dd_start),
+            'max_dd_end': _timestamp(self.max_dd_end),
+            'max_win_streak': self.max_win_streak,
+            'max_lose_streak': self.max_lose_streak,
+            'sharpe': sharpe,
+            'profit_factor': profit_loss_ratio,
+            'total_return': total_return,
+            'annualized_return': annualized_return,
+        }
+
+
+def _hours(t):
+    # int64 en ns o Timestamp a horas
+    return (t if isinstance(t, int) else pd.Timestamp(t).value) / 3.6e12
+
+
+def _timestamp(t):
+    return pd.Timestamp(t) if t is not None else None
+
+
+def stats(trades):
+    """
+    Metricas de la estrategia en una sola pasada sobre arrays tipados (no modifica trades).
+    :param trades: df con pnl_neto, time_open, time_close y duracion
+    :return: dict con las metricas
     """
+    time_open = pd.DatetimeIndex(trades['time_open']).as_unit('ns').asi8
+    time_close = pd.DatetimeIndex(trades['time_close']).as_unit('ns').asi8
+
+    acc = StatsAccumulator().update_many(trades['pnl_neto'], time_open, time_close, trades['duracion'])
+    return acc.result()
 
-    # Calcular ratio ganancia/pérdida
-    trades['is_profit'] = trades['pnl_neto'] > 0  # si es profit el valor es True, si no, False
-    total_profit = trades[trades['is_profit']]['pnl_neto'].sum()  # sumo los profit, SIMULO ORDEN FIJA
-    total_loss = abs(trades[~trades['is_profit']]['pnl_neto'].sum())  # con ~ niego la condicion, es decir, si no es profit
-    profit_loss_ratio = total_profit / total_loss if total_loss != 0 else np.inf  # si total_loss es 0, devuelvo infinito
-
-    # Calcular porcentaje de trades ganadores
-    win_rate = (trades['is_profit'].sum() / len(trades)) * 100  # trades ganadores / total trades
-
-    # Calcular esperanza matemática (expectancy)
-    avg_win = trades[trades['is_profit']]['pnl_neto'].mean()
-    avg_loss = trades[~trades['is_profit']]['pnl_neto'].mean()
-    expectancy = avg_win * win_rate + avg_loss * (100 - win_rate)
-
-    # Calcular drawdown
-    trades['cumulative_pnl'] = trades['pnl_neto'].cumsum()
-    trades['running_max'] = trades['cumulative_pnl'].cummax()  # va guardando el máximo de la serie
-    trades['drawdown'] = trades['running_max'] - trades['cumulative_pnl']  # drawdown es la diferencia entre el máximo y el actual
-    max_drawdown = trades['drawdown'].max()  # el máximo drawdown
-
-    # Calcular fechas de inicio y fin del MaxDD
-    max_dd_end = trades.loc[trades['drawdown'] == max_drawdown, 'time_close'].iloc[0]
-    max_dd_start = trades.loc[trades['cumulative_pnl'] == trades.loc[
-        trades['time_close'] <= max_dd_end, 'running_max'].max(), 'time_close'].iloc[0]
-
-    # Calcular máximo de trades consecutivos ganadores y perdedores
-    trades['streak'] = (trades['is_profit'] != trades['is_profit'].shift()).cumsum()  # si el valor actual es distinto al anterior, sumo 1
-    win_streaks = trades[trades['is_profit']].groupby('streak').size()  # agrupo por streak y cuento cuantos hay
-    lose_streaks = trades[~trades['is_profit']].groupby('streak').size()  # lo mismo para los perdedores
-    max_win_streak = win_streaks.max() if not win_streaks.empty else 0  # si no hay trades ganadores devuelvo 0
-    max_lose_streak = lose_streaks.max() if not lose_streaks.empty else 0  # si no hay trades perdedores devuelvo 0
-
-    # Sharpe
-    total_hours = (trades['time_close'].iloc[-1] - trades['time_open'].iloc[0]).total_seconds() / 3600
-    total_return = trades['pnl_neto'].sum()
-    annualized_return = (total_return / total_hours) * 24 * 365
-
-    # Calcular volatilidad anualizada
-    hourly_returns = trades['pnl_neto'] / trades['duracion']  # pnl por hora
-    volatility = hourly_returns.std() * np.sqrt(24 * 365)  # desviación estándar de los retornos por hora
-    # con np.sqrt multiplico por la raiz cuadrada de las horas de trading al año y obtengo la volatilidad anualizada
-
-    sharpe = annualized_return / volatility if volatility != 0 else np.inf  # sharpe ratio
-
-    # Calcular el factor de beneficio (Profit Factor)
-    profit_factor = total_profit / abs(total_loss) if total_loss != 0 else np.inf
-
-    metrics = {
-        'profit_loss_ratio': profit_loss_ratio,
-        'win_rate': win_rate,
-        'esperanza_matematica': expectancy,
-        'max_drawdown': max_drawdown,
-        'max_dd_start': max_dd_start,
-        'max_dd_end': max_dd_end,
-        'max_win_streak': max_win_streak,
-        'max_lose_streak': max_lose_streak,
-        'sharpe': sharpe,
-        'profit_factor': profit_factor,
-        'total_return': total_return,
-        'annualized_return': annualized_return,
-    }
-
-    return metrics
 
 if __name__ == '__main__':
     trades = pd.read_feather('trades.feather')
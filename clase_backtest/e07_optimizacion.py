@@ -2,6 +2,8 @@
 Vamos a hacer optimizacion de los parametros con optimizacion bayesiana
 """
 from backtest import run
+import cache
+import dataset
 
 # pip install scikit-optimize
 
@@ -25,9 +27,12 @@ space = [
     Real(0.001, 0.1, name='tp')
 ]
 
+# Los indicadores quedan guardados en disco, las corridas siguientes no los recalculan
+cache.configure(cache_dir='cache')
+
 symbol = 'ETHUSDT'
-df_week = pd.read_feather(f'data/{symbol}_1w.feather')
-df = pd.read_feather(f'data/{symbol}_1h.feather')
+df_week = dataset.load_frame(symbol, '1w')
+df = dataset.load_frame(symbol, '1h')
 start_date = '2020-01-01'
 fee = 0.05 / 100
 
@@ -9,6 +9,8 @@ Best annualized return: 39.786508738786615
 import numpy as np
 import pandas as pd
 
+import dataset
+
 
 
 parametros = {
@@ -19,8 +21,8 @@ parametros = {
 }
 
 symbol = 'ETHUSDT'
-df_week = pd.read_feather(f'data/{symbol}_1w.feather')
-df = pd.read_feather(f'data/{symbol}_1h.feather')
+df_week = dataset.load_frame(symbol, '1w')
+df = dataset.load_frame(symbol, '1h')
 start_date = '2020-01-01'
 # start_date = '2023-10-31 12:00:00'
 fee = 0.05 / 100
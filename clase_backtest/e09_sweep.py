@@ -0,0 +1,208 @@
+"""
+Barrido de parametros (sensibilidad) en una sola pasada
+
+En vez de llamar a backtest.run por cada combinacion:
+- Calculamos cada indicador distinto una sola vez (ADX, RSI por ventana, EMA por ventana)
+- Armamos las señales de muchas combinaciones juntas como una matriz (barras x parametros)
+- Simulamos cada columna con el kernel de e04_trades y guardamos las metricas
+
+Devuelve una tabla con una fila por combinacion.
+"""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+import e02_indicadores as ind
+import e03_signals as sig
+import e04_trades as trades
+from e04_trades import NUMBA
+
+if NUMBA:
+    from numba import njit, prange
+else:
+    prange = range
+
+# Orden de los parametros de la grilla (mismos nombres que backtest.run)
+PARAMS = ['adx_level', 'rsi_level_long', 'rsi_level_short', 'ema_slow', 'ema_fast', 'distance_ma', 'sl', 'tp',
+          'rsi_window']
+
+METRICS = ['k_signals', 'k_trades', 'total_return', 'annualized_return', 'win_rate', 'max_drawdown']
+
+
+def build_grid(grid):
+    """
+    Arma todas las combinaciones de la grilla. Descarta las que tienen ema_fast >= ema_slow.
+    :param grid: dict {parametro: valor o lista de valores}
+    :return: pd.DataFrame con una fila por combinacion
+    """
+    grid = dict(grid)
+    grid.setdefault('rsi_window', 14)
+
+    faltantes = [p for p in PARAMS if p not in grid]
+    if faltantes:
+        raise ValueError(f'Faltan parametros en la grilla: {faltantes}')
+
+    values = [grid[p] if isinstance(grid[p], (list, tuple, range, np.ndarray)) else [grid[p]] for p in PARAMS]
+    combos = pd.DataFrame(list(itertools.product(*values)), columns=PARAMS)
+    combos = combos[combos['ema_fast'] < combos['ema_slow']].reset_index(drop=True)
+
+    return combos
+
+
+def build_signals(adx, cruce, rsi, adx_level, rsi_level_long, rsi_level_short, distance_ma):
+    """
+    Misma logica que e03_signals.add_signals pero para muchas combinaciones a la vez.
+    adx es (barras, 1), cruce y rsi son (barras, params) y los niveles son (1, params).
+    :return: np.ndarray int8 (barras, params) con 1 LONG, -1 SHORT, 0 sin señal
+    """
+    signals = sig.signal_array(adx, cruce, rsi, adx_level, rsi_level_long, rsi_level_short, distance_ma)
+
+    return np.asfortranarray(signals)
+
+
+def _trade_metrics(close, times, open_idx, close_idx, sides, fee):
+    """
+    Metricas de un set de trades sin armar el DataFrame.
+    :return: k_trades, total_return, annualized_return, win_rate, max_drawdown
+    """
+    k = len(open_idx)
+    if k == 0:
+        return 0, 0.0, 0.0, 0.0, 0.0
+
+    total = 0.0
+    wins = 0
+    running_max = -np.inf
+    max_dd = 0.0
+    for t in range(k):
+        po = close[open_idx[t]]
+        pc = close[close_idx[t]]
+        if sides[t] == 1:
+            pnl = (pc * (1 - fee) / (po * (1 + fee)) - 1) * 100
+        else:
+            pnl = (1 - pc * (1 + fee) / (po * (1 - fee))) * 100
+        total += pnl
+        if pnl > 0:
+            wins += 1
+        if total > running_max:
+            running_max = total
+        if running_max - total > max_dd:
+            max_dd = running_max - total
+
+    total_hours = (times[close_idx[k - 1]] - times[open_idx[0]]) / 3.6e12
+    annualized = (total / total_hours) * 24 * 365 if total_hours > 0 else 0.0
+
+    return k, total, annualized, wins / k * 100, max_dd
+
+
+def _sweep_kernel(signals, close, times, sl, tp, fee, out):
+    for j in prange(signals.shape[1]):
+        open_idx, close_idx, sides, _ = trades._simulate_kernel_jit(signals[:, j], close, sl[j], tp[j])
+        k, total, annualized, win_rate, max_dd = _trade_metrics(close, times, open_idx, close_idx, sides, fee)
+        out[j, 0] = k
+        out[j, 1] = total
+        out[j, 2] = annualized
+        out[j, 3] = win_rate
+        out[j, 4] = max_dd
+
+
+if NUMBA:
+    _trade_metrics = njit(cache=True, nogil=True)(_trade_metrics)
+    _sweep_kernel = njit(cache=True, parallel=True)(_sweep_kernel)
+
+
+def simulate_block(signals, close, times, sl, tp, fee):
+    """
+    Simula todas las columnas de la matriz de señales.
+    :return: np.ndarray (params, 5) con k_trades, total_return, annualized_return, win_rate, max_drawdown
+    """
+    out = np.zeros((signals.shape[1], 5), dtype=np.float64)
+    sl = np.ascontiguousarray(sl, dtype=np.float64)
+    tp = np.ascontiguousarray(tp, dtype=np.float64)
+
+    if NUMBA:
+        _sweep_kernel(signals, close, times, sl, tp, float(fee), out)
+        return out
+
+    for j in range(signals.shape[1]):
+        open_idx, close_idx, sides, _ = trades.run_kernel(signals[:, j], close, sl[j], tp[j])
+        out[j] = _trade_metrics(close, times, open_idx, close_idx, sides, fee)
+
+    return out
+
+
+def sweep(data_week, data, grid, start_date, fee, block=256):
+    """
+    Corre el backtest para todas las combinaciones de la grilla.
+
+    :param data_week: df semanal
+    :param data: df horario
+    :param grid: dict {parametro: valor o lista}. Parametros como en backtest.run, mas rsi_window (default 14)
+    :param start_date: fecha de inicio del backtest
+    :param fee: fee por operacion
+    :param block: cantidad de combinaciones que se simulan juntas (limita la memoria de la matriz)
+    :return: pd.DataFrame con los parametros y las metricas de cada combinacion
+    """
+    combos = build_grid(grid)
+
+    """ INDICADORES, UNA SOLA VEZ CADA UNO """
+    df = ind.adx_strategy(df_week=data_week, df_hour=data)
+    start = len(df) - len(df.loc[start_date:])  # posicion de la fecha de inicio
+
+    close = df['close'].to_numpy(dtype=np.float64)[start:]
+    times = np.asarray(df.index[start:].as_unit('ns').asi8)
+    adx = df['ADX'].to_numpy(dtype=np.float64)[start:, None]
+
+    emas = {w: ind.get_ema(df, w).to_numpy(dtype=np.float64)[start:]
+            for w in pd.unique(combos[['ema_slow', 'ema_fast']].to_numpy().ravel())}
+    rsis = {w: ind.get_rsi(df, w).to_numpy(dtype=np.float64)[start:] for w in combos['rsi_window'].unique()}
+
+    """ SIMULACION POR BLOQUES """
+    results = np.zeros((len(combos), len(METRICS)), dtype=np.float64)
+
+    for b in range(0, len(combos), block):
+        c = combos.iloc[b:b + block]
+
+        cruce = np.column_stack([emas[f] / emas[s] - 1 for s, f in zip(c['ema_slow'], c['ema_fast'])])
+        rsi = np.column_stack([rsis[w] for w in c['rsi_window']])
+
+        signals = build_signals(adx, cruce, rsi,
+                                c['adx_level'].to_numpy()[None, :],
+                                c['rsi_level_long'].to_numpy()[None, :],
+                                c['rsi_level_short'].to_numpy()[None, :],
+                                c['distance_ma'].to_numpy()[None, :])
+
+        results[b:b + block, 0] = np.count_nonzero(signals, axis=0)
+        results[b:b + block, 1:] = simulate_block(signals, close, times,
+                                                  c['sl'].to_numpy(), c['tp'].to_numpy(), fee)
+
+    results = pd.DataFrame(results, columns=METRICS)
+    results[['k_signals', 'k_trades']] = results[['k_signals', 'k_trades']].astype(int)
+
+    return pd.concat([combos, results], axis=1)
+
+
+if __name__ == '__main__':
+    import time
+    from config import SENS_EMA_FAST, SENS_EMA_SLOW, SENS_RSI
+
+    symbol = 'ETHUSDT'
+    grid = {
+        'adx_level': 20,
+        'rsi_level_long': 30,
+        'rsi_level_short': 70,
+        'ema_slow': SENS_EMA_SLOW,
+        'ema_fast': SENS_EMA_FAST,
+        'distance_ma': 0.01,
+        'sl': 0.02,
+        'tp': 0.05,
+        'rsi_window': SENS_RSI,
+    }
+
+    start_time = time.time()
+    resultados = sweep(data_week=pd.read_feather(f'data/{symbol}_1w.feather'),
+                       data=pd.read_feather(f'data/{symbol}_1h.feather'),
+                       grid=grid, start_date='2021-01-01', fee=0.05 / 100)
+    print(resultados.sort_values('annualized_return', ascending=False).head(20))
+    print(f"--- {len(resultados)} combinaciones en {time.time() - start_time:.2f} seconds ---")
@@ -0,0 +1,152 @@
+"""
+Optimizacion bayesiana en paralelo
+
+Igual que e07_optimizacion pero evaluando varios puntos a la vez:
+- El optimizador (skopt.Optimizer) propone puntos con ask / tell
+- Mientras hay evaluaciones en curso, los puntos nuevos se piden con "constant liar":
+  se le dice al optimizador que los puntos pendientes dieron el mejor valor visto hasta ahora,
+  asi no propone otra vez el mismo lugar
+- Cada worker de un ProcessPoolExecutor recibe la data de train UNA sola vez (initializer).
+  Si se le pasan Dataset (memory-map) solo viaja la ruta y todos los workers comparten la misma copia fisica
+- Apenas termina una evaluacion se le informa al optimizador y se manda un punto nuevo
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from skopt import Optimizer
+from skopt.space import Real, Integer
+from tqdm import tqdm
+from colorama import Fore
+
+from backtest import run
+import dataset
+from dataset import Dataset
+
+# Define the parameter space
+space = [
+    Integer(10, 60, name='adx_level'),
+    Integer(10, 40, name='rsi_level_long'),
+    Integer(60, 90, name='rsi_level_short'),
+    Integer(11, 100, name='ema_slow'),
+    Integer(5, 10, name='ema_fast'),
+    Real(0.001, 0.1, name='distance_ma'),
+    Real(0.001, 0.1, name='sl'),
+    Real(0.001, 0.1, name='tp')
+]
+
+# Data fija de cada worker (se carga una vez por proceso en _init_worker)
+_worker_data = {}
+
+
+def _init_worker(data_week, data, start_date, fee):
+    if isinstance(data_week, Dataset):
+        data_week = data_week.to_frame()
+    if isinstance(data, Dataset):
+        data = data.to_frame()
+    _worker_data.update(data_week=data_week, data=data, start_date=start_date, fee=fee)
+
+
+def _evaluate(names, x):
+    params = dict(zip(names, x))
+    params.update(_worker_data)
+
+    result = run(**params)
+
+    # We want to maximize the return, so we return the negative value
+    return -result
+
+
+def _ask_liar(opt, pending):
+    """
+    Pide un punto nuevo teniendo en cuenta los que estan en evaluacion (constant liar con el minimo)
+    """
+    if not pending:
+        return opt.ask()
+
+    lie = min(opt.yi) if opt.yi else 0.0
+    opt_liar = opt.copy(random_state=opt.rng.randint(0, 2 ** 31 - 1))
+    opt_liar.tell(list(pending), [lie] * len(pending))
+    return opt_liar.ask()
+
+
+def optimize_parallel(data_week, data, start_date, fee, space=space, n_calls=20, n_points=None, workers=None,
+                      random_state=0, callback=None):
+    """
+    Optimizacion bayesiana con evaluaciones en paralelo
+
+    :param data_week: df (o Dataset) semanal de train
+    :param data: df (o Dataset) horario de train
+    :param start_date:
+    :param fee:
+    :param space: lista de dimensiones de skopt (con name)
+    :param n_calls: cantidad total de evaluaciones
+    :param n_points: evaluaciones en vuelo a la vez (default = workers)
+    :param workers: procesos (default = os.cpu_count())
+    :param random_state:
+    :param callback: fx(x, y) que se llama cada vez que llega un resultado
+    :return: OptimizeResult de skopt (x, fun, x_iters, func_vals)
+    """
+    workers = workers or os.cpu_count()
+    n_points = n_points or workers
+    names = [dim.name for dim in space]
+
+    opt = Optimizer(space, base_estimator='GP', acq_func='gp_hedge', random_state=random_state,
+                    n_initial_points=min(10, n_calls))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(data_week, data, start_date, fee)) as pool:
+
+        # Primer lote: ask de n_points con constant liar
+        first = opt.ask(n_points=min(n_points, n_calls), strategy='cl_min')
+        running = {pool.submit(_evaluate, names, x): tuple(x) for x in first}
+        submitted = len(first)
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                x = running.pop(future)
+                y = float(future.result())
+                opt.tell(list(x), y)
+
+                if callback:
+                    callback(x, y)
+
+                # Reemplazo la evaluacion terminada por un punto nuevo
+                if submitted < n_calls:
+                    x_new = _ask_liar(opt, [list(p) for p in running.values()])
+                    running[pool.submit(_evaluate, names, x_new)] = tuple(x_new)
+                    submitted += 1
+
+    return opt.get_result()
+
+
+if __name__ == '__main__':
+    symbol = 'ETHUSDT'
+    ds_week = dataset.load(symbol, '1w')
+    ds = dataset.load(symbol, '1h')
+    start_date = '2020-01-01'
+    fee = 0.05 / 100
+
+    # Mismo corte de train / test que e07_optimizacion
+    train_percentage = 0.8
+    index_total = ds.index[ds.index >= start_date]
+    cutoff_date = index_total[int(train_percentage * len(index_total))]
+
+    df_week_train = ds_week.slice(end=cutoff_date)
+    df_train = ds.slice(end=cutoff_date)
+
+    n_calls = 200
+    pbar = tqdm(total=n_calls, desc=Fore.GREEN + "Optimización")
+
+    res = optimize_parallel(df_week_train, df_train, start_date, fee, n_calls=n_calls,
+                            callback=lambda x, y: pbar.update(1))
+    pbar.close()
+
+    best_parametros = {dim.name: res.x[i] for i, dim in enumerate(space)}
+    print(f"Best parameters: {best_parametros}")
+    print(f"Best annualized return: {-res.fun}")
+
+    test_result = run(data_week=ds_week.to_frame(), data=ds.to_frame(), start_date=cutoff_date, fee=fee, **best_parametros)
+    print(f"Rendimiento anualizado en el conjunto de prueba: {test_result}")
@@ -0,0 +1,218 @@
+"""
+Walk-forward: optimizacion por ventanas train / test
+
+En vez de un unico corte 80/20 (e07_optimizacion):
+- Se arman N folds sobre la data horaria. Cada fold optimiza en su ventana de train y se evalua en la
+  ventana de test que le sigue. Las ventanas de test no se pisan y cubren el final de la historia.
+  - rolling: el train tiene siempre el mismo largo y se corre con el test
+  - anchored: el train arranca siempre en start_date y va creciendo
+- Los indicadores fijos (ADX semanal -> horario, RSI, close) se calculan UNA vez sobre toda la historia.
+  Son causales, asi que cortarlos da lo mismo que calcularlos sobre la ventana (igual que backtest.run
+  con la data cortada en cutoff_date). Las EMAs se calculan una vez por ventana y por proceso.
+- Cada fold corre su optimizacion en un proceso distinto (ProcessPoolExecutor)
+- Los trades de test de todos los folds se juntan en una sola curva out-of-sample
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from skopt import gp_minimize
+from tqdm import tqdm
+from colorama import Fore
+
+import dataset
+import e02_indicadores as ind
+import e03_signals as sig
+import e04_trades as trades
+from dataset import Dataset
+from e05_stats import stats
+from e10_optimizacion_paralela import space
+
+
+class Indicators:
+    """
+    Indicadores de toda la historia. Los folds cortan por posicion, sin recalcular.
+    """
+
+    def __init__(self, data_week, data):
+        df = ind.adx_strategy(df_week=data_week, df_hour=data)
+
+        self.index = df.index
+        self.close = df['close'].to_numpy(dtype=np.float64)
+        self.adx = df['ADX'].to_numpy(dtype=np.float64)
+        self.rsi = ind.get_rsi(df).to_numpy(dtype=np.float64)
+        self._emas = {}
+
+    def ema(self, window):
+        window = int(window)
+        if window not in self._emas:
+            frame = pd.DataFrame({'close': self.close}, index=self.index)
+            self._emas[window] = ind.get_ema(frame, window).to_numpy(dtype=np.float64)
+        return self._emas[window]
+
+    def backtest(self, params, i0, i1, fee):
+        """
+        Misma estrategia que backtest.run sobre las velas [i0, i1)
+        :param params: dict con adx_level, rsi_level_long, rsi_level_short, ema_slow, ema_fast, distance_ma, sl, tp
+        :return: pd.DataFrame con los trades
+        """
+        cruce = self.ema(params['ema_fast'])[i0:i1] / self.ema(params['ema_slow'])[i0:i1] - 1
+        signal = sig.signal_array(self.adx[i0:i1], cruce, self.rsi[i0:i1], params['adx_level'],
+                                  params['rsi_level_long'], params['rsi_level_short'], params['distance_ma'])
+
+        close = self.close[i0:i1]
+        open_idx, close_idx, sides, motivos = trades.run_kernel(signal, close, params['sl'], params['tp'])
+
+        return trades.build_trades(self.index[i0:i1], close, open_idx, close_idx, sides, motivos,
+                                   params['sl'], params['tp'], fee)
+
+    def score(self, params, i0, i1, fee):
+        """
+        Rendimiento anualizado de la ventana (0 si no hay trades, como backtest.run sin señales)
+        """
+        df_trades = self.backtest(params, i0, i1, fee)
+        if df_trades.empty:
+            return 0.0
+        return stats(df_trades)['annualized_return']
+
+
+def make_folds(index, start_date, n_folds=5, train_size=0.5, anchored=False):
+    """
+    Ventanas de walk-forward en posiciones del index horario (inicio incluido, fin excluido)
+
+    :param index: DatetimeIndex de la data horaria
+    :param start_date: fecha desde la que se usa la data
+    :param n_folds: cantidad de ventanas de test
+    :param train_size: fraccion de la data desde start_date que ocupa el primer train
+    :param anchored: si es True el train siempre arranca en start_date
+    :return: lista de dicts con fold, train (i0, i1) y test (i0, i1)
+    """
+    start = int(index.searchsorted(pd.Timestamp(start_date)))
+    n = len(index) - start
+    train_bars = int(n * train_size)
+    test_bars = (n - train_bars) // n_folds
+
+    if train_bars == 0 or test_bars == 0:
+        raise ValueError(f'No alcanza la data para {n_folds} folds desde {start_date}')
+
+    folds = []
+    for k in range(n_folds):
+        test_start = start + train_bars + k * test_bars
+        test_end = test_start + test_bars if k < n_folds - 1 else len(index)  # el ultimo se queda con el resto
+        train_start = start if anchored else test_start - train_bars
+        folds.append({'fold': k, 'train': (train_start, test_start), 'test': (test_start, test_end)})
+
+    return folds
+
+
+# Indicadores de cada worker (se cargan una vez por proceso en _init_worker)
+_worker_data = {}
+
+
+def _init_worker(indicators, fee):
+    _worker_data.update(indicators=indicators, fee=fee)
+
+
+def _optimize_fold(fold, space, n_calls, random_state):
+    indicators = _worker_data['indicators']
+    fee = _worker_data['fee']
+    names = [dim.name for dim in space]
+
+    def objective(x):
+        # We want to maximize the return, so we return the negative value
+        return -indicators.score(dict(zip(names, x)), *fold['train'], fee)
+
+    res = gp_minimize(objective, space, n_calls=n_calls, n_initial_points=min(10, n_calls),
+                      random_state=random_state)
+    best = dict(zip(names, res.x))
+
+    test_trades = indicators.backtest(best, *fold['test'], fee)
+    test_trades['fold'] = fold['fold']
+    test_return = stats(test_trades)['annualized_return'] if not test_trades.empty else 0.0
+
+    return fold, best, -res.fun, test_return, test_trades
+
+
+def walk_forward(data_week, data, start_date, fee, n_folds=5, train_size=0.5, anchored=False, space=space,
+                 n_calls=20, workers=None, random_state=0, callback=None):
+    """
+    Walk-forward con los folds optimizados en paralelo
+
+    :param data_week: df (o Dataset) semanal, toda la historia
+    :param data: df (o Dataset) horario, toda la historia
+    :param start_date: fecha de inicio (el primer train arranca aca)
+    :param fee:
+    :param n_folds: cantidad de folds
+    :param train_size: fraccion de la data que ocupa el train (ver make_folds)
+    :param anchored: train anclado en start_date o rolling
+    :param space: lista de dimensiones de skopt (con name)
+    :param n_calls: evaluaciones de la optimizacion de cada fold
+    :param workers: procesos (default = min(n_folds, os.cpu_count()))
+    :param random_state: semilla del primer fold, el fold k usa random_state + k
+    :param callback: fx(resumen_del_fold) que se llama cada vez que termina un fold
+    :return: dict con
+        folds: pd.DataFrame con las fechas, los mejores parametros y el rendimiento de train y test de cada fold
+        trades: trades out-of-sample de todos los folds con la curva acumulada (cumulative_pnl)
+        stats: metricas de e05_stats sobre los trades out-of-sample
+    """
+    if isinstance(data_week, Dataset):
+        data_week = data_week.to_frame()
+    if isinstance(data, Dataset):
+        data = data.to_frame()
+
+    # Una sola vez para todos los folds
+    indicators = Indicators(data_week, data)
+    folds = make_folds(indicators.index, start_date, n_folds=n_folds, train_size=train_size, anchored=anchored)
+    workers = workers or min(n_folds, os.cpu_count())
+    index = indicators.index
+
+    resumen = []
+    oos = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(indicators, fee)) as pool:
+        futures = [pool.submit(_optimize_fold, fold, space, n_calls, random_state + fold['fold']) for fold in folds]
+
+        for future in as_completed(futures):
+            fold, best, train_return, test_return, test_trades = future.result()
+            row = {
+                'fold': fold['fold'],
+                'train_start': index[fold['train'][0]],
+                'train_end': index[fold['train'][1] - 1],
+                'test_start': index[fold['test'][0]],
+                'test_end': index[fold['test'][1] - 1],
+                **best,
+                'train_return': train_return,
+                'test_return': test_return,
+                'k_trades': len(test_trades),
+            }
+            resumen.append(row)
+            oos.append(test_trades)
+
+            if callback:
+                callback(row)
+
+    resumen = pd.DataFrame(resumen).sort_values('fold').reset_index(drop=True)
+
+    # Curva out-of-sample: los trades de test de todos los folds en orden
+    df_trades = pd.concat(oos, axis=0).sort_values('time_open').reset_index(drop=True)
+    df_trades['cumulative_pnl'] = df_trades['pnl_neto'].cumsum()
+    metrics = stats(df_trades) if not df_trades.empty else {}
+
+    return {'folds': resumen, 'trades': df_trades, 'stats': metrics}
+
+
+if __name__ == '__main__':
+    import pprint
+
+    symbol = 'ETHUSDT'
+    n_folds = 8
+
+    pbar = tqdm(total=n_folds, desc=Fore.GREEN + "Walk-forward")
+    resultado = walk_forward(data_week=dataset.load(symbol, '1w'), data=dataset.load(symbol, '1h'),
+                             start_date='2020-01-01', fee=0.05 / 100, n_folds=n_folds, n_calls=50,
+                             callback=lambda row: pbar.update(1))
+    pbar.close()
+
+    print(resultado['folds'])
+    pprint.pprint(resultado['stats'])
@@ -0,0 +1,170 @@
+"""
+Backtest de portfolio: la misma estrategia de backtest.run sobre todos los simbolos de data/
+
+- scan_symbols busca los pares que tienen data horaria y semanal ({symbol}_1h.feather y {symbol}_1w.feather)
+- Los close horarios se alinean en un index comun: una matriz (velas x simbolos), NaN antes del listado
+- EMA, RSI, cruce y señales se calculan para todos los simbolos a la vez sobre la matriz
+- El ADX semanal se calcula por simbolo (la data semanal es chica) y se lleva a la matriz horaria
+- Cada columna se simula con el kernel de e04_trades y se arman las stats por simbolo y del portfolio
+
+Los valores por simbolo son los mismos que backtest.run mientras el simbolo no tenga velas faltantes
+en el medio de su historia (el RSI y la EMA de pandas cuentan los huecos de la matriz como velas sin dato).
+"""
+
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+import dataset
+import e02_indicadores as ind
+import e03_signals as sig
+import e04_trades as trades
+from e05_stats import stats
+
+
+def scan_symbols(directory='data', quote='USDT', intervals=('1h', '1w')):
+    """
+    Simbolos con data en todos los intervalos
+    :param directory: carpeta de los feather
+    :param quote: moneda de cotizacion (None = todos)
+    :return: lista ordenada de simbolos
+    """
+    symbols = None
+    for interval in intervals:
+        files = glob.glob(os.path.join(directory, f'*_{interval}.feather'))
+        found = {os.path.basename(f)[:-len(f'_{interval}.feather')] for f in files}
+        symbols = found if symbols is None else symbols & found
+
+    return sorted(s for s in symbols if quote is None or s.endswith(quote))
+
+
+def load_matrix(symbols, interval='1h', column='close', directory='data'):
+    """
+    Una columna de todos los simbolos alineada en un index comun
+    :return: pd.DataFrame (velas x simbolos) con NaN donde el simbolo no tiene vela
+    """
+    series = [dataset.load(symbol, interval, directory).to_frame([column])[column] for symbol in symbols]
+    return pd.concat(series, axis=1, keys=symbols).sort_index()
+
+
+def ema_matrix(close, window):
+    """
+    ta.trend.EMAIndicator para todas las columnas
+    """
+    return close.ewm(span=window, min_periods=window, adjust=False).mean()
+
+
+def rsi_matrix(close, window=14):
+    """
+    ta.momentum.RSIIndicator para todas las columnas. Antes del listado queda NaN
+    (si no, los ceros de diff se contarian como velas y el RSI no daria igual que por simbolo)
+    """
+    diff = close.diff(1)
+    listed = close.notna()
+    up = diff.where(diff > 0, 0.0).where(listed)
+    down = -diff.where(diff < 0, 0.0).where(listed)
+
+    emaup = up.ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+    emadn = down.ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+
+    rsi = np.where(emadn == 0, 100, 100 - (100 / (1 + emaup / emadn)))
+    return pd.DataFrame(rsi, index=close.index, columns=close.columns)
+
+
+def adx_matrix(symbols, index, directory='data'):
+    """
+    ADX semanal de cada simbolo llevado al index horario (igual que add_adx_to_data: el valor de la ultima
+    semana que empezo antes de la hora)
+    :return: np.ndarray float64 (velas x simbolos)
+    """
+    adx = np.full((len(index), len(symbols)), np.nan)
+    hours = index.as_unit('ns').asi8
+
+    for j, symbol in enumerate(symbols):
+        df_week = dataset.load_frame(symbol, '1w', directory)
+        values = ind.get_adx(df_week).to_numpy(dtype=np.float64)
+
+        pos = np.searchsorted(df_week.index.as_unit('ns').asi8, hours, side='right') - 1
+        adx[:, j] = np.where(pos >= 0, values[np.maximum(pos, 0)], np.nan)
+
+    return adx
+
+
+def run_portfolio(start_date, fee, adx_level, rsi_level_long, rsi_level_short, ema_slow, ema_fast, distance_ma,
+                  sl, tp, symbols=None, directory='data'):
+    """
+    Backtest de la estrategia en todos los simbolos
+
+    :param start_date: fecha de inicio del backtest
+    :param fee: fee por operacion
+    :param symbols: lista de simbolos (default: todos los de scan_symbols)
+    :param directory: carpeta de la data
+    (el resto de los parametros como en backtest.run)
+    :return: dict con
+        symbols: pd.DataFrame con k_signals, k_trades y las metricas de e05_stats por simbolo
+        trades: trades de todos los simbolos (columna symbol) ordenados por time_close
+        stats: metricas del portfolio (todos los trades con orden fija, como stats)
+    """
+    symbols = symbols if symbols is not None else scan_symbols(directory)
+
+    """ MATRIZ DE PRECIOS E INDICADORES, TODOS LOS SIMBOLOS A LA VEZ """
+    close = load_matrix(symbols, '1h', 'close', directory)
+    adx = adx_matrix(symbols, close.index, directory)
+    cruce = (ema_matrix(close, ema_fast) / ema_matrix(close, ema_slow) - 1).to_numpy()
+    rsi = rsi_matrix(close).to_numpy()
+
+    """ CORTO DESDE LA FECHA DE INICIO """
+    start = close.index.searchsorted(pd.Timestamp(start_date))
+    index = close.index[start:]
+    prices = close.to_numpy(dtype=np.float64)[start:]
+
+    """ SEÑALES (velas x simbolos) """
+    signals = sig.signal_array(adx[start:], cruce[start:], rsi[start:], adx_level, rsi_level_long, rsi_level_short,
+                               distance_ma)
+
+    """ TRADES Y STATS POR SIMBOLO """
+    rows = []
+    all_trades = []
+    for j, symbol in enumerate(symbols):
+        listed = ~np.isnan(prices[:, j])  # cada simbolo se simula solo sobre sus velas
+        signal = signals[listed, j]
+        row = {'symbol': symbol, 'k_signals': np.count_nonzero(signal), 'k_trades': 0}
+
+        if row['k_signals']:
+            price = prices[listed, j]
+            open_idx, close_idx, sides, motivos = trades.run_kernel(signal, price, sl, tp)
+            df_trades = trades.build_trades(index[listed], price, open_idx, close_idx, sides, motivos, sl, tp, fee)
+
+            if not df_trades.empty:
+                row['k_trades'] = len(df_trades)
+                row.update(stats(df_trades))
+                all_trades.append(df_trades.assign(symbol=symbol))
+
+        rows.append(row)
+
+    per_symbol = pd.DataFrame(rows).set_index('symbol')
+
+    """ PORTFOLIO """
+    if all_trades:
+        df_trades = pd.concat(all_trades, axis=0).sort_values('time_close', kind='stable').reset_index(drop=True)
+        metrics = stats(df_trades)
+    else:
+        df_trades = pd.DataFrame()
+        metrics = {}
+
+    return {'symbols': per_symbol, 'trades': df_trades, 'stats': metrics}
+
+
+if __name__ == '__main__':
+    import pprint
+    import time
+
+    start_time = time.time()
+    resultado = run_portfolio(start_date='2021-01-01', fee=0.05 / 100, adx_level=20, rsi_level_long=30,
+                              rsi_level_short=70, ema_slow=50, ema_fast=20, distance_ma=0.01, sl=0.02, tp=0.05)
+
+    print(resultado['symbols'].sort_values('annualized_return', ascending=False))
+    pprint.pprint(resultado['stats'])
+    print(f"--- {len(resultado['symbols'])} simbolos en {time.time() - start_time:.2f} seconds ---")
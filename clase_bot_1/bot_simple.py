@@ -1,11 +1,17 @@
 from clase_primary.clase_pyrofex import PyRofexClient
+from clase_primary.order_gateway import OrderGateway
+from clase_primary.sizing import calc_montos_batch
 import fx_sqlite
-from fx_sqlite import main_sqlite, create_connection
+from fx_sqlite import main_sqlite, get_connection
 import functions
 import pyRofex
 
 from time import sleep
 
+RECONCILIAR = 60  # segundos sin execution reports antes de consultar las ordenes por REST
+RATE_LIMIT = 10  # ordenes por segundo
+MAX_PCT_BOOK = None  # planificacion.txt: nunca mas del 50% de la punta -> 0.5
+
 
 def run_bot():
 
@@ -14,18 +20,25 @@ def run_bot():
 
     client = PyRofexClient()  # Create a PyRofexClient
 
+    # Execution reports por websocket. El tracker escribe en la DDBB desde su thread (get_connection le da su conexion)
+    tracker = client.order_tracker
+    tracker.set_writer(lambda respuestas: fx_sqlite.actualizar_ordenes(get_connection(), respuestas))
+    client.subscribe_order_reports()
+
+    # Envio de ordenes en paralelo
+    gateway = OrderGateway(client.place_limit_order, rate_limit=RATE_LIMIT)
+
     if not descarga_instruments:
         client.get_instruments_and_save()  # Get instruments and save them in the DDBB.
         descarga_instruments = True
 
     # SQLite
     main_sqlite()  # Creamos la tabla si no esta creada
-    slq_conn = create_connection()
+    slq_conn = get_connection()
 
-    # Consultamos a la DDBB si hay algo en la tabla todo
-    todo = fx_sqlite.query_todo(slq_conn)
-    print("To-do list:", todo)
-    pendiente = [x for x in todo if x["status"] == 'pendiente']
+    # Consultamos a la DDBB si hay algo pendiente en la tabla todo (usa el indice de status)
+    pendiente = fx_sqlite.query_todo(slq_conn, status='pendiente')
+    print("To-do list:", pendiente)
 
     # Vemos si hay algo pendiente
     if pendiente:
@@ -40,57 +53,46 @@ def run_bot():
         # print(data_symbols)
 
         # Obtengo puntas de precios
-        ddbb_precios = {}
-        # for i in data_symbols:
-        #     symbol = i
-        #     md = client.get_market_data(symbol)
-        #     ddbb_precios[symbol] = md.get('marketData')
+        # client.subscribe_market_data(list(data_symbols), printer=False)  # order books por websocket
+        # client.market_data_cache.wait_symbols(data_symbols, timeout=5)
+        # ddbb_precios = client.market_data_cache.ddbb_precios(data_symbols)  # sin requests
 
         ddbb_precios = {'DLR/ENE25': {'OF': [{'price': 1081.0, 'size': 90}], 'LA': None, 'BI': [{'price': 1080.5, 'size': 350}]}, 'DLR/NOV24': {'OF': [{'price': 1018.0, 'size': 5053}], 'LA': None, 'BI': [{'price': 1017.0, 'size': 7534}]}, 'DLR/DIC24': {'OF': [{'price': 1048.0, 'size': 295}], 'LA': None, 'BI': [{'price': 1047.5, 'size': 2059}]}}
         # print(ddbb_precios)
 
-        # Calculo las ordenes a enviar
-        for p in pendiente:
-            monto_operar = p['monto']
-            id_pendiente = p['id']
+        # Calculo las ordenes a enviar de todos los pendientes juntos
+        montos = [p['monto'] for p in pendiente]
+        ordenes_lote, sobrantes = calc_montos_batch(ddbb_precios, montos, data_symbols, max_pct_book=MAX_PCT_BOOK)
 
-            ordenes = functions.calc_montos(ddbb_precios, monto_operar, data_symbols)
+        for p, ordenes, sobrante in zip(pendiente, ordenes_lote, sobrantes):
+            id_pendiente = p['id']
+            print(f'Todo {id_pendiente}, monto sobrante: {round(sobrante)}')
             # print(ordenes)
 
-            for order_enviar in ordenes:
-                print(f"Enviando orden: {order_enviar}")
-
-                symbol = order_enviar
-                price = ordenes[order_enviar]['price']
-                size = ordenes[order_enviar]['size']
-
-                if size < 1:  # si el size es menor a 1, no hago nada
+            # Todas las patas salen a la vez (si el size es menor a 1, no la mando)
+            legs = [{'ticker': symbol, 'side': pyRofex.Side.BUY, 'size': o['size'], 'price': o['price']}
+                    for symbol, o in ordenes.items() if o['size'] >= 1]
+            print(f"Enviando ordenes: {legs}")
+            futures = gateway.send_basket(legs)
+            enviadas = []  # clientId de las ordenes del pendiente, para sacarlas del tracker al final
+
+            for leg, future in zip(legs, futures):
+                try:
+                    orden = future.result()
+                    client_order_id = orden['order']['clientId']
+                except Exception as e:
+                    print(f"Error al enviar la orden {leg}: {e}")
                     continue
 
-                orden = client.place_limit_order(ticker=symbol, price=price, size=size, side=pyRofex.Side.BUY)
-                # print(orden)
-
-                # Guardo en la DDBB
-                insertar_orden = fx_sqlite.insertar_orden_inicial(slq_conn, client_id=orden['order']['clientId'], id_todo=id_pendiente, symbol=symbol)
-                if not insertar_orden:
+                # Guardo en la DDBB y la registro en el tracker: desde aca la actualizan los execution reports
+                id_operacion = fx_sqlite.insertar_orden_inicial(slq_conn, client_id=client_order_id, id_todo=id_pendiente, symbol=leg['ticker'])
+                if not id_operacion:
                     print("Error al actualizar la DDBB")
+                tracker.track(client_order_id, id_operacion=id_operacion)
+                enviadas.append(client_order_id)
 
-                sleep(1)
-
-                # Consulto la orden
-                client_order_id = orden['order']['clientId']
-                orden = client.consultar_orden(client_order_id=client_order_id)
-                print(orden)
-
-                actualizar_ddbb = fx_sqlite.actualizar_orden(slq_conn, id_operacion=id_pendiente, orden_response=orden)
-                if not actualizar_ddbb:
-                    print("Error al actualizar la DDBB")
-
-            sleep(1)
-
-            while True:  # Consulto las ordenes hasta que esten todas finalizadas
-                ordenes = fx_sqlite.consultar_ordenes_por_todo(slq_conn, id_todo=id_pendiente)
-                print(ordenes)
+            while True:  # Espero los execution reports hasta que esten todas finalizadas
+                tracker.flush()  # los reports recibidos ya estan en la DDBB
 
                 # verifico si todas las ordenes estan finalizadas
                 nuevo_status = fx_sqlite.actualizar_status_todo(slq_conn, id_pendiente)
@@ -98,24 +100,26 @@ def run_bot():
                     print(f"Todo {id_pendiente} finalizado con status: {nuevo_status}")
                     break
 
-                # Si no estan finalizadas, consulto las ordenes y actualizo la DDBB
-                for orden_sql in ordenes:
-                    status = orden_sql['status']
-                    if status in ['FILLED', 'REJECTED', 'CANCELED']:
-                        continue
-                    else:
-                        client_id = orden_sql['clientId']
-                        orden = client.consultar_orden(client_order_id=client_id)
-                        print(orden)
-                        actualizar_ddbb = fx_sqlite.actualizar_orden(slq_conn, id_operacion=orden_sql['id_operacion'], orden_response=orden)
-                        if not actualizar_ddbb:
-                            print("Error al actualizar la DDBB")
-
-                print('Aun quedan ordenes, espero 10 segundos')
-                sleep(10)
+                ordenes = fx_sqlite.consultar_ordenes_abiertas(slq_conn, id_todo=id_pendiente)
+                if not ordenes:  # no se envio ninguna orden, el pendiente queda para la proxima vuelta
+                    print(f"Todo {id_pendiente} sin ordenes")
+                    break
+
+                client_ids = [o['clientId'] for o in ordenes]
+                for o in ordenes:  # por si quedaron abiertas de una corrida anterior
+                    tracker.track(o['clientId'], id_operacion=o['id_operacion'])
+                enviadas.extend(c for c in client_ids if c not in enviadas)
 
+                # Si en RECONCILIAR segundos no llegan los reports, consulto por REST las que siguen abiertas
+                if not tracker.wait_final(client_ids, timeout=RECONCILIAR):
+                    print(f'Sin execution reports en {RECONCILIAR} segundos, consulto por REST')
+                    tracker.reconcile(client.consultar_orden, client_ids)
+
+            tracker.forget(enviadas)
             print('Finalizado el pendiente con id:', id_pendiente)
 
+    gateway.shutdown()
+
     print('Todos los pendientes finalizados, duermo 10 minutos')
     sleep(600)
 
@@ -1,7 +1,8 @@
 """
 Funciones de utilidad para el bot de cauciones
 """
-import json
+from clase_primary.instrument_catalog import get_catalog
+from clase_primary.sizing import calc_montos_batch
 
 
 def get_data_instruments(symbols, json_instruments):
@@ -11,43 +12,14 @@ def get_data_instruments(symbols, json_instruments):
     Matuity
     minPriceIncrement
     tickSize
-    orderTypes
-    instrumentPricePrecision
-    """
-
-    # abro el json
-    with open(json_instruments, 'r', encoding='utf-8') as file:
-        data = json.load(file)
-
-    data_symbols = {}
-
-    instruments = data['instruments']
-    for instrument in instruments:
-        symbol = instrument['securityDescription']
-
-        for s in symbols:
-            if s == symbol:
-                data_symbols[symbol] = {}
-                # data_symbols[symbol]['vencimiento'] = instrument['maturityDate']
-                data_symbols[symbol]['tick_price'] = instrument['minPriceIncrement']
-                data_symbols[symbol]['tick_size'] = instrument['tickSize']
-
-                maturityDate = instrument['maturityDate']
-
-                # example "20250131", this to datetime
-                year = maturityDate[0:4]
-                month = maturityDate[4:6]
-                day = maturityDate[6:8]
-                data_symbols[symbol]['vencimiento'] = f"{year}-{month}-{day}"
-
-
-                break
-
 
-    return data_symbols
+    Usa el catalogo en SQLite (clase_primary/instrument_catalog.py): el json solo se vuelve a
+    parsear si cambio y cada simbolo es una busqueda por clave
+    """
+    return get_catalog(json_instruments).lookup(symbols)
 
 
-def calc_montos(ddbb_precios, monto_operar, data_symbols, multiplicador=1000):
+def calc_montos(ddbb_precios, monto_operar, data_symbols, multiplicador=1000, max_pct_book=None):
     """
     En base al monto a operar, calcula cuanto size ira para cada instrumento.
 
@@ -57,43 +29,14 @@ def calc_montos(ddbb_precios, monto_operar, data_symbols, multiplicador=1000):
 
     :param ddbb_precios:
     :param monto_operar:
+    :param max_pct_book: tope de contratos como fraccion de la punta (planificacion.txt: 0.5), None = sin tope
     :return:
     """
+    ordenes, sobrante = calc_montos_batch(ddbb_precios, [monto_operar], data_symbols, multiplicador, max_pct_book)
 
-    ordenes = {}
-    monto_sobrante = 0
-
-    size_total = 0
-    for i in ddbb_precios:
-        if ddbb_precios[i]['OF']:
-            size = ddbb_precios[i]['OF'][0]['size']
-            size_total += size
-
-        elif ddbb_precios[i]['BI']:
-            size = ddbb_precios[i]['BI'][0]['size']
-            size_total += size
-
-    for i in ddbb_precios:
-        tick_size = float(data_symbols[i]['tick_size'])
-
-        if ddbb_precios[i]['OF'] or ddbb_precios[i]['BI']:
-            size_i = ddbb_precios[i]['OF'][0]['size'] if ddbb_precios[i]['OF'] else ddbb_precios[i]['BI'][0]['size']
-            price_i = ddbb_precios[i]['OF'][0]['price'] if ddbb_precios[i]['OF'] else ddbb_precios[i]['BI'][0]['price']
-
-            monto_ars = (size_i / size_total) * (monto_operar) + monto_sobrante
-
-            contratos = monto_ars / (price_i * multiplicador)
-            # round to the lower tick size
-            contratos_adj = int(contratos // tick_size) * tick_size
-
-            pxq = price_i * contratos_adj * multiplicador
-            monto_sobrante = monto_ars - pxq
-
-            ordenes[i] = {'monto': pxq, 'size': contratos_adj, 'price': price_i}
-
-    print('Monto sobrante:', round(monto_sobrante))
+    print('Monto sobrante:', round(sobrante[0]))
 
-    return ordenes
+    return ordenes[0]
 
 
 
@@ -1,16 +1,97 @@
 import sqlite3
+import threading
+from contextlib import contextmanager
 from sqlite3 import Error
 
+from clase_primary.resumen import create_resumen, resumen_todo, status_final
 
-def create_connection():
+DB_FILE = 'cauciones.db'
+
+# Tablas que se pueden consultar con query_table (el nombre no puede ir como parametro ?)
+TABLAS = ('todo', 'operaciones', 'resumen', 'instruments')
+
+# Una conexion por (archivo, thread), se reutiliza en vez de abrir una por llamada
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+def create_connection(db_file=DB_FILE):
+    """
+    Abre una conexion configurada:
+    - WAL: las lecturas no bloquean a la escritura (y al reves)
+    - synchronous=NORMAL: con WAL no se pierde consistencia y cada commit no espera al fsync
+    - cached_statements: las consultas con ? quedan preparadas y se reutilizan
+    """
     try:
-        conn = sqlite3.connect('cauciones.db')
+        conn = sqlite3.connect(db_file, cached_statements=256)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
         return conn
     except Error as e:
         print(f"Error al conectar a la base de datos: {e}")
         return None
 
 
+def get_connection(db_file=DB_FILE):
+    """
+    Conexion del pool para el thread actual (se crea la primera vez)
+    """
+    key = (db_file, threading.get_ident())
+    with _pool_lock:
+        conn = _pool.get(key)
+        if conn is None:
+            conn = _pool[key] = create_connection(db_file)
+        return conn
+
+
+def close_pool():
+    with _pool_lock:
+        for conn in _pool.values():
+            conn.close()
+        _pool.clear()
+
+
+# Sentencias fijas (sqlite las prepara una vez por conexion y las reutiliza)
+INSERT_ORDEN = '''
+  INSERT INTO operaciones (clientId, id_todo, symbol)
+  VALUES (?, ?, ?)
+'''
+
+UPDATE_ORDEN = '''
+  UPDATE operaciones
+  SET order_id = ?,
+      price = ?,
+      size = ?,
+      side = ?,
+      pxq = ?,
+      avg_price = ?,
+      filled = ?,
+      pxq_filled = ?,
+      status = ?
+  WHERE id_operacion = ?
+'''
+
+
+@contextmanager
+def transaction(conn):
+    """
+    Agrupa varias escrituras en una sola transaccion (un solo commit).
+    Si ya hay una transaccion abierta se suma a esa, asi las funciones de escritura se pueden anidar.
+    """
+    if conn.in_transaction:
+        yield conn
+        return
+
+    conn.execute('BEGIN')
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+
 def create_tables(conn):
     try:
         cursor = conn.cursor()
@@ -62,6 +143,14 @@ def create_tables(conn):
           )
       ''')
 
+        # Indices para el loop del bot (ordenes de un to-do, ordenes abiertas y to-dos pendientes)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_operaciones_id_todo ON operaciones(id_todo)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_operaciones_status ON operaciones(status)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_todo_status ON todo(status)')
+
+        # Contadores por to-do en resumen, mantenidos por triggers sobre operaciones
+        create_resumen(conn)
+
         conn.commit()
         print("Tablas creadas exitosamente")
 
@@ -80,6 +169,9 @@ def main_sqlite():
 
 # FX Para el bot
 def query_table(conn, table='todo'):
+    if table not in TABLAS:
+        raise ValueError(f"Tabla desconocida: {table}")
+
     try:
         cursor = conn.cursor()
         cursor.execute(f"SELECT * FROM {table}")
@@ -91,10 +183,16 @@ def query_table(conn, table='todo'):
         print(f"Error en la consulta: {e}")
 
 
-def query_todo(conn):
+def query_todo(conn, status=None):
+    """
+    To-dos de la tabla. Con status (ej. 'pendiente') se filtra en la consulta usando el indice
+    """
     todo = []
     try:
-        rows = query_table(conn, table='todo')
+        if status is None:
+            rows = query_table(conn, table='todo')
+        else:
+            rows = conn.execute("SELECT id, monto, status FROM todo WHERE status = ? ORDER BY id", (status,)).fetchall()
 
         # Convertimos a diccionario agregando monto y status
         for row in rows:
@@ -125,29 +223,24 @@ def query_instruments(conn):
 # FX para tareas en la base de datos
 def add_todo(conn, monto):
     try:
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO todo (monto) VALUES (?)", (monto,))
-        conn.commit()
+        with transaction(conn):
+            cursor = conn.execute("INSERT INTO todo (monto) VALUES (?)", (monto,))
         print("To-do agregado exitosamente")
+        return cursor.lastrowid
 
     except Error as e:
         print(f"Error en la inserción: {e}")
-        conn.rollback()
 
 
 def add_instruments(conn, symbols):
     try:
-        cursor = conn.cursor()
-        for symbol in symbols:
+        with transaction(conn):
             # insert instruments if not exists
-            cursor.execute("INSERT OR IGNORE INTO instruments (symbol) VALUES (?)", (symbol,))
-
-        conn.commit()
+            conn.executemany("INSERT OR IGNORE INTO instruments (symbol) VALUES (?)", ((s,) for s in symbols))
         print("Instrumentos agregados exitosamente")
 
     except Error as e:
         print(f"Error en la inserción: {e}")
-        conn.rollback()
 
 
 def insertar_orden_inicial(conn, client_id, id_todo, symbol):
@@ -155,62 +248,62 @@ def insertar_orden_inicial(conn, client_id, id_todo, symbol):
     Inserta una nueva orden con los datos iniciales básicos
     """
     try:
-        cursor = conn.cursor()
-        cursor.execute('''
-          INSERT INTO operaciones (clientId, id_todo, symbol)
-          VALUES (?, ?, ?)
-      ''', (client_id, id_todo, symbol))
-
-        conn.commit()
+        with transaction(conn):
+            cursor = conn.execute(INSERT_ORDEN, (client_id, id_todo, symbol))
         return cursor.lastrowid  # Retorna el id_operacion generado
     except Error as e:
         print(f"Error al insertar orden inicial: {e}")
         return None
 
 
-def actualizar_orden(conn, id_operacion, orden_response):
+def _valores_orden(id_operacion, orden_response):
     """
-    Actualiza una orden existente con la respuesta del mercado
+    Parametros del UPDATE_ORDEN a partir de la respuesta del mercado
     """
-    try:
-        cursor = conn.cursor()
+    # Extraer datos de la respuesta
+    order = orden_response['order']
+    price = order.get('price', 0)
+    size = order.get('orderQty', 0)
+    side = order.get('side', '')
+    status = order.get('status', '')
+    order_id = order.get('orderId', '')
+    avg_price = order.get('avgPx', 0)
+    filled = order.get('cumQty', 0)
 
-        # Extraer datos de la respuesta
-        order = orden_response['order']
-        price = order.get('price', 0)
-        size = order.get('orderQty', 0)
-        side = order.get('side', '')
-        status = order.get('status', '')
-        order_id = order.get('orderId', '')
-        avg_price = order.get('avgPx', 0)
-        filled = order.get('cumQty', 0)
+    # Calcular pxq y pxq_filled
+    pxq = price * size if price and size else 0
+    pxq_filled = avg_price * filled if avg_price and filled else 0
 
-        # Calcular pxq y pxq_filled
-        pxq = price * size if price and size else 0
-        pxq_filled = avg_price * filled if avg_price and filled else 0
+    return order_id, price, size, side, pxq, avg_price, filled, pxq_filled, status, id_operacion
 
-        cursor.execute('''
-          UPDATE operaciones 
-          SET order_id = ?,
-              price = ?,
-              size = ?,
-              side = ?,
-              pxq = ?,
-              avg_price = ?,
-              filled = ?,
-              pxq_filled = ?,
-              status = ?
-          WHERE id_operacion = ?
-      ''', (order_id, price, size, side, pxq, avg_price, filled,
-            pxq_filled, status, id_operacion))
 
-        conn.commit()
+def actualizar_orden(conn, id_operacion, orden_response):
+    """
+    Actualiza una orden existente con la respuesta del mercado
+    """
+    try:
+        with transaction(conn):
+            conn.execute(UPDATE_ORDEN, _valores_orden(id_operacion, orden_response))
         return True
     except Error as e:
         print(f"Error al actualizar orden: {e}")
         return False
 
 
+def actualizar_ordenes(conn, respuestas):
+    """
+    Actualiza varias ordenes en una sola transaccion
+    :param respuestas: lista de (id_operacion, orden_response)
+    """
+    try:
+        with transaction(conn):
+            conn.executemany(UPDATE_ORDEN, [_valores_orden(i, r) for i, r in respuestas])
+        return True
+    except Error as e:
+        print(f"Error al actualizar ordenes: {e}")
+        return False
+
+
 def consultar_ordenes_por_todo(conn, id_todo):
     """
     Consulta todas las órdenes asociadas a un id_todo específico
@@ -255,50 +348,53 @@ def consultar_ordenes_por_todo(conn, id_todo):
         return []
 
 
-def actualizar_status_todo(conn, id_todo):
+def consultar_ordenes_abiertas(conn, id_todo):
     """
-    Actualiza el status de un todo basado en el estado de sus órdenes
-    Returns:
-        str: El nuevo status del todo ('FILLED', 'REVISAR', o None si hubo error)
+    Ordenes del todo que todavia no estan finalizadas (las que hay que seguir consultando)
     """
     try:
-        cursor = conn.cursor()
-        FINALIZADAS = ['FILLED', 'REJECTED', 'CANCELED']
-
-        # Obtener todas las órdenes del todo
-        cursor.execute('''
-          SELECT status
+        cursor = conn.execute('''
+          SELECT id_operacion, clientId, symbol, status
           FROM operaciones
           WHERE id_todo = ?
+            AND (status IS NULL OR status NOT IN ('FILLED', 'REJECTED', 'CANCELED'))
+          ORDER BY id_operacion
       ''', (id_todo,))
 
-        ordenes_status = [row[0] for row in cursor.fetchall()]
+        columnas = [description[0] for description in cursor.description]
+        return [dict(zip(columnas, row)) for row in cursor.fetchall()]
+
+    except Error as e:
+        print(f"Error al consultar órdenes: {e}")
+        return []
+
 
-        if not ordenes_status:
+def actualizar_status_todo(conn, id_todo):
+    """
+    Actualiza el status de un todo basado en el estado de sus órdenes
+    Returns:
+        str: El nuevo status del todo ('FILLED', 'REVISAR', o None si hubo error)
+    """
+    try:
+        # Los contadores de resumen los mantienen los triggers: una busqueda por PRIMARY KEY
+        resumen = resumen_todo(conn, id_todo)
+
+        if not resumen or not resumen['legs']:
             print(f"No se encontraron órdenes para el todo {id_todo}")
             return None
 
-        # Verificar si todas están finalizadas
-        todas_finalizadas = all(status in FINALIZADAS for status in ordenes_status)
-        todas_filled = all(status == 'FILLED' for status in ordenes_status)
-
         # Determinar el nuevo status
-        nuevo_status = None
-        if todas_finalizadas:
-            if todas_filled:
-                nuevo_status = 'FILLED'
-            else:
-                nuevo_status = 'REVISAR'
+        nuevo_status = status_final(resumen)
 
         # Actualizar el status en la tabla todo
         if nuevo_status:
-            cursor.execute('''
-              UPDATE todo
-              SET status = ?
-              WHERE id = ?
-          ''', (nuevo_status, id_todo))
+            with transaction(conn):
+                conn.execute('''
+                  UPDATE todo
+                  SET status = ?
+                  WHERE id = ?
+              ''', (nuevo_status, id_todo))
 
-            conn.commit()
             print(f"Todo {id_todo} actualizado a status: {nuevo_status}")
             return nuevo_status
 
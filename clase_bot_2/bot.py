@@ -1,9 +1,14 @@
 from database import Database
 from clase_primary.clase_pyrofex import PyRofexClient
+from clase_primary.instrument_catalog import get_catalog
+from clase_primary.order_gateway import OrderGateway
+from clase_primary.order_tracker import FakeOrderReportFeed
+from clase_primary.sizing import calc_montos_batch
 import pyRofex
-import time
-import json
+import asyncio
+import functools
 import random
+from concurrent.futures import ThreadPoolExecutor
 # bot.py
 class TradingBot(PyRofexClient):
     def __init__(self, config_file="keys.json", descargar_instruments=False):
@@ -20,9 +25,35 @@ class TradingBot(PyRofexClient):
         self.data_symbols = {}
         self.ddbb_precios = {}
         self.multiplicador = 1000
+        self.max_pct_book = None  # planificacion.txt: nunca mas del 50% de la punta -> 0.5
 
         self.orders_id = []
 
+        # Execution reports: el tracker escribe en la DDBB desde su thread, con su propia conexion
+        self.reports_db = None
+        self.order_tracker.set_writer(self.write_order_reports)
+        self.reconciliar = 60  # segundos sin execution reports antes de consultar las ordenes por REST
+
+        # Simulacion: las ordenes no se envian y el feed de mentira contesta los execution reports
+        self.simular_ordenes = True
+        self.fake_feed = FakeOrderReportFeed(self.order_report_handler, delay=1)
+
+        # Envio de ordenes en paralelo, con rate limit (ordenes por segundo)
+        self.gateway = OrderGateway(self.simulate_limit_order if self.simular_ordenes else self.place_limit_order,
+                                    rate_limit=10)
+
+        # Loop asyncio: una task por to-do, despertada por los execution reports de sus ordenes
+        self.poll = 2  # segundos entre consultas de to-dos nuevos
+        self.reintentar = 600  # segundos antes de reintentar un to-do que no envio ordenes
+        self.loop = None
+        self.tasks = {}  # id_todo -> asyncio.Task
+        self._eventos = {}  # id_todo -> asyncio.Event
+        self._todo_de_orden = {}  # clientId -> id_todo
+        self._reintentos = {}  # id_todo -> loop.time() desde el que se puede reintentar
+        self._wakeup = None
+        self._db_executor = None  # thread unico para self.db: el loop no se bloquea con SQLite
+        self.order_tracker.add_listener(self._on_order_report)
+
         # Instruments
         if descargar_instruments:
             self.get_instruments_and_save()
@@ -31,71 +62,102 @@ class TradingBot(PyRofexClient):
         """Inicializa el bot"""
         self.db.connect()
         self.db.create_tables()
+        if not self.simular_ordenes:
+            self.subscribe_order_reports()
+            self.subscribe_market_data(self.db.query_instruments(), printer=False)  # order books para calc_montos
         print("Bot initialized successfully")
 
-    def process_pending_orders(self):
-        """Procesa órdenes pendientes"""
-        pending = self.db.query_todo()
-        for p in pending:
-            if p["status"] == "pendiente":
+    def load_market_data(self):
+        """Data de los instrumentos y puntas de precios para calc_montos"""
+        # self.symbols = self.db.query_instruments()  # get instruments de sql
 
-                # self.symbols = self.db.query_instruments()  # get instruments de sql
+        # self.get_data_instruments()  # obtengo la data de los symbols
+        # self.build_ddbb_precios()  # Obtengo puntas de precios
 
-                # self.get_data_instruments()  # obtengo la data de los symbols
-                # self.build_ddbb_precios()  # Obtengo puntas de precios
+        self.data_symbols = {'DLR/ENE25': {'tick_price': 0.5, 'tick_size': 1.0, 'vencimiento': '2025-01-31'},
+                        'DLR/NOV24': {'tick_price': 0.5, 'tick_size': 1.0, 'vencimiento': '2024-11-29'},
+                        'DLR/DIC24': {'tick_price': 0.5, 'tick_size': 1.0, 'vencimiento': '2024-12-30'}}
+        self.ddbb_precios = {'DLR/ENE25': {'OF': [{'price': 1081.0, 'size': 90}], 'LA': None,
+                                      'BI': [{'price': 1080.5, 'size': 350}]},
+                        'DLR/NOV24': {'OF': [{'price': 1018.0, 'size': 5053}], 'LA': None,
+                                      'BI': [{'price': 1017.0, 'size': 7534}]},
+                        'DLR/DIC24': {'OF': [{'price': 1048.0, 'size': 295}], 'LA': None,
+                                      'BI': [{'price': 1047.5, 'size': 2059}]}}
 
-                self.data_symbols = {'DLR/ENE25': {'tick_price': 0.5, 'tick_size': 1.0, 'vencimiento': '2025-01-31'},
-                                'DLR/NOV24': {'tick_price': 0.5, 'tick_size': 1.0, 'vencimiento': '2024-11-29'},
-                                'DLR/DIC24': {'tick_price': 0.5, 'tick_size': 1.0, 'vencimiento': '2024-12-30'}}
-                self.ddbb_precios = {'DLR/ENE25': {'OF': [{'price': 1081.0, 'size': 90}], 'LA': None,
-                                              'BI': [{'price': 1080.5, 'size': 350}]},
-                                'DLR/NOV24': {'OF': [{'price': 1018.0, 'size': 5053}], 'LA': None,
-                                              'BI': [{'price': 1017.0, 'size': 7534}]},
-                                'DLR/DIC24': {'OF': [{'price': 1048.0, 'size': 295}], 'LA': None,
-                                              'BI': [{'price': 1047.5, 'size': 2059}]}}
+    def process_pending_orders(self):
+        """Procesa órdenes pendientes"""
+        pending = self.db.query_todo(status='pendiente')
+        if not pending:
+            return
+
+        self.load_market_data()
 
-                orders = self.calc_montos(p['monto'])  # Calculo las ordenes a enviar
+        # Calculo las ordenes a enviar de todos los pendientes juntos
+        orders_batch = self.calc_montos_batch([p['monto'] for p in pending])
 
-                self.execute_order_strategy(orders, p['id'])
+        for p, orders in zip(pending, orders_batch):
+            self.execute_order_strategy(orders, p['id'])
 
-                self.finish_pendiente(p['id'])
+            self.finish_pendiente(p['id'])
+            self.forget_todo(p['id'])
 
-                print('Finalizado el pendiente con id:', p['id'])
+            print('Finalizado el pendiente con id:', p['id'])
 
     def execute_order_strategy(self, ordenes, id_todo):
         """Ejecuta la estrategia de trading para un pendiente"""
         try:
 
-            for order_enviar in ordenes:
-
-                symbol = order_enviar
-                price = ordenes[order_enviar]['price']
-                size = ordenes[order_enviar]['size']
+            # Todas las patas salen a la vez
+            legs = self.basket_legs(ordenes)
+            futures = self.gateway.send_basket(legs)
 
-                if size < 1:  # si el size es menor a 1, no hago nada
-                    continue
+            for leg, future in zip(legs, futures):
+                try:
+                    respuesta = future.result()
+                except Exception as e:
+                    respuesta = e
+                self.register_order(leg, respuesta, id_todo)
 
-                # orden = self.place_limit_order(ticker=symbol, price=price, size=size, side=pyRofex.Side.BUY)
-                # print(orden)
-
-                client_id = str(random.randint(100000, 999999))
+        except Exception as e:
+            print(f"Error executing order: {e}")
 
-                # Guardo en la DDBB
-                insertar_orden = self.db.insert_order(
-                    # client_id=orden['order']['clientId'],
-                    client_id=client_id,
-                    id_todo=id_todo, symbol=symbol)
-                if not insertar_orden:
-                    print("Error al actualizar la DDBB")
+    @staticmethod
+    def basket_legs(ordenes):
+        """Patas a enviar de una canasta de calc_montos (si el size es menor a 1, no la mando)"""
+        return [{'ticker': symbol, 'side': pyRofex.Side.BUY, 'size': o['size'], 'price': o['price']}
+                for symbol, o in ordenes.items() if o['size'] >= 1]
 
+    def register_order(self, leg, respuesta, id_todo):
+        """
+        Guarda la orden enviada en la DDBB y la registra en el tracker: desde aca la actualizan los execution reports
+        :param respuesta: respuesta de send_order o la excepcion si fallo el envio
+        """
+        try:
+            if isinstance(respuesta, Exception):
+                raise respuesta
+            client_id = respuesta['order']['clientId']
         except Exception as e:
-            print(f"Error executing order: {e}")
+            print(f"Error al enviar la orden {leg}: {e}")
+            return None
+
+        insertar_orden = self.db.insert_order(client_id=client_id, id_todo=id_todo, symbol=leg['ticker'])
+        if not insertar_orden:
+            print("Error al actualizar la DDBB")
+        self._todo_de_orden[client_id] = id_todo
+        self.order_tracker.track(client_id, id_operacion=insertar_orden)
+        return client_id
+
+    def simulate_limit_order(self, ticker, side, size, price):
+        """Como place_limit_order pero sin mandar la orden: el fake feed contesta los execution reports"""
+        client_id = str(random.randint(100000, 999999))
+        self.fake_feed.new(client_id, ticker, price, size, side=getattr(side, 'value', side))  # pyRofex.Side es un Enum
+        self.fake_feed.fill(client_id)
+        return {'status': 'OK', 'order': {'clientId': client_id, 'proprietary': 'PBCP'}}
 
     def finish_pendiente(self, id_todo):
-        """Finaliza un pendiente"""
-        while True:  # Consulto las ordenes hasta que esten todas finalizadas
-            ordenes = self.db.get_orders_by_todo(id_todo)
-            print(ordenes)
+        """Finaliza un pendiente: espera los execution reports hasta que esten todas las ordenes finalizadas"""
+        while True:
+            self.order_tracker.flush()  # los reports recibidos ya estan en la DDBB
 
             # verifico si todas las ordenes estan finalizadas
             nuevo_status = self.db.update_todo_status(id_todo)
@@ -103,65 +165,168 @@ class TradingBot(PyRofexClient):
                 print(f"Todo {id_todo} finalizado con status: {nuevo_status}")
                 break
 
-            # Si no estan finalizadas, consulto las ordenes y actualizo la DDBB
-            for orden_sql in ordenes:
-                status = orden_sql['status']
-                if status in ['FILLED', 'REJECTED', 'CANCELED']:
-                    continue
-                else:
-                    client_id = orden_sql['clientId']
-                    # orden = self.consultar_orden(client_order_id=client_id)
-                    # print(orden)
-
-                    # Orden modelo para la base de datos
-                    orden = {
-                        "status": "OK",
-                        "order": {
-                            "orderId": "1130835",
-                            # "clOrdId": "user1145712381052053",
-                            "clOrdId": client_id,
-                            "proprietary":"PBCP",
-                            "execId":"160229133429-fix1-493",
-                            "accountId":{ "id":"10" },
-                            "instrumentId":{ "marketId":"ROFX", "symbol":"DLR/DIC23" },
-                            "price":183,
-                            "orderQty":10,
-                            "ordType":"LIMIT",
-                            "side":"BUY",
-                            "timeInForce":"DAY",
-                            "transactTime":"20160304-17:37:35",
-                            "avgPx":0,
-                            "lastPx":0,
-                            "lastQty":0,
-                            "cumQty":0,
-                            "leavesQty":10,
-                            "status":"FILLED",
-                            "text":"Aceptada" } }
-
-                    actualizar_ddbb = self.db.update_order(id_operacion=orden_sql['id_operacion'], orden_response=orden)
-                    if not actualizar_ddbb:
-                        print("Error al actualizar la DDBB")
-
-            print('Aun quedan ordenes, espero 10 segundos')
-            time.sleep(10)
+            abiertas = [o for o in self.db.get_orders_by_todo(id_todo)
+                        if o['status'] not in ['FILLED', 'REJECTED', 'CANCELED']]
+            if not abiertas:  # no se envio ninguna orden, el pendiente queda para la proxima vuelta
+                print(f"Todo {id_todo} sin ordenes")
+                break
+
+            client_ids = [o['clientId'] for o in abiertas]
+            for o in abiertas:  # por si quedaron abiertas de una corrida anterior
+                self.order_tracker.track(o['clientId'], id_operacion=o['id_operacion'])
+
+            # Si no llegan los reports, consulto por REST las que siguen abiertas
+            if not self.order_tracker.wait_final(client_ids, timeout=self.reconciliar) and not self.simular_ordenes:
+                print(f'Sin execution reports en {self.reconciliar} segundos, consulto por REST')
+                self.order_tracker.reconcile(self.consultar_orden, client_ids)
+
+    def write_order_reports(self, respuestas):
+        """Escribe los execution reports en la DDBB (lo llama el thread del tracker)"""
+        if self.reports_db is None:
+            self.reports_db = Database(self.db.db_name)
+            self.reports_db.connect()
+        return self.reports_db.update_orders(respuestas)
+
+    def forget_todo(self, id_todo):
+        """Saca del mapa clientId -> id_todo y del tracker las ordenes de un to-do que ya no se espera"""
+        client_ids = [client_id for client_id, todo in self._todo_de_orden.copy().items() if todo == id_todo]
+        for client_id in client_ids:
+            self._todo_de_orden.pop(client_id, None)
+        self.order_tracker.forget(client_ids)
+
+    ### LOOP ASYNCIO
+    async def _db(self, fx, *args, **kwargs):
+        """
+        Corre una llamada a self.db en el thread de la DDBB. Es uno solo: las tasks no usan
+        la conexion a la vez y el loop sigue atendiendo a los otros to-dos mientras tanto
+        """
+        return await self.loop.run_in_executor(self._db_executor, functools.partial(fx, *args, **kwargs))
+
+    def _on_order_report(self, client_id):
+        """Listener del tracker (thread del websocket): despierta la task del to-do de la orden"""
+        id_todo = self._todo_de_orden.get(client_id)
+        evento = self._eventos.get(id_todo)
+        if evento is not None and self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(evento.set)
+
+    def notify_new_todo(self):
+        """Avisa que hay un to-do nuevo para no esperar al proximo poll (se puede llamar desde cualquier thread)"""
+        if self._wakeup is not None and self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def execute_order_strategy_async(self, ordenes, id_todo):
+        """Como execute_order_strategy, esperando los acks sin bloquear el loop"""
+        legs = self.basket_legs(ordenes)
+        futures = [asyncio.wrap_future(f) for f in self.gateway.send_basket(legs)]
+        respuestas = await asyncio.gather(*futures, return_exceptions=True)
+
+        for leg, respuesta in zip(legs, respuestas):
+            await self._db(self.register_order, leg, respuesta, id_todo)
+
+    async def finish_pendiente_async(self, id_todo):
+        """
+        Como finish_pendiente: la task duerme hasta que llega un execution report de sus ordenes
+        o vence el timer de reconciliacion (se cancela con la task)
+        """
+        evento = self._eventos[id_todo]
+        while True:
+            evento.clear()  # antes de mirar la DDBB, asi no se pierde un report que llegue en el medio
+            await asyncio.to_thread(self.order_tracker.flush)  # los reports recibidos ya estan en la DDBB
+
+            nuevo_status = await self._db(self.db.update_todo_status, id_todo)
+            if nuevo_status in ['FILLED', 'REVISAR']:
+                print(f"Todo {id_todo} finalizado con status: {nuevo_status}")
+                return nuevo_status
+
+            abiertas = [o for o in await self._db(self.db.get_orders_by_todo, id_todo)
+                        if o['status'] not in ['FILLED', 'REJECTED', 'CANCELED']]
+            if not abiertas:  # no se envio ninguna orden
+                print(f"Todo {id_todo} sin ordenes")
+                return None
+
+            client_ids = [o['clientId'] for o in abiertas]
+            for o in abiertas:  # por si quedaron abiertas de una corrida anterior
+                self._todo_de_orden[o['clientId']] = id_todo
+                self.order_tracker.track(o['clientId'], id_operacion=o['id_operacion'])
+
+            if not self.order_tracker.open_orders(client_ids):
+                continue  # ya terminaron en memoria, falta verlas en la DDBB
+
+            try:
+                await asyncio.wait_for(evento.wait(), timeout=self.reconciliar)
+            except asyncio.TimeoutError:
+                if not self.simular_ordenes:
+                    print(f'Todo {id_todo} sin execution reports en {self.reconciliar} segundos, consulto por REST')
+                    await asyncio.to_thread(self.order_tracker.reconcile, self.consultar_orden, client_ids)
+
+    async def run_todo(self, todo, ordenes):
+        """Task de un to-do: envia la canasta y espera a que terminen las ordenes"""
+        id_todo = todo['id']
+        try:
+            await self.execute_order_strategy_async(ordenes, id_todo)
+            nuevo_status = await self.finish_pendiente_async(id_todo)
+            if nuevo_status is None:  # sigue pendiente: se reintenta mas tarde
+                self._reintentos[id_todo] = self.loop.time() + self.reintentar
+            print('Finalizado el pendiente con id:', id_todo)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error en el pendiente {id_todo}: {e}")
+            self._reintentos[id_todo] = self.loop.time() + 60  # 1 minuto en caso de error
+        finally:
+            # si sigue pendiente, la proxima task vuelve a registrar sus ordenes abiertas
+            self.tasks.pop(id_todo, None)
+            self._eventos.pop(id_todo, None)
+            self.forget_todo(id_todo)
+
+    async def main_async(self):
+        """
+        Scheduler: cada poll segundos (o cuando avisan con notify_new_todo) busca to-dos pendientes
+        por el indice de status y lanza una task por cada uno nuevo. Las canastas nuevas se calculan juntas.
+        """
+        self.loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db')
+
+        try:
+            while self.is_running:
+                try:
+                    ahora = self.loop.time()
+                    nuevos = [p for p in await self._db(self.db.query_todo, status='pendiente')
+                              if p['id'] not in self.tasks and self._reintentos.get(p['id'], 0) <= ahora]
+
+                    if nuevos:
+                        self.load_market_data()
+                        for p, ordenes in zip(nuevos, self.calc_montos_batch([p['monto'] for p in nuevos])):
+                            self._eventos[p['id']] = asyncio.Event()
+                            self.tasks[p['id']] = asyncio.create_task(self.run_todo(p, ordenes))
+                except Exception as e:
+                    print(f"Error in bot execution: {e}")
+
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # al parar se cancelan las tasks (y sus timers), las ordenes quedan en la DDBB para la proxima corrida
+            tasks = list(self.tasks.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._db_executor.shutdown(wait=True)
 
     def run(self):
         """Ejecuta el bot en un loop continuo"""
         self.is_running = True
         self.initialize()
-
-        while self.is_running:
-            try:
-                self.process_pending_orders()
-                print("Terminado el proceso de pendientes, duermo 10 minutos")
-                time.sleep(600)  # 10 minutos
-            except Exception as e:
-                print(f"Error in bot execution: {e}")
-                time.sleep(60)  # 1 minuto en caso de error
+        asyncio.run(self.main_async())
 
     def stop(self):
         """Detiene el bot"""
         self.is_running = False
+        self.notify_new_todo()  # despierta al scheduler para que salga
+        self.gateway.shutdown(wait=False)
         print("Bot stopped")
 
     def get_data_instruments(self):
@@ -171,39 +336,22 @@ class TradingBot(PyRofexClient):
         Matuity
         minPriceIncrement
         tickSize
-        orderTypes
-        instrumentPricePrecision
-        """
-
-        # abro el json
-        with open(self.file_instruments, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-
-        instruments = data['instruments']
-        for instrument in instruments:
-            symbol = instrument['securityDescription']
-
-            for s in self.symbols:
-                if s == symbol:
-                    self.data_symbols[symbol] = {}
-                    self.data_symbols[symbol]['tick_price'] = instrument['minPriceIncrement']
-                    self.data_symbols[symbol]['tick_size'] = instrument['tickSize']
-
-                    maturityDate = instrument['maturityDate']
-
-                    # example "20250131", this to datetime
-                    year = maturityDate[0:4]
-                    month = maturityDate[4:6]
-                    day = maturityDate[6:8]
-                    self.data_symbols[symbol]['vencimiento'] = f"{year}-{month}-{day}"
 
-                    break
+        Usa el catalogo en SQLite (clase_primary/instrument_catalog.py): el json solo se vuelve a
+        parsear si cambio y cada simbolo es una busqueda por clave
+        """
+        self.data_symbols.update(get_catalog(self.file_instruments).lookup(self.symbols))
 
     def build_ddbb_precios(self):
-        """Construye el diccionario de precios de la base de datos"""
+        """
+        Construye el diccionario de precios desde los order books del websocket (market_data_cache).
+        Solo los simbolos que todavia no tienen datos se piden por REST.
+        """
+        self.ddbb_precios = self.market_data_cache.ddbb_precios(self.symbols)
         for symbol in self.symbols:
-            md = self.get_market_data(symbol)
-            self.ddbb_precios[symbol] = md.get('marketData')
+            if symbol not in self.ddbb_precios:
+                md = self.get_market_data(symbol)
+                self.ddbb_precios[symbol] = md.get('marketData')
 
     def calc_montos(self, monto_operar):
         """
@@ -213,44 +361,22 @@ class TradingBot(PyRofexClient):
 
         El monto sera un ponderado en base al size que tiene cada punta
 
-        :param ddbb_precios:
         :param monto_operar:
         :return:
         """
+        return self.calc_montos_batch([monto_operar])[0]
 
-        ordenes = {}
-        monto_sobrante = 0
-
-        size_total = 0
-        for i in self.ddbb_precios:
-            if self.ddbb_precios[i]['OF']:
-                size = self.ddbb_precios[i]['OF'][0]['size']
-                size_total += size
-
-            elif self.ddbb_precios[i]['BI']:
-                size = self.ddbb_precios[i]['BI'][0]['size']
-                size_total += size
-
-        for i in self.ddbb_precios:
-            tick_size = float(self.data_symbols[i]['tick_size'])
-
-            if self.ddbb_precios[i]['OF'] or self.ddbb_precios[i]['BI']:
-                size_i = self.ddbb_precios[i]['OF'][0]['size'] if self.ddbb_precios[i]['OF'] else self.ddbb_precios[i]['BI'][0]['size']
-                price_i = self.ddbb_precios[i]['OF'][0]['price'] if self.ddbb_precios[i]['OF'] else self.ddbb_precios[i]['BI'][0][
-                    'price']
-
-                monto_ars = (size_i / size_total) * (monto_operar) + monto_sobrante
-
-                contratos = monto_ars / (price_i * self.multiplicador)
-                # round to the lower tick size
-                contratos_adj = int(contratos // tick_size) * tick_size
-
-                pxq = price_i * contratos_adj * self.multiplicador
-                monto_sobrante = monto_ars - pxq
-
-                ordenes[i] = {'monto': pxq, 'size': contratos_adj, 'price': price_i}
-
-        print('Monto sobrante:', round(monto_sobrante))
+    def calc_montos_batch(self, montos):
+        """
+        calc_montos para varios to-dos a la vez (ver clase_primary/sizing.py). Si max_pct_book no es None,
+        entre todos los to-dos nunca se pide mas que esa fraccion de la punta.
+        :param montos: lista de montos a operar
+        :return: lista de ordenes, una por monto
+        """
+        ordenes, sobrante = calc_montos_batch(self.ddbb_precios, montos, self.data_symbols,
+                                              self.multiplicador, self.max_pct_book)
+        for monto_sobrante in sobrante:
+            print('Monto sobrante:', round(monto_sobrante))
 
         return ordenes
 
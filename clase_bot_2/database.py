@@ -3,6 +3,8 @@ import sqlite3
 from sqlite3 import Error
 from typing import List, Dict, Optional, Any
 
+from clase_primary.resumen import create_resumen, resumen_todo, status_final
+
 
 class Database:
     def __init__(self, db_name='cauciones_clases.db'):
@@ -19,7 +21,8 @@ class Database:
         :return:
         """
         try:
-            self.conn = sqlite3.connect(self.db_name)
+            # el bot asincronico usa la conexion desde su thread de DDBB (de a una llamada por vez)
+            self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
             return self.conn
         except Error as e:
             print(f"Error connecting to database: {e}")
@@ -83,6 +86,13 @@ class Database:
                       )
                   ''')
 
+            # Indices para las ordenes de un to-do (get_orders_by_todo y el resumen) y los to-dos pendientes
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_operaciones_id_todo ON operaciones(id_todo)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_todo_status ON todo(status)')
+
+            # Contadores por to-do en resumen, mantenidos por triggers sobre operaciones
+            create_resumen(self.conn)
+
             self.conn.commit()
             print("Tablas creadas exitosamente")
         except Error as e:
@@ -127,16 +137,21 @@ class Database:
             self.conn.rollback()
             return False
 
-    def query_todo(self) -> List[Dict[str, Any]]:
+    def query_todo(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
         """
-        Consulta todas las tareas pendientes.
+        Consulta las tareas.
+        Args:
+            status (Optional[str]): solo las tareas con ese status (usa idx_todo_status), None = todas
         Returns:
             List[Dict]: Lista de diccionarios con las tareas
         """
         todo = []
         try:
             cursor = self.conn.cursor()
-            cursor.execute("SELECT * FROM todo")
+            if status is None:
+                cursor.execute("SELECT * FROM todo")
+            else:
+                cursor.execute("SELECT * FROM todo WHERE status = ?", (status,))
             rows = cursor.fetchall()
 
             for row in rows:
@@ -186,6 +201,43 @@ class Database:
             print(f"Error al insertar orden inicial: {e}")
             return None
 
+    @staticmethod
+    def _order_values(id_operacion: int, orden_response: Dict) -> tuple:
+        """
+        Parámetros del UPDATE de operaciones a partir de la respuesta del mercado
+        (get_order_status o el orderReport de un execution report: tienen los mismos campos)
+        """
+        order = orden_response['order']
+
+        # Extraer datos
+        price = order.get('price', 0)
+        size = order.get('orderQty', 0)
+        side = order.get('side', '')
+        status = order.get('status', '')
+        order_id = order.get('orderId', '')
+        avg_price = order.get('avgPx', 0)
+        filled = order.get('cumQty', 0)
+
+        # Calcular valores
+        pxq = price * size if price and size else 0
+        pxq_filled = avg_price * filled if avg_price and filled else 0
+
+        return order_id, price, size, side, pxq, avg_price, filled, pxq_filled, status, id_operacion
+
+    UPDATE_ORDER = '''
+        UPDATE operaciones 
+        SET order_id = ?,
+            price = ?,
+            size = ?,
+            side = ?,
+            pxq = ?,
+            avg_price = ?,
+            filled = ?,
+            pxq_filled = ?,
+            status = ?
+        WHERE id_operacion = ?
+    '''
+
     def update_order(self, id_operacion: int, orden_response: Dict) -> bool:
         """
         Actualiza una orden existente con la respuesta del mercado.
@@ -197,35 +249,7 @@ class Database:
         """
         try:
             cursor = self.conn.cursor()
-            order = orden_response['order']
-
-            # Extraer datos
-            price = order.get('price', 0)
-            size = order.get('orderQty', 0)
-            side = order.get('side', '')
-            status = order.get('status', '')
-            order_id = order.get('orderId', '')
-            avg_price = order.get('avgPx', 0)
-            filled = order.get('cumQty', 0)
-
-            # Calcular valores
-            pxq = price * size if price and size else 0
-            pxq_filled = avg_price * filled if avg_price and filled else 0
-
-            cursor.execute('''
-                UPDATE operaciones 
-                SET order_id = ?,
-                    price = ?,
-                    size = ?,
-                    side = ?,
-                    pxq = ?,
-                    avg_price = ?,
-                    filled = ?,
-                    pxq_filled = ?,
-                    status = ?
-                WHERE id_operacion = ?
-            ''', (order_id, price, size, side, pxq, avg_price, filled,
-                  pxq_filled, status, id_operacion))
+            cursor.execute(self.UPDATE_ORDER, self._order_values(id_operacion, orden_response))
 
             self.conn.commit()
             return True
@@ -233,6 +257,22 @@ class Database:
             print(f"Error al actualizar orden: {e}")
             return False
 
+    def update_orders(self, respuestas: List[tuple]) -> bool:
+        """
+        Actualiza varias órdenes en una sola transacción.
+        Args:
+            respuestas (List[tuple]): lista de (id_operacion, orden_response)
+        Returns:
+            bool: True si se actualizaron correctamente, False en caso contrario
+        """
+        try:
+            with self.conn:  # commit al final o rollback si falla
+                self.conn.executemany(self.UPDATE_ORDER, [self._order_values(i, r) for i, r in respuestas])
+            return True
+        except Error as e:
+            print(f"Error al actualizar ordenes: {e}")
+            return False
+
     def get_orders_by_todo(self, id_todo: int) -> List[Dict[str, Any]]:
         """
         Consulta todas las órdenes asociadas a un id_todo específico.
@@ -269,26 +309,15 @@ class Database:
         """
         try:
             cursor = self.conn.cursor()
-            FINALIZADAS = ['FILLED', 'REJECTED', 'CANCELED']
-
-            cursor.execute('''
-                SELECT status
-                FROM operaciones
-                WHERE id_todo = ?
-            ''', (id_todo,))
 
-            ordenes_status = [row[0] for row in cursor.fetchall()]
+            # Los contadores de resumen los mantienen los triggers: una busqueda por PRIMARY KEY
+            resumen = resumen_todo(self.conn, id_todo)
 
-            if not ordenes_status:
+            if not resumen or not resumen['legs']:
                 print(f"No se encontraron órdenes para el todo {id_todo}")
                 return None
 
-            todas_finalizadas = all(status in FINALIZADAS for status in ordenes_status)
-            todas_filled = all(status == 'FILLED' for status in ordenes_status)
-
-            nuevo_status = None
-            if todas_finalizadas:
-                nuevo_status = 'FILLED' if todas_filled else 'REVISAR'
+            nuevo_status = status_final(resumen)
 
             if nuevo_status:
                 cursor.execute('''
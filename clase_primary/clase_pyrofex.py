@@ -3,6 +3,10 @@ import json
 import time
 import threading
 
+from clase_primary.instrument_catalog import get_catalog
+from clase_primary.order_book import OrderBookCache
+from clase_primary.order_tracker import OrderTracker
+
 # https://apihub.primary.com.ar/assets/docs/Primary-API.pdf
 # https://github.com/matbarofex/pyRofex
 
@@ -35,10 +39,13 @@ class PyRofexClient:
         self.load_credentials()
         self.authenticate()
 
-        # # Para la market data
-        # self.market_data_cache = {}  # Para almacenar los últimos datos recibidos
-        # self.running = False  # Control flag para el hilo
-        # self.execution_running = False  # Control flag para el hilo de ejecución
+        # Ordenes seguidas por execution reports (ver order_tracker.py)
+        self.order_tracker = OrderTracker()
+
+        # Para la market data
+        self.market_data_cache = OrderBookCache()  # Order books alimentados por el websocket (ver order_book.py)
+        self.running = False  # Control flag para el hilo
+        self.execution_running = False  # Control flag para el hilo de ejecución
 
     def load_credentials(self):
         """
@@ -65,6 +72,8 @@ class PyRofexClient:
             json.dump(instruments, file, indent=4)
         print(f"Instruments saved to {filename}.")
 
+        get_catalog(filename)  # actualiza el catalogo en SQLite con lo que cambio
+
     ### MARKET DATA
     def get_market_data(self, ticker):
         market_data = pyRofex.get_market_data(ticker=ticker,
@@ -111,9 +120,8 @@ class PyRofexClient:
     ### MARKET DATA WEB SOCKETS
     def market_data_handler(self, message):
         """Callback para manejar los mensajes de market data"""
-        print(f"Message received: {message}")
-        if message['type'] == 'Md':
-            self.market_data_cache[message['instrumentId']['symbol']] = message
+        # print(f"Message received: {message}")
+        self.market_data_cache.on_market_data(message)
 
     def error_handler(self, message):
         """Callback para manejar errores"""
@@ -123,25 +131,25 @@ class PyRofexClient:
         """Función que se ejecutará en el hilo para imprimir el order book"""
         while self.running:
 
-            # print(self.market_data_cache)
-
-            if symbol in self.market_data_cache:
-                data = self.market_data_cache[symbol]
+            snapshot = self.market_data_cache.snapshot(symbol)  # copia inmutable, no hace falta lock
+            if snapshot is not None and snapshot.seq > 0:
                 print("\n=== Order Book ===")
-                print(f"Instrumento: {symbol}")
+                print(f"Instrumento: {symbol} (seq {snapshot.seq})")
                 print("Bids:")
-                if 'BI' in data['marketData']:
-                    for bid in data['marketData']['BI']:
-                        print(f"Precio: {bid['price']}, Cantidad: {bid['size']}")
+                for bid in snapshot.bids:
+                    print(f"Precio: {bid['price']}, Cantidad: {bid['size']}")
                 print("Offers:")
-                if 'OF' in data['marketData']:
-                    for offer in data['marketData']['OF']:
-                        print(f"Precio: {offer['price']}, Cantidad: {offer['size']}")
+                for offer in snapshot.offers:
+                    print(f"Precio: {offer['price']}, Cantidad: {offer['size']}")
                 print("================\n")
             time.sleep(10)
 
-    def subscribe_market_data(self, symbol):
-        """Suscribe a market data para un símbolo y comienza a imprimir el order book"""
+    def subscribe_market_data(self, symbol, printer=True):
+        """
+        Suscribe a market data para un símbolo (o una lista) y comienza a imprimir el order book
+        :param printer: si es False solo se actualiza market_data_cache
+        """
+        symbols = [symbol] if isinstance(symbol, str) else list(symbol)
         try:
             # Inicializar websocket si no está ya inicializado
             if not hasattr(self, '_ws_initialized'):
@@ -160,20 +168,21 @@ class PyRofexClient:
             ]
 
             pyRofex.market_data_subscription(
-                tickers=[symbol],
+                tickers=symbols,
                 entries=entries
             )
 
-            print(f"Suscrito exitosamente a {symbol}")
+            print(f"Suscrito exitosamente a {symbols}")
 
             # Iniciar el hilo para imprimir el order book
             self.running = True
-            printer_thread = threading.Thread(
-                target=self.order_book_printer,
-                args=(symbol,)
-            )
-            printer_thread.daemon = True
-            printer_thread.start()
+            for s in symbols if printer else []:
+                printer_thread = threading.Thread(
+                    target=self.order_book_printer,
+                    args=(s,)
+                )
+                printer_thread.daemon = True
+                printer_thread.start()
 
         except Exception as e:
             print(f"Error al suscribirse: {e}")
@@ -191,15 +200,18 @@ class PyRofexClient:
     # EXECUTION REPORTS
     def order_report_handler(self, message):
         """Callback para manejar los mensajes de execution reports"""
-        if message['type'] == 'OR':
+        if message.get('type', '').lower() == 'or':
+            self.order_tracker.on_report(message)
+
             print("\n=== Execution Report ===")
-            print(f"Cliente Order ID: {message.get('clientOrderId')}")
+            print(f"Cliente Order ID: {message.get('orderReport', {}).get('clOrdId')}")
             print(f"Orden Status: {message.get('orderReport', {}).get('status')}")
             print(f"Instrumento: {message.get('orderReport', {}).get('instrumentId', {}).get('symbol')}")
             print(f"Precio: {message.get('orderReport', {}).get('price')}")
-            print(f"Cantidad: {message.get('orderReport', {}).get('quantity')}")
+            print(f"Cantidad: {message.get('orderReport', {}).get('orderQty')}")
+            print(f"Ejecutado: {message.get('orderReport', {}).get('cumQty')}")
             print(f"Lado: {message.get('orderReport', {}).get('side')}")
-            print(f"Tipo de Orden: {message.get('orderReport', {}).get('orderType')}")
+            print(f"Tipo de Orden: {message.get('orderReport', {}).get('ordType')}")
             print(f"Timestamp: {message.get('timestamp')}")
             print("=====================\n")
 
@@ -0,0 +1,124 @@
+"""
+Export de las tablas de los bots (fx_sqlite / Database) a Parquet
+
+- Las tablas se leen con fetchmany de a chunk_size filas y cada chunk se escribe como un RecordBatch de Arrow,
+  asi la memoria no depende del tamaño de la tabla
+- Cada columna tiene su tipo fijo (SCHEMAS): una tabla vacia o con NULLs exporta el mismo esquema
+- Los agregados por to-do (pxq ejecutado, tasa promedio, patas por status) estan en resumen, que mantienen
+  los triggers de clase_primary/resumen.py: los reportes por to-do leen resumen y no recorren operaciones
+
+Estructura:
+    export/todo.parquet
+    export/operaciones.parquet
+    export/resumen.parquet
+    export/instruments.parquet
+"""
+
+import os
+import sqlite3
+
+import pyarrow as pa  # pip install pyarrow
+import pyarrow.parquet as pq
+
+SCHEMAS = {
+    'todo': pa.schema([
+        ('id', pa.int64()),
+        ('monto', pa.float64()),
+        ('status', pa.string()),
+    ]),
+    'operaciones': pa.schema([
+        ('id_operacion', pa.int64()),
+        ('id_todo', pa.int64()),
+        ('clientId', pa.string()),
+        ('order_id', pa.string()),
+        ('symbol', pa.string()),
+        ('price', pa.float64()),
+        ('size', pa.int64()),
+        ('side', pa.string()),
+        ('pxq', pa.float64()),
+        ('avg_price', pa.float64()),
+        ('filled', pa.int64()),
+        ('pxq_filled', pa.float64()),
+        ('status', pa.string()),
+        ('tasa', pa.float64()),
+    ]),
+    'resumen': pa.schema([
+        ('id_todo', pa.int64()),
+        ('pxq', pa.float64()),
+        ('tasa', pa.float64()),
+        ('legs', pa.int64()),
+        ('legs_open', pa.int64()),
+        ('legs_filled', pa.int64()),
+        ('legs_rejected', pa.int64()),
+        ('legs_canceled', pa.int64()),
+        ('filled', pa.float64()),
+        ('avg_price', pa.float64()),
+    ]),
+    'instruments': pa.schema([
+        ('symbol', pa.string()),
+    ]),
+}
+
+
+def iter_batches(conn, table, chunk_size=50_000):
+    """
+    Filas de la tabla como RecordBatches de Arrow de hasta chunk_size filas
+    """
+    schema = SCHEMAS[table]
+    cursor = conn.execute(f'SELECT {", ".join(schema.names)} FROM {table}')
+
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        columns = zip(*rows)
+        # cast seguro: si un INTEGER de SQLite vino con decimales da error en vez de truncar
+        arrays = [pa.array(column).cast(field.type) for column, field in zip(columns, schema)]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def export_table(conn, table, path, chunk_size=50_000):
+    """
+    :return: cantidad de filas exportadas
+    """
+    tmp = path + '.tmp'
+    n = 0
+    with pq.ParquetWriter(tmp, SCHEMAS[table]) as writer:
+        for batch in iter_batches(conn, table, chunk_size):
+            writer.write_batch(batch)
+            n += batch.num_rows
+    os.replace(tmp, path)  # el archivo anterior queda hasta que el nuevo esta completo
+    return n
+
+
+def export_db(db_file, folder='export', tables=None, chunk_size=50_000):
+    """
+    Exporta las tablas de la DDBB a folder/{tabla}.parquet
+    :return: dict tabla -> filas exportadas
+    """
+    os.makedirs(folder, exist_ok=True)
+    conn = sqlite3.connect(db_file)
+    try:
+        return {table: export_table(conn, table, os.path.join(folder, f'{table}.parquet'), chunk_size)
+                for table in tables or SCHEMAS}
+    finally:
+        conn.close()
+
+
+def read_table(folder, table, columns=None, filters=None):
+    """
+    Lee una tabla exportada (solo las columnas y filas pedidas)
+    :param filters: filtros de pyarrow, ej: [('status', '=', 'FILLED')]
+    :return: pd.DataFrame
+    """
+    return pq.read_table(os.path.join(folder, f'{table}.parquet'), columns=columns, filters=filters).to_pandas()
+
+
+def reporte_todos(folder='export'):
+    """
+    Un renglon por to-do con el monto, el status y los agregados de resumen
+    """
+    todo = read_table(folder, 'todo')
+    resumen = read_table(folder, 'resumen')
+    df = todo.merge(resumen, how='left', left_on='id', right_on='id_todo').drop(columns='id_todo')
+    return df.set_index('id')
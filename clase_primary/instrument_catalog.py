@@ -0,0 +1,186 @@
+"""
+Catalogo de instrumentos en SQLite
+
+get_data_instruments abria y parseaba todo instruments_detailed.json en cada llamada y buscaba cada
+simbolo recorriendo todos los instrumentos (O(N*M)). El catalogo:
+- Guarda por simbolo (PRIMARY KEY) tick_price, tick_size y el vencimiento ya parseado (YYYY-MM-DD)
+- Se abre recien cuando se lo usa, con mmap de SQLite para las lecturas
+- refresh() solo re-parsea el JSON si cambio (mtime y tamaño) y escribe solo los instrumentos que cambiaron
+- lookup(symbols) es una busqueda por clave por simbolo, con un dict en memoria de lo ya consultado
+
+Estructura:
+    instruments_detailed.json -> instruments_detailed.db
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+CREATE_CATALOG = '''
+    CREATE TABLE IF NOT EXISTS instrument_catalog (
+        symbol TEXT PRIMARY KEY,
+        tick_price REAL,
+        tick_size REAL,
+        vencimiento TEXT
+    ) WITHOUT ROWID
+'''
+
+CREATE_META = '''
+    CREATE TABLE IF NOT EXISTS catalog_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+'''
+
+UPSERT = '''
+    INSERT INTO instrument_catalog (symbol, tick_price, tick_size, vencimiento) VALUES (?, ?, ?, ?)
+    ON CONFLICT(symbol) DO UPDATE SET
+        tick_price = excluded.tick_price,
+        tick_size = excluded.tick_size,
+        vencimiento = excluded.vencimiento
+    WHERE tick_price IS NOT excluded.tick_price
+       OR tick_size IS NOT excluded.tick_size
+       OR vencimiento IS NOT excluded.vencimiento
+'''
+
+
+def parse_maturity(maturity_date):
+    """
+    "20250131" -> "2025-01-31"
+    """
+    if not maturity_date:
+        return None
+    return f"{maturity_date[0:4]}-{maturity_date[4:6]}-{maturity_date[6:8]}"
+
+
+def instrument_row(instrument):
+    """
+    Fila del catalogo a partir de un instrumento de get_detailed_instruments
+    """
+    return (instrument['securityDescription'],
+            instrument.get('minPriceIncrement'),
+            instrument.get('tickSize'),
+            parse_maturity(instrument.get('maturityDate')))
+
+
+class InstrumentCatalog:
+    def __init__(self, json_instruments='instruments_detailed.json', db_file=None):
+        """
+        :param json_instruments: archivo de PyRofexClient.get_instruments_and_save
+        :param db_file: archivo del catalogo (default: el mismo nombre que el json con .db)
+        """
+        self.json_instruments = json_instruments
+        self.db_file = db_file or os.path.splitext(json_instruments)[0] + '.db'
+        self.conn = None
+        self.lock = threading.Lock()
+        self._cache = {}
+
+    def _connect(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            self.conn.execute('PRAGMA mmap_size = 67108864')  # 64 MB
+            self.conn.execute(CREATE_CATALOG)
+            self.conn.execute(CREATE_META)
+            self.conn.commit()
+        return self.conn
+
+    def _file_version(self):
+        stat = os.stat(self.json_instruments)
+        return f'{stat.st_mtime_ns}:{stat.st_size}'
+
+    def refresh(self, instruments=None):
+        """
+        Actualiza el catalogo
+        :param instruments: lista completa de instrumentos (ej: get_detailed_instruments()['instruments']).
+                            Si es None se lee el json, solo si cambio desde el ultimo refresh.
+        :return: cantidad de instrumentos nuevos o modificados
+        """
+        with self.lock:
+            conn = self._connect()
+            version = None
+
+            if instruments is None:
+                if not os.path.exists(self.json_instruments):
+                    return 0
+                version = self._file_version()
+                row = conn.execute("SELECT value FROM catalog_meta WHERE key = 'version'").fetchone()
+                if row and row[0] == version:
+                    return 0
+
+                with open(self.json_instruments, 'r', encoding='utf-8') as file:
+                    instruments = json.load(file)['instruments']
+
+            rows = {}
+            for instrument in instruments:
+                row = instrument_row(instrument)
+                rows[row[0]] = row
+
+            with conn:
+                before = conn.total_changes
+                conn.executemany(UPSERT, rows.values())
+                changed = conn.total_changes - before
+
+                # los que ya no estan en la lista se borran
+                existing = {r[0] for r in conn.execute('SELECT symbol FROM instrument_catalog')}
+                conn.executemany('DELETE FROM instrument_catalog WHERE symbol = ?',
+                                 ((s,) for s in existing - rows.keys()))
+
+                if version is not None:
+                    conn.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('version', ?)", (version,))
+
+            self._cache.clear()
+            return changed
+
+    def get(self, symbol):
+        """
+        :return: {'tick_price', 'tick_size', 'vencimiento'} o None si el simbolo no esta
+        """
+        return self.lookup([symbol]).get(symbol)
+
+    def lookup(self, symbols):
+        """
+        Data de los simbolos, mismo formato que get_data_instruments. Los que no estan no se incluyen.
+        """
+        data_symbols = {}
+        missing = []
+        for symbol in symbols:
+            if symbol in self._cache:
+                data_symbols[symbol] = dict(self._cache[symbol])
+            else:
+                missing.append(symbol)
+
+        if missing:
+            with self.lock:
+                conn = self._connect()
+                for symbol in missing:
+                    row = conn.execute('SELECT tick_price, tick_size, vencimiento FROM instrument_catalog '
+                                       'WHERE symbol = ?', (symbol,)).fetchone()
+                    if row:
+                        self._cache[symbol] = {'tick_price': row[0], 'tick_size': row[1], 'vencimiento': row[2]}
+                        data_symbols[symbol] = dict(self._cache[symbol])
+
+        return data_symbols
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+# Un catalogo por archivo, compartido por todo el proceso
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(json_instruments='instruments_detailed.json'):
+    """
+    Catalogo del archivo, actualizado si el json cambio
+    """
+    with _catalogs_lock:
+        catalog = _catalogs.get(json_instruments)
+        if catalog is None:
+            catalog = _catalogs[json_instruments] = InstrumentCatalog(json_instruments)
+    catalog.refresh()
+    return catalog
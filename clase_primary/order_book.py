@@ -0,0 +1,126 @@
+"""
+Order books en memoria alimentados por el websocket de market data
+
+- Un OrderBook por simbolo. El handler del websocket arma un BookSnapshot nuevo (inmutable) con un numero
+  de secuencia y lo reemplaza bajo el lock del libro
+- Leer es tomar la referencia al snapshot actual: no hace falta lock y nunca se ve un libro a medio escribir
+- top() es O(1): la primera punta de cada lado del snapshot
+- ddbb_precios() devuelve el mismo formato que get_market_data()['marketData'] para calc_montos,
+  sin ningun request
+
+Uso:
+    cache = OrderBookCache()
+    cache.on_market_data(message)   # desde market_data_handler
+    cache.top('DLR/DIC24')          # (mejor bid, mejor offer)
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+BookSnapshot = namedtuple('BookSnapshot', ['symbol', 'seq', 'timestamp', 'bids', 'offers', 'last'])
+
+
+def _market_data(snapshot):
+    """
+    Snapshot en el formato de marketData de Primary: {'BI': [...], 'OF': [...], 'LA': {...}}
+    """
+    return {'BI': list(snapshot.bids) or None, 'OF': list(snapshot.offers) or None, 'LA': snapshot.last}
+
+
+class OrderBook:
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.cond = threading.Condition()
+        self.snapshot = BookSnapshot(symbol, 0, None, (), (), None)
+
+    def update(self, market_data, timestamp=None):
+        """
+        Aplica un mensaje de market data. Las entradas que no vienen en el mensaje quedan como estaban,
+        las que vienen en None quedan vacias
+        :return: el snapshot nuevo
+        """
+        with self.cond:
+            prev = self.snapshot
+            bids = tuple(market_data['BI'] or ()) if 'BI' in market_data else prev.bids
+            offers = tuple(market_data['OF'] or ()) if 'OF' in market_data else prev.offers
+            last = market_data['LA'] if 'LA' in market_data else prev.last
+
+            self.snapshot = BookSnapshot(self.symbol, prev.seq + 1, timestamp, bids, offers, last)
+            self.cond.notify_all()
+            return self.snapshot
+
+    def top(self):
+        """
+        :return: (mejor bid, mejor offer) como {'price': ..., 'size': ...} o None si el lado esta vacio
+        """
+        snapshot = self.snapshot
+        return (snapshot.bids[0] if snapshot.bids else None,
+                snapshot.offers[0] if snapshot.offers else None)
+
+    def wait_update(self, seq=0, timeout=None):
+        """
+        Espera un snapshot con secuencia mayor a seq
+        :return: el snapshot actual (si se cumplio el timeout puede ser el mismo de antes)
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.snapshot.seq > seq, timeout=timeout)
+            return self.snapshot
+
+
+class OrderBookCache:
+    def __init__(self):
+        self.books = {}
+        self.lock = threading.Lock()  # solo para crear libros nuevos
+
+    def book(self, symbol):
+        book = self.books.get(symbol)
+        if book is None:
+            with self.lock:
+                book = self.books.setdefault(symbol, OrderBook(symbol))
+        return book
+
+    def on_market_data(self, message):
+        """
+        Handler de los mensajes de market data del websocket
+        :return: el snapshot nuevo o None si el mensaje no es de market data
+        """
+        if message.get('type', '').lower() != 'md':
+            return None
+
+        symbol = message['instrumentId']['symbol']
+        return self.book(symbol).update(message.get('marketData') or {}, message.get('timestamp'))
+
+    def __contains__(self, symbol):
+        book = self.books.get(symbol)
+        return book is not None and book.snapshot.seq > 0
+
+    def snapshot(self, symbol):
+        book = self.books.get(symbol)
+        return book.snapshot if book is not None else None
+
+    def top(self, symbol):
+        book = self.books.get(symbol)
+        return book.top() if book is not None else (None, None)
+
+    def wait_symbols(self, symbols, timeout=None):
+        """
+        Espera a que llegue el primer mensaje de cada simbolo (ej: despues de suscribirse)
+        :return: True si estan todos
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for symbol in symbols:
+            remaining = max(0, deadline - time.monotonic()) if deadline is not None else None
+            self.book(symbol).wait_update(0, timeout=remaining)
+        return all(symbol in self for symbol in symbols)
+
+    def ddbb_precios(self, symbols):
+        """
+        Puntas de los simbolos en el formato que usa calc_montos. Los simbolos sin datos no se incluyen.
+        """
+        precios = {}
+        for symbol in symbols:
+            snapshot = self.snapshot(symbol)
+            if snapshot is not None and snapshot.seq > 0:
+                precios[symbol] = _market_data(snapshot)
+        return precios
@@ -0,0 +1,87 @@
+"""
+Envio de ordenes en paralelo
+
+place_limit_order es un request REST bloqueante: mandar las patas de un to-do una atras de otra suma
+un round trip por pata. El OrderGateway las manda desde un pool de threads:
+- submit() devuelve un Future con la respuesta de send_order (el ack con el clientId)
+- send_basket() manda todas las patas de una canasta a la vez: la canasta tarda ~ un round trip
+  (la API de Primary no tiene envio de varias ordenes en un request)
+- Un rate limit (token bucket) compartido por todos los threads para no pasarse del limite de la API
+
+El estado de las ordenes despues del ack llega por los execution reports (ver order_tracker.py).
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RateLimiter:
+    """
+    Token bucket: hasta rate requests por segundo, con rafagas de hasta burst
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Bloquea hasta que haya un token disponible
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class OrderGateway:
+    def __init__(self, send_order, max_workers=8, rate_limit=10, burst=None):
+        """
+        :param send_order: fx(ticker, side, size, price) -> respuesta de la API (ej: PyRofexClient.place_limit_order)
+        :param max_workers: requests en vuelo a la vez
+        :param rate_limit: requests por segundo (None = sin limite)
+        :param burst: requests que pueden salir juntos (default = rate_limit)
+        """
+        self.send_order = send_order
+        self.limiter = RateLimiter(rate_limit, burst) if rate_limit else None
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='order_gateway')
+
+    def _send(self, ticker, side, size, price):
+        if self.limiter:
+            self.limiter.acquire()
+        return self.send_order(ticker=ticker, side=side, size=size, price=price)
+
+    def submit(self, ticker, side, size, price):
+        """
+        :return: Future con la respuesta de send_order
+        """
+        return self.pool.submit(self._send, ticker, side, size, price)
+
+    def send_basket(self, legs):
+        """
+        Manda todas las patas a la vez
+        :param legs: lista de dicts con ticker, side, size y price
+        :return: lista de Futures en el mismo orden que legs
+        """
+        return [self.submit(leg['ticker'], leg['side'], leg['size'], leg['price']) for leg in legs]
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
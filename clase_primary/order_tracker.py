@@ -0,0 +1,251 @@
+"""
+Seguimiento de ordenes por execution reports
+
+En vez de consultar cada orden abierta por REST (consultar_orden) cada 10 segundos:
+- El websocket de order reports (mensajes 'or') actualiza una tabla en memoria: clOrdId -> ultimo orderReport
+- Cada report de una orden registrada con track() se encola y un thread escritor lo pasa a la DDBB
+  (en lotes, con su propia conexion)
+- Los bots esperan con wait_final() a que las ordenes terminen; REST solo se usa para reconciliar
+  (reconcile) cuando pasa un rato sin reports
+
+El orderReport tiene los mismos campos que el 'order' de get_order_status, asi que se guarda igual
+que antes: {'order': orderReport}.
+
+FakeOrderReportFeed manda reports con el mismo formato al handler, para probar sin mercado.
+"""
+
+import queue
+import threading
+import time
+
+FINALIZADAS = ('FILLED', 'REJECTED', 'CANCELED')
+
+
+class OrderTracker:
+    def __init__(self, writer=None, max_retries=5):
+        """
+        :param writer: fx(lista de (id_operacion, {'order': orderReport})) que escribe en la DDBB.
+                       Se llama desde el thread escritor. Si devuelve False el lote se reintenta.
+        :param max_retries: reintentos de un lote (con espera de 1, 2, 4... segundos) antes de descartarlo
+        """
+        self.orders = {}  # clOrdId -> ultimo orderReport
+        self.operaciones = {}  # clOrdId -> id_operacion en la DDBB
+        self.cond = threading.Condition()
+        self.writer = writer
+        self.max_retries = max_retries
+        self.listeners = []  # fx(client_id) que se llaman con cada report aceptado (desde el thread del websocket)
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def set_writer(self, writer):
+        self.writer = writer
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    # ENTRADA DE REPORTS
+    def track(self, client_id, id_operacion=None):
+        """
+        Registra una orden. Si ya llego algun report (puede llegar antes que el insert en la DDBB) se escribe.
+        Registrar de nuevo la misma orden no hace nada.
+        """
+        with self.cond:
+            nueva = id_operacion is not None and self.operaciones.get(client_id) != id_operacion
+            if nueva:
+                self.operaciones[client_id] = id_operacion
+            report = self.orders.setdefault(client_id, None)
+
+            if nueva and report is not None:
+                self._enqueue(client_id, report)
+
+    def forget(self, client_ids):
+        """
+        Deja de seguir las ordenes (ej: cuando termina su to-do) para que la memoria no crezca con cada orden.
+        Lo que ya estaba encolado para la DDBB se escribe igual.
+        """
+        with self.cond:
+            for client_id in client_ids:
+                self.orders.pop(client_id, None)
+                self.operaciones.pop(client_id, None)
+
+    def on_report(self, message):
+        """
+        Handler de los mensajes de order report del websocket
+        :return: True si el report actualizo la orden
+        """
+        if message.get('type', '').lower() != 'or':
+            return False
+
+        report = message.get('orderReport') or {}
+        client_id = report.get('clOrdId')
+        if client_id is None:
+            return False
+
+        with self.cond:
+            prev = self.orders.get(client_id)
+            # los reports pueden llegar desordenados: una orden finalizada no vuelve atras
+            if prev and prev.get('status') in FINALIZADAS and report.get('status') not in FINALIZADAS:
+                return False
+            if prev and report.get('cumQty', 0) < prev.get('cumQty', 0):
+                return False
+
+            self.orders[client_id] = report
+            self.cond.notify_all()
+
+            # se encola con el lock tomado: a la DDBB llegan en el mismo orden en que se aceptaron
+            self._enqueue(client_id, report)
+
+        for listener in self.listeners:
+            listener(client_id)
+        return True
+
+    def reconcile(self, consultar_orden, client_ids):
+        """
+        Consulta por REST las ordenes que siguen abiertas y pasa la respuesta como un report mas
+        :param consultar_orden: fx(client_order_id) -> respuesta de get_order_status
+        """
+        for client_id in self.open_orders(client_ids):
+            response = consultar_orden(client_order_id=client_id)
+            if response and response.get('order'):
+                order = dict(response['order'])
+                order.setdefault('clOrdId', client_id)
+                self.on_report({'type': 'or', 'orderReport': order})
+
+    # CONSULTAS
+    def status(self, client_id):
+        with self.cond:
+            report = self.orders.get(client_id)
+            return report.get('status') if report else None
+
+    def open_orders(self, client_ids):
+        with self.cond:
+            return [c for c in client_ids if not self._is_final(c)]
+
+    def _is_final(self, client_id):
+        report = self.orders.get(client_id)
+        return bool(report) and report.get('status') in FINALIZADAS
+
+    def wait_final(self, client_ids, timeout=None):
+        """
+        Bloquea hasta que todas las ordenes esten finalizadas
+        :return: True si terminaron, False si se cumplio el timeout
+        """
+        with self.cond:
+            return self.cond.wait_for(lambda: all(self._is_final(c) for c in client_ids), timeout=timeout)
+
+    # ESCRITURA EN LA DDBB
+    def _enqueue(self, client_id, report):
+        id_operacion = self.operaciones.get(client_id)
+        if self.writer is None or id_operacion is None:
+            return
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._write_loop, daemon=True)
+            self._thread.start()
+        self._queue.put((id_operacion, {'order': report}))
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:  # lo que se haya juntado mientras tanto va en la misma transaccion
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # el lote que fallo se reintenta antes de tomar nada nuevo de la cola, asi un report
+            # viejo nunca pisa a uno posterior
+            for intento in range(self.max_retries + 1):
+                try:
+                    ok = self.writer(batch)
+                except Exception as e:
+                    print(f"Error al escribir execution reports: {e}")
+                    ok = False
+                if ok is not False:
+                    break
+                if intento < self.max_retries:
+                    time.sleep(min(2 ** intento, 30))
+            else:
+                # se descarta para que flush() no quede bloqueado; la DDBB se corrige con el proximo report
+                # de cada orden o con reconcile()
+                print(f"Se descartan {len(batch)} execution reports despues de {self.max_retries} reintentos")
+
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self):
+        """
+        Espera a que los reports recibidos esten escritos en la DDBB
+        """
+        self._queue.join()
+
+
+class FakeOrderReportFeed:
+    """
+    Websocket de mentira: arma orderReports como los de Primary y se los pasa al handler
+    (opcionalmente con demora, desde otro thread como el websocket real)
+    """
+
+    def __init__(self, handler, delay=0.0):
+        """
+        :param handler: order_report_handler del cliente (o OrderTracker.on_report)
+        :param delay: segundos entre que se pide un evento y llega el report
+        """
+        self.handler = handler
+        self.delay = delay
+        self.orders = {}
+        self._next_id = 1130835
+
+    def _send(self, client_id, **changes):
+        order = self.orders[client_id]
+        order.update(changes)
+        order['transactTime'] = time.strftime('%Y%m%d-%H:%M:%S')
+        message = {'type': 'or', 'timestamp': int(time.time() * 1000), 'orderReport': dict(order)}
+
+        if self.delay:
+            threading.Timer(self.delay, self.handler, args=(message,)).start()
+        else:
+            self.handler(message)
+
+    def new(self, client_id, symbol, price, size, side='BUY'):
+        self._next_id += 1
+        self.orders[client_id] = {
+            'orderId': str(self._next_id),
+            'clOrdId': client_id,
+            'proprietary': 'PBCP',
+            'accountId': {'id': '10'},
+            'instrumentId': {'marketId': 'ROFX', 'symbol': symbol},
+            'price': price,
+            'orderQty': size,
+            'ordType': 'LIMIT',
+            'side': side,
+            'timeInForce': 'DAY',
+            'avgPx': 0,
+            'lastPx': 0,
+            'lastQty': 0,
+            'cumQty': 0,
+            'leavesQty': size,
+            'status': 'NEW',
+            'text': 'Aceptada',
+        }
+        self._send(client_id)
+
+    def fill(self, client_id, qty=None, price=None):
+        """
+        Ejecuta qty contratos (default: todo lo que queda)
+        """
+        order = self.orders[client_id]
+        qty = order['leavesQty'] if qty is None else min(qty, order['leavesQty'])
+        price = order['price'] if price is None else price
+
+        cum = order['cumQty'] + qty
+        avg = (order['avgPx'] * order['cumQty'] + price * qty) / cum if cum else 0
+        leaves = order['orderQty'] - cum
+        self._send(client_id, cumQty=cum, avgPx=avg, lastPx=price, lastQty=qty, leavesQty=leaves,
+                   status='FILLED' if leaves == 0 else 'PARTIALLY_FILLED')
+
+    def cancel(self, client_id):
+        self._send(client_id, leavesQty=0, status='CANCELED')
+
+    def reject(self, client_id, text='Rechazada'):
+        self._send(client_id, leavesQty=0, status='REJECTED', text=text)
@@ -0,0 +1,130 @@
+"""
+Tabla resumen mantenida por triggers sobre operaciones
+
+Para saber si un to-do termino, update_todo_status / actualizar_status_todo leian el status de todas
+sus ordenes en cada vuelta. Ahora cada INSERT / UPDATE / DELETE en operaciones ajusta en la misma
+transaccion los contadores de su to-do en resumen (se suma lo nuevo y se resta lo viejo):
+- legs, legs_open, legs_filled, legs_rejected, legs_canceled
+- filled (contratos ejecutados), pxq (pxq_filled total) y avg_price = pxq / filled
+- tasa: promedio de tasa ponderado por pxq_filled (tasa_pxq / pxq_tasa)
+
+El status de un to-do es una busqueda por PRIMARY KEY en resumen, tenga las patas que tenga.
+Lo usan clase_bot_1/fx_sqlite.py y clase_bot_2/database.py (mismo esquema de tablas).
+"""
+
+FINALIZADAS = ('FILLED', 'REJECTED', 'CANCELED')
+
+# columnas que se agregan a resumen (id_todo, pxq, tasa) si no estan
+COLUMNS = {
+    'legs': 'INTEGER DEFAULT 0',
+    'legs_open': 'INTEGER DEFAULT 0',
+    'legs_filled': 'INTEGER DEFAULT 0',
+    'legs_rejected': 'INTEGER DEFAULT 0',
+    'legs_canceled': 'INTEGER DEFAULT 0',
+    'filled': 'REAL DEFAULT 0',
+    'avg_price': 'REAL',
+    'tasa_pxq': 'REAL DEFAULT 0',
+    'pxq_tasa': 'REAL DEFAULT 0',
+}
+
+# columna de resumen -> aporte de una fila de operaciones ({r} = NEW u OLD)
+_APORTES = {
+    'legs': '1',
+    'legs_open': "COALESCE({r}.status, '') NOT IN ('FILLED', 'REJECTED', 'CANCELED')",
+    'legs_filled': "COALESCE({r}.status, '') = 'FILLED'",
+    'legs_rejected': "COALESCE({r}.status, '') = 'REJECTED'",
+    'legs_canceled': "COALESCE({r}.status, '') = 'CANCELED'",
+    'filled': 'COALESCE({r}.filled, 0)',
+    'pxq': 'COALESCE({r}.pxq_filled, 0)',
+    'tasa_pxq': 'COALESCE({r}.tasa * {r}.pxq_filled, 0)',
+    'pxq_tasa': 'CASE WHEN {r}.tasa IS NOT NULL THEN COALESCE({r}.pxq_filled, 0) ELSE 0 END',
+}
+
+
+def _sumar(r, signo):
+    """
+    Suma (signo '+') o resta (signo '-') el aporte de la fila r al resumen de su to-do
+    """
+    columnas = ', '.join(_APORTES)
+    valores = ', '.join(f"{signo}({expr.format(r=r)})" for expr in _APORTES.values())
+    sets = ', '.join(f'{c} = COALESCE({c}, 0) + excluded.{c}' for c in _APORTES)
+    # sin WHERE, un id_todo NULL en la PRIMARY KEY crearia una fila nueva con un rowid cualquiera
+    return f'''
+        INSERT INTO resumen (id_todo, {columnas}) SELECT {r}.id_todo, {valores} WHERE {r}.id_todo IS NOT NULL
+        ON CONFLICT(id_todo) DO UPDATE SET {sets};'''
+
+
+def _derivados(r):
+    return f'''
+        UPDATE resumen
+        SET avg_price = pxq / NULLIF(filled, 0),
+            tasa = tasa_pxq / NULLIF(pxq_tasa, 0)
+        WHERE id_todo = {r}.id_todo;'''
+
+
+TRIGGERS = {
+    'resumen_insert': f'''
+        CREATE TRIGGER resumen_insert AFTER INSERT ON operaciones
+        WHEN NEW.id_todo IS NOT NULL
+        BEGIN {_sumar('NEW', '+')} {_derivados('NEW')}
+        END''',
+    'resumen_update': f'''
+        CREATE TRIGGER resumen_update AFTER UPDATE OF id_todo, status, filled, pxq_filled, tasa ON operaciones
+        WHEN OLD.id_todo IS NOT NULL OR NEW.id_todo IS NOT NULL
+        BEGIN {_sumar('OLD', '-')} {_sumar('NEW', '+')} {_derivados('OLD')} {_derivados('NEW')}
+        END''',
+    'resumen_delete': f'''
+        CREATE TRIGGER resumen_delete AFTER DELETE ON operaciones
+        WHEN OLD.id_todo IS NOT NULL
+        BEGIN {_sumar('OLD', '-')} {_derivados('OLD')}
+        END''',
+}
+
+
+def create_resumen(conn):
+    """
+    Agrega las columnas y los triggers a resumen. Si los triggers no existian o cambiaron, reconstruye
+    resumen desde operaciones (DDBB creadas antes de los triggers). No hace commit.
+    """
+    existentes = {row[1] for row in conn.execute('PRAGMA table_info(resumen)')}
+    for columna, tipo in COLUMNS.items():
+        if columna not in existentes:
+            conn.execute(f'ALTER TABLE resumen ADD COLUMN {columna} {tipo}')
+
+    # si los triggers son los de esta version no hay nada que hacer; si son otros (o una version
+    # anterior, que creaba filas para ordenes sin id_todo) se recrean y se reconstruye resumen
+    triggers = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall())
+    if all(triggers.get(nombre) == sql.strip() for nombre, sql in TRIGGERS.items()):
+        return
+
+    for nombre, sql in TRIGGERS.items():
+        conn.execute(f'DROP TRIGGER IF EXISTS {nombre}')
+        conn.execute(sql)
+
+    columnas = ', '.join(_APORTES)
+    sumas = ', '.join(f"SUM({expr.format(r='operaciones')})" for expr in _APORTES.values())
+    conn.execute('DELETE FROM resumen')
+    conn.execute(f'INSERT INTO resumen (id_todo, {columnas}) SELECT id_todo, {sumas} FROM operaciones '
+                 f'WHERE id_todo IS NOT NULL GROUP BY id_todo')
+    conn.execute('UPDATE resumen SET avg_price = pxq / NULLIF(filled, 0), tasa = tasa_pxq / NULLIF(pxq_tasa, 0)')
+
+
+def resumen_todo(conn, id_todo):
+    """
+    Fila de resumen del to-do como dict (None si no tiene ordenes)
+    """
+    cursor = conn.execute('SELECT * FROM resumen WHERE id_todo = ?', (id_todo,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([d[0] for d in cursor.description], row))
+
+
+def status_final(resumen):
+    """
+    'FILLED' si todas las ordenes se ejecutaron, 'REVISAR' si todas terminaron pero alguna no se ejecuto,
+    None si quedan ordenes abiertas
+    """
+    if resumen['legs_open']:
+        return None
+    return 'FILLED' if resumen['legs_filled'] == resumen['legs'] else 'REVISAR'
@@ -0,0 +1,86 @@
+"""
+Calculo de canastas (calc_montos) para muchos to-dos a la vez con NumPy
+
+Misma regla que calc_montos:
+- Cada instrumento toma la primera punta del OF (si no hay OF, la del BI; si no hay ninguna se descarta)
+- El monto de cada to-do se reparte ponderado por el size de esas puntas
+- Los contratos se redondean para abajo al tick_size y lo que sobra pasa al instrumento siguiente
+
+Los to-dos van en filas y los instrumentos en columnas: se recorren los instrumentos (pocos) y cada paso
+calcula todos los to-dos juntos.
+
+Opcional (planificacion.txt): nunca mas del max_pct_book de la punta. El tope es por instrumento y se
+comparte entre los to-dos del lote, en el orden en que vienen. Lo que no entra pasa al siguiente instrumento.
+"""
+
+import numpy as np
+
+
+def book_arrays(ddbb_precios, data_symbols):
+    """
+    Puntas e info de los instrumentos como arrays (solo los que tienen alguna punta)
+    :return: (symbols, price, size, tick_size)
+    """
+    symbols, price, size, tick = [], [], [], []
+    for symbol, md in ddbb_precios.items():
+        punta = md['OF'] or md['BI']
+        if not punta:
+            continue
+        symbols.append(symbol)
+        price.append(punta[0]['price'])
+        size.append(punta[0]['size'])
+        tick.append(float(data_symbols[symbol]['tick_size']))
+
+    return symbols, np.array(price, dtype=np.float64), np.array(size, dtype=np.float64), np.array(tick, dtype=np.float64)
+
+
+def size_baskets(montos, price, size, tick_size, multiplicador=1000, max_pct_book=None):
+    """
+    :param montos: monto de cada to-do (N,)
+    :param price: precio de la punta de cada instrumento (K,)
+    :param size: size de la punta de cada instrumento (K,)
+    :param tick_size: tick_size de cada instrumento (K,)
+    :param multiplicador: tamaño del contrato
+    :param max_pct_book: tope de contratos como fraccion del size de la punta (ej: 0.5), None = sin tope
+    :return: (contratos (N, K), pxq (N, K), monto_sobrante (N,))
+    """
+    montos = np.asarray(montos, dtype=np.float64)
+    n, k = len(montos), len(price)
+
+    contratos = np.zeros((n, k))
+    pxq = np.zeros((n, k))
+    sobrante = np.zeros(n)
+
+    size_total = size.sum()
+    for j in range(k):
+        monto_ars = (size[j] / size_total) * montos + sobrante
+
+        c = np.floor_divide(monto_ars / (price[j] * multiplicador), tick_size[j]) * tick_size[j]
+
+        if max_pct_book is not None:
+            # tope compartido por todo el lote: cada to-do toma lo que queda despues de los anteriores
+            cap = np.floor_divide(size[j] * max_pct_book, tick_size[j]) * tick_size[j]
+            acumulado = np.cumsum(c)
+            c = np.clip(acumulado, 0, cap) - np.clip(acumulado - c, 0, cap)
+
+        contratos[:, j] = c
+        pxq[:, j] = price[j] * c * multiplicador
+        sobrante = monto_ars - pxq[:, j]
+
+    return contratos, pxq, sobrante
+
+
+def calc_montos_batch(ddbb_precios, montos, data_symbols, multiplicador=1000, max_pct_book=None):
+    """
+    calc_montos para varios to-dos
+    :return: (lista de ordenes por to-do con el formato de calc_montos, array de montos sobrantes)
+    """
+    symbols, price, size, tick = book_arrays(ddbb_precios, data_symbols)
+    contratos, pxq, sobrante = size_baskets(montos, price, size, tick, multiplicador, max_pct_book)
+
+    ordenes = []
+    for i in range(len(contratos)):
+        ordenes.append({s: {'monto': float(pxq[i, j]), 'size': float(contratos[i, j]), 'price': price[j].item()}
+                        for j, s in enumerate(symbols)})
+
+    return ordenes, sobrante